@@ -0,0 +1,168 @@
+"""
+Almacén columnar de embeddings mapeado en memoria, paralelo a SQLite.
+
+Dos archivos de solo-anexar:
+    <ruta_base>.f32  matriz float32 (N, dimension) en crudo, fila a fila
+    <ruta_base>.ids  columna int64 (N,) con el id de mascotas de cada fila
+Las lecturas son vistas np.memmap sin copia (salen directo del page cache).
+SQLite sigue siendo la fuente de verdad: db.py anexa aquí en cada registro y
+este archivo se puede reconstruir o verificar desde la BD en cualquier momento:
+
+    python almacen_embeddings.py verificar
+    python almacen_embeddings.py reconstruir
+"""
+import argparse
+import os
+import threading
+import numpy as np
+
+
+class AlmacenEmbeddings:
+    def __init__(self, ruta_base="tesis_mascotas_embeddings", dimension=2048):
+        self.ruta_base = ruta_base
+        self.dimension = dimension
+        self.ruta_vectores = ruta_base + ".f32"
+        self.ruta_ids = ruta_base + ".ids"
+        self.lock = threading.Lock()
+        self._vistas = None  # (n, ids memmap, matriz memmap, orden) de la última apertura
+        os.makedirs(os.path.dirname(ruta_base) or ".", exist_ok=True)
+
+    def _filas_en_disco(self):
+        """Filas completas en AMBOS archivos (una escritura cortada no cuenta)."""
+        bytes_vec = os.path.getsize(self.ruta_vectores) if os.path.exists(self.ruta_vectores) else 0
+        bytes_ids = os.path.getsize(self.ruta_ids) if os.path.exists(self.ruta_ids) else 0
+        return min(bytes_vec // (4 * self.dimension), bytes_ids // 8)
+
+    def cantidad(self):
+        return self._filas_en_disco()
+
+    def agregar(self, ids_db, vectores):
+        """Anexa filas (ids int, matriz (N, dimension)). Descarta antes cualquier fila a medio escribir."""
+        ids_db = np.asarray(ids_db, dtype=np.int64).reshape(-1)
+        vectores = np.ascontiguousarray(vectores, dtype=np.float32).reshape(-1, self.dimension)
+        if len(ids_db) == 0: return
+        with self.lock:
+            n = self._filas_en_disco()
+            with open(self.ruta_vectores, "ab") as f_vec, open(self.ruta_ids, "ab") as f_ids:
+                f_vec.truncate(n * 4 * self.dimension)
+                f_ids.truncate(n * 8)
+                f_vec.write(vectores.tobytes())
+                f_vec.flush()
+                f_ids.write(ids_db.tobytes())
+
+    def _abrir(self):
+        """Vistas memmap actualizadas (se reabren solo si el archivo creció)."""
+        n = self._filas_en_disco()
+        with self.lock:
+            if self._vistas is not None and self._vistas[0] == n:
+                return self._vistas
+            if n == 0:
+                ids = np.zeros(0, dtype=np.int64)
+                matriz = np.zeros((0, self.dimension), dtype=np.float32)
+            else:
+                ids = np.memmap(self.ruta_ids, dtype=np.int64, mode="r", shape=(n,))
+                matriz = np.memmap(self.ruta_vectores, dtype=np.float32, mode="r", shape=(n, self.dimension))
+            # Los ids llegan crecientes (AUTOINCREMENT); si no, se busca vía un orden auxiliar
+            orden = None if n < 2 or np.all(ids[1:] > ids[:-1]) else np.argsort(ids, kind="stable")
+            self._vistas = (n, ids, matriz, orden)
+            return self._vistas
+
+    def ids(self):
+        return self._abrir()[1]
+
+    def matriz(self):
+        """Vista (N, dimension) de solo lectura, sin copia."""
+        return self._abrir()[2]
+
+    def posiciones(self, lista_ids):
+        """Fila de cada id en el almacén, o -1 si no está (si se repite, gana la última)."""
+        _, ids, _, orden = self._abrir()
+        buscados = np.asarray(lista_ids, dtype=np.int64).reshape(-1)
+        if len(ids) == 0:
+            return np.full(len(buscados), -1, dtype=np.int64)
+        ordenados = ids if orden is None else ids[orden]
+        pos = np.searchsorted(ordenados, buscados, side="right") - 1
+        pos_valida = np.clip(pos, 0, len(ids) - 1)
+        encontrado = (pos >= 0) & (ordenados[pos_valida] == buscados)
+        filas = pos_valida if orden is None else orden[pos_valida]
+        return np.where(encontrado, filas, -1)
+
+    def obtener(self, lista_ids):
+        """
+        Retorna (matriz (N, dimension) alineada con lista_ids, máscara de encontrados).
+        Los ids ausentes quedan en cero.
+        """
+        filas = self.posiciones(lista_ids)
+        encontrados = filas >= 0
+        resultado = np.zeros((len(filas), self.dimension), dtype=np.float32)
+        if encontrados.any():
+            resultado[encontrados] = self.matriz()[filas[encontrados]]
+        return resultado, encontrados
+
+    def reconstruir(self, lotes):
+        """
+        Reescribe el almacén desde un iterable de (ids, matriz) (p. ej. la BD).
+        Se escribe aparte y se reemplaza al final: los lectores nunca ven un archivo a medias.
+        """
+        tmp_vec, tmp_ids = self.ruta_vectores + ".tmp", self.ruta_ids + ".tmp"
+        total = 0
+        with open(tmp_vec, "wb") as f_vec, open(tmp_ids, "wb") as f_ids:
+            for ids_db, vectores in lotes:
+                f_vec.write(np.ascontiguousarray(vectores, dtype=np.float32).reshape(-1, self.dimension).tobytes())
+                f_ids.write(np.asarray(ids_db, dtype=np.int64).tobytes())
+                total += len(ids_db)
+        with self.lock:
+            os.replace(tmp_vec, self.ruta_vectores)
+            os.replace(tmp_ids, self.ruta_ids)
+            self._vistas = None
+        return total
+
+    def verificar(self, lotes, tolerancia=0.999):
+        """
+        Compara contra un iterable de (ids, matriz) de la fuente de verdad.
+        Retorna un dict con faltantes, sobrantes, duplicados y vectores distintos
+        (similitud coseno < tolerancia; los formatos float16/int8 de la BD no son exactos).
+        """
+        ids_almacen = np.asarray(self.ids())
+        reporte = {"filas_almacen": len(ids_almacen), "filas_bd": 0, "faltantes": 0, "distintos": 0,
+                   "duplicados": int(len(ids_almacen) - len(np.unique(ids_almacen)))}
+        vistos = []
+        for ids_db, vectores in lotes:
+            reporte["filas_bd"] += len(ids_db)
+            vistos.append(np.asarray(ids_db, dtype=np.int64))
+            guardados, encontrados = self.obtener(ids_db)
+            reporte["faltantes"] += int((~encontrados).sum())
+            a, b = guardados[encontrados], np.asarray(vectores, dtype=np.float32)[encontrados]
+            normas = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+            coseno = np.einsum("ij,ij->i", a, b) / np.maximum(normas, 1e-12)
+            reporte["distintos"] += int((coseno < tolerancia).sum())
+        ids_bd = np.concatenate(vistos) if vistos else np.zeros(0, dtype=np.int64)
+        reporte["sobrantes"] = int(len(np.setdiff1d(ids_almacen, ids_bd)))
+        reporte["consistente"] = not any(reporte[k] for k in ("faltantes", "sobrantes", "duplicados", "distintos"))
+        return reporte
+
+
+def main():
+    import db
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accion", choices=("verificar", "reconstruir"))
+    args = parser.parse_args()
+
+    db.init_db()
+    almacen = db.almacen()
+    if almacen is None:
+        raise SystemExit("El almacén de embeddings está desactivado (db.ALMACEN_ACTIVO = False)")
+
+    if args.accion == "reconstruir":
+        total = db.compactar_almacen()
+        print(f"Almacén reconstruido: {total} filas en {almacen.ruta_base}.*")
+    else:
+        reporte = almacen.verificar((ids, m) for ids, m, _ in db.iterar_embeddings(0, almacen.dimension, usar_almacen=False, solo_abiertos=False))
+        for clave, valor in reporte.items():
+            print(f"{clave}: {valor}")
+        if not reporte["consistente"]:
+            print("Inconsistente: corra `python almacen_embeddings.py reconstruir`")
+
+
+if __name__ == "__main__":
+    main()
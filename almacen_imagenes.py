@@ -0,0 +1,234 @@
+"""
+Almacén de fotos direccionado por contenido, con miniaturas pre-generadas.
+
+Cada foto se guarda UNA vez, con el SHA-256 de sus bytes como nombre (el mismo
+hash_imagen de la BD), repartida en subcarpetas por los dos primeros caracteres:
+    datos/imagenes/<aa>/<sha256>.<ext>        original, tal cual se subió
+    datos/imagenes/<aa>/<sha256>_p.webp       miniatura pequeña (tarjetas, popups del mapa)
+    datos/imagenes/<aa>/<sha256>_m.webp       miniatura mediana (alerta del registro)
+- Sin choques de nombre: dos fotos distintas nunca comparten ruta, y la misma
+  foto subida dos veces no se vuelve a escribir.
+- Las miniaturas se crean al registrar; la vista solo lee unos pocos KB por
+  candidato en vez del original completo. WebP si Pillow lo soporta, si no JPEG.
+- Escrituras atómicas (archivo temporal + os.replace): un corte no deja
+  archivos a medias con el nombre definitivo.
+
+Las fotos anteriores (datos/imagenes/<nombre>_<archivo>) se migran con:
+    python almacen_imagenes.py migrar        # copia al almacén, genera miniaturas y actualiza la BD
+    python almacen_imagenes.py miniaturas    # regenera las miniaturas que falten
+    python almacen_imagenes.py huerfanas     # borra fotos que ya no referencia ningún reporte (con la app detenida)
+"""
+import argparse
+import base64
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageOps, features
+
+# Lado mayor en píxeles (la tarjeta muestra 100 px; el doble para pantallas densas)
+TAMANOS = {"pequena": 200, "mediana": 480}
+SUFIJOS = {"pequena": "_p", "mediana": "_m"}
+EXTENSIONES = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif", "BMP": "bmp"}
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+
+class AlmacenImagenes:
+    def __init__(self, raiz="datos/imagenes", calidad=75, capacidad_memoria=256):
+        self.raiz = raiz
+        self.calidad = calidad
+        self.formato = "WEBP" if features.check("webp") else "JPEG"
+        self.extension = "webp" if self.formato == "WEBP" else "jpg"
+        self.opciones = {"method": 4} if self.formato == "WEBP" else {"optimize": True}
+        # data URIs de miniaturas ya leídas (popups del mapa), LRU en memoria
+        self.capacidad_memoria = capacidad_memoria
+        self.memoria = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(raiz, exist_ok=True)
+
+    @staticmethod
+    def hash_imagen(datos):
+        return hashlib.sha256(datos).hexdigest()
+
+    def _carpeta(self, hash_img):
+        return os.path.join(self.raiz, hash_img[:2])
+
+    def _clave(self, ruta_imagen):
+        """Hash de una ruta del almacén, o None si es una ruta antigua / externa."""
+        if not ruta_imagen: return None
+        base = os.path.splitext(os.path.basename(ruta_imagen))[0]
+        if _HASH.match(base) and os.path.dirname(os.path.normpath(ruta_imagen)) == os.path.normpath(self._carpeta(base)):
+            return base
+        return None
+
+    def ruta_miniatura(self, hash_img, tamano="pequena"):
+        return os.path.join(self._carpeta(hash_img), f"{hash_img}{SUFIJOS[tamano]}.{self.extension}")
+
+    @staticmethod
+    def _escribir(ruta, datos):
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+
+    def guardar(self, datos, hash_img=None):
+        """
+        Guarda los bytes de una foto (si no estaban) y sus miniaturas.
+        Retorna la ruta del original en el almacén, o None si no es una imagen válida.
+        """
+        hash_img = hash_img or self.hash_imagen(datos)
+        carpeta = self._carpeta(hash_img)
+        existente = self._buscar_original(hash_img)
+        if existente:
+            if not all(os.path.exists(self.ruta_miniatura(hash_img, t)) for t in TAMANOS):
+                self.generar_miniaturas(existente, hash_img)
+            return existente
+
+        try:
+            with Image.open(io.BytesIO(datos)) as img:
+                extension = EXTENSIONES.get(img.format, "img")
+        except Exception as e:
+            print(f"Error leyendo imagen {hash_img[:12]}: {e}")
+            return None
+
+        os.makedirs(carpeta, exist_ok=True)
+        ruta = os.path.join(carpeta, f"{hash_img}.{extension}")
+        self._escribir(ruta, datos)
+        self.generar_miniaturas(datos, hash_img)
+        return ruta
+
+    def _buscar_original(self, hash_img):
+        carpeta = self._carpeta(hash_img)
+        for extension in list(EXTENSIONES.values()) + ["img"]:
+            ruta = os.path.join(carpeta, f"{hash_img}.{extension}")
+            if os.path.exists(ruta):
+                return ruta
+        return None
+
+    def generar_miniaturas(self, origen, hash_img):
+        """
+        Crea todas las miniaturas de una foto (origen: bytes o ruta) con una sola
+        decodificación: la mediana sale del original, la pequeña de la mediana.
+        Retorna True si se pudieron crear.
+        """
+        try:
+            with Image.open(io.BytesIO(origen) if isinstance(origen, (bytes, bytearray)) else origen) as img:
+                # JPEG: el decodificador ya reduce por bloques DCT (mucho más rápido que decodificar completo)
+                img.draft("RGB", (TAMANOS["mediana"], TAMANOS["mediana"]))
+                img = ImageOps.exif_transpose(img).convert("RGB")
+            os.makedirs(self._carpeta(hash_img), exist_ok=True)
+            for tamano in sorted(TAMANOS, key=TAMANOS.get, reverse=True):
+                img.thumbnail((TAMANOS[tamano], TAMANOS[tamano]), Image.LANCZOS)
+                salida = io.BytesIO()
+                img.save(salida, self.formato, quality=self.calidad, **self.opciones)
+                self._escribir(self.ruta_miniatura(hash_img, tamano), salida.getvalue())
+            return True
+        except Exception as e:
+            print(f"Error generando miniaturas de {hash_img[:12]}: {e}")
+            return False
+
+    def miniatura(self, ruta_imagen, tamano="pequena"):
+        """
+        Ruta para mostrar una foto de la BD en tamaño reducido. Si falta la
+        miniatura se genera en el momento; las rutas antiguas (sin migrar)
+        devuelven el original. None si el archivo no existe.
+        """
+        hash_img = self._clave(ruta_imagen)
+        if hash_img is not None:
+            ruta = self.ruta_miniatura(hash_img, tamano)
+            if os.path.exists(ruta) or (os.path.exists(ruta_imagen) and self.generar_miniaturas(ruta_imagen, hash_img)):
+                return ruta
+        return ruta_imagen if ruta_imagen and os.path.exists(ruta_imagen) else None
+
+    def data_uri(self, ruta_imagen, tamano="pequena"):
+        """
+        La miniatura como data URI, para incrustarla en HTML (popups de folium no
+        pueden leer archivos locales). Solo para miniaturas: las rutas antiguas
+        sin migrar retornan None en vez de incrustar el original completo.
+        """
+        clave = (ruta_imagen, tamano)
+        with self.lock:
+            if clave in self.memoria:
+                self.memoria.move_to_end(clave)
+                return self.memoria[clave]
+
+        ruta = self.miniatura(ruta_imagen, tamano)
+        if ruta is None or ruta == ruta_imagen:
+            return None
+        with open(ruta, "rb") as f:
+            uri = f"data:image/{self.extension.replace('jpg', 'jpeg')};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+        with self.lock:
+            self.memoria[clave] = uri
+            if len(self.memoria) > self.capacidad_memoria:
+                self.memoria.popitem(last=False)
+        return uri
+
+    def archivos(self):
+        """Genera (hash, ruta) de cada archivo del almacén (originales y miniaturas)."""
+        for carpeta in sorted(os.listdir(self.raiz)):
+            ruta_carpeta = os.path.join(self.raiz, carpeta)
+            if len(carpeta) != 2 or not os.path.isdir(ruta_carpeta): continue
+            for nombre in sorted(os.listdir(ruta_carpeta)):
+                hash_img = nombre.split(".")[0].split("_")[0]
+                if _HASH.match(hash_img) and not nombre.endswith(".tmp"):
+                    yield hash_img, os.path.join(ruta_carpeta, nombre)
+
+
+def migrar(almacen):
+    """Copia al almacén las fotos con rutas antiguas y actualiza ruta_imagen (y hash_imagen si faltaba)."""
+    import db
+    cambios, faltantes, ya = [], 0, 0
+    for r in db.iterar_mascotas(("id", "ruta_imagen", "hash_imagen")):
+        if almacen._clave(r["ruta_imagen"]) is not None:
+            ya += 1
+            continue
+        if not r["ruta_imagen"] or not os.path.exists(r["ruta_imagen"]):
+            faltantes += 1
+            continue
+        with open(r["ruta_imagen"], "rb") as f:
+            datos = f.read()
+        hash_img = almacen.hash_imagen(datos)
+        ruta = almacen.guardar(datos, hash_img)
+        if ruta:
+            cambios.append((r["id"], ruta, hash_img))
+    db.actualizar_rutas_imagen(cambios)
+    return {"migradas": len(cambios), "ya_en_almacen": ya, "sin_archivo": faltantes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("accion", choices=("migrar", "miniaturas", "huerfanas"))
+    parser.add_argument("--raiz", default="datos/imagenes")
+    args = parser.parse_args()
+
+    import db
+    db.init_db()
+    almacen = AlmacenImagenes(args.raiz)
+
+    if args.accion == "migrar":
+        reporte = migrar(almacen)
+        print(", ".join(f"{k}: {v}" for k, v in reporte.items()))
+        print("Los archivos antiguos no se borran; revíselos y elimínelos a mano.")
+    elif args.accion == "miniaturas":
+        originales = {h: ruta for h, ruta in almacen.archivos() if "_" not in os.path.basename(ruta)}
+        faltantes = [h for h in originales if not all(os.path.exists(almacen.ruta_miniatura(h, t)) for t in TAMANOS)]
+        generadas = sum(almacen.generar_miniaturas(originales[h], h) for h in faltantes)
+        print(f"{len(originales)} fotos, {generadas} con miniaturas nuevas")
+    else:
+        usados = set()
+        for r in db.iterar_mascotas(("id", "ruta_imagen", "hash_imagen")):
+            usados.update((almacen._clave(r["ruta_imagen"]), r["hash_imagen"]))
+        borrados = 0
+        for hash_img, ruta in list(almacen.archivos()):
+            if hash_img not in usados:
+                os.remove(ruta)
+                borrados += 1
+        print(f"{borrados} archivos huérfanos borrados")
+
+
+if __name__ == "__main__":
+    main()
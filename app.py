@@ -1,12 +1,21 @@
+import time
+_T_INICIO_SCRIPT = time.perf_counter() # Para medir el tiempo hasta el primer render
+
 import streamlit as st
+import hmac
 import os
+import threading
 import db 
-from motor_vision import MotorVision
-from utils_geo import MotorGeo
-from motor_ocr import MotorOCR
-from motor_faiss import MotorFAISS 
-from motor_mapa import MotorMapa 
-from streamlit_folium import st_folium 
+import trazas
+# Tramos por etapa (TRAZAS=1): cada llamada a db.* y a los métodos de los motores
+# queda medida; desactivadas solo cuestan una comparación por llamada.
+# (se excluyen los ayudantes de cada consulta y los que devuelven iteradores perezosos)
+trazas.instrumentar_modulo(db, excluir=(
+    "conexion", "cerrar_conexion", "almacen", "codificar_embedding", "decodificar_embedding",
+    "hace_dias", "iterar_mascotas"
+))
+# Los motores (torch, faiss, folium, geopy, pytesseract...) se importan dentro de
+# sus funciones cargar_motor_*: cada pestaña solo paga por lo que usa.
 
 # --- CONFIGURACIÓN INICIAL ---
 st.set_page_config(page_title="Reunificación de Mascotas (Tesis)", layout="wide")
@@ -25,6 +34,12 @@ DISTRITOS_LIMA = [
     "Villa María del Triunfo"
 ]
 
+RUTA_INDICE_FAISS = "datos/indice/mascotas.faiss"
+# Moderación: quien ingrese esta clave puede marcar cualquier reporte como spam (vacía = nadie)
+CLAVE_ADMIN = os.environ.get("ADMIN_CLAVE", "")
+# Vencimiento: casos abiertos con más de estos días pasan a "vencido" y salen del índice (0 = nunca)
+DIAS_VENCIMIENTO = int(os.environ.get("REPORTES_VENCEN_DIAS", 90))
+
 os.makedirs("datos/imagenes", exist_ok=True)
 if "db_init" not in st.session_state:
     db.init_db()
@@ -37,24 +52,138 @@ if "search_center" not in st.session_state:
     st.session_state.search_center = None
 if "ultimo_registro" not in st.session_state:
     st.session_state.ultimo_registro = None # Aquí guardaremos la alerta para que no desaparezca
+if "mis_reportes" not in st.session_state:
+    st.session_state.mis_reportes = set() # Reportes creados en esta sesión: su autor puede marcarlos como spam
+
+# --- MOTORES (CARGA PEREZOSA) ---
+# Cada motor se construye la primera vez que se usa y queda compartido entre sesiones.
+@st.cache_resource
+def cargar_motor_vision():
+    from motor_vision import MotorVision
+    from cache_inferencia import CacheInferencia
+    trazas.instrumentar_clase(MotorVision)
+    # Backend de inferencia y nº de hilos configurables por entorno (ver MotorVision.BACKENDS).
+    # Caché por SHA-256: fotos re-subidas no vuelven a pasar por ResNet50.
+    return MotorVision(
+        backend=os.environ.get("MOTOR_VISION_BACKEND", "eager"),
+        num_hilos=int(os.environ.get("MOTOR_VISION_HILOS", 0)) or None,
+        cache=CacheInferencia()
+    )
+
+@st.cache_resource
+def cargar_servicio_inferencia():
+    from servicio_inferencia import ServicioInferencia
+    # Un solo hilo de inferencia para todas las sesiones, con micro-lotes entre ellas
+    return ServicioInferencia(
+        cargar_motor_vision(),
+        max_lote=int(os.environ.get("INFERENCIA_MAX_LOTE", 16)),
+        max_espera_ms=float(os.environ.get("INFERENCIA_MAX_ESPERA_MS", 10))
+    )
 
 @st.cache_resource
-def cargar_motores():
-    m_vis = MotorVision()
-    m_geo = MotorGeo(resolucion=9)
-    m_ocr = MotorOCR()
-    m_faiss = MotorFAISS(dimension=2048) 
-    m_mapa = MotorMapa()
+def cargar_motor_geo():
+    from utils_geo import MotorGeo
+    from cache_geocodificacion import CacheGeocodificacion
+    trazas.instrumentar_clase(MotorGeo)
+    # Referencias repetidas salen de la caché; Nominatim se consulta en segundo plano con límite de tasa
+    return MotorGeo(resolucion=9, cache=CacheGeocodificacion())
+
+@st.cache_resource
+def cargar_motor_ocr():
+    from motor_ocr import MotorOCR
+    from cache_ocr import CacheOCR
+    trazas.instrumentar_clase(MotorOCR)
+    # Tesseract desde TESSERACT_CMD o el PATH; afiches re-subidos salen de la caché por SHA-256
+    return MotorOCR(
+        tesseract_cmd=os.environ.get("TESSERACT_CMD"),
+        idioma=os.environ.get("TESSERACT_IDIOMA") or None,
+        cache=CacheOCR()
+    )
+
+@st.cache_resource
+def cargar_motor_faiss():
+    from motor_faiss import MotorFAISS
+    trazas.instrumentar_clase(MotorFAISS)
+    # Compresión configurable por entorno (FAISS_DIM_PCA / FAISS_CODIFICACION, ver desde_entorno);
+    # el re-ranking exacto usa los vectores de la BD
+    m_faiss = MotorFAISS.desde_entorno(obtener_vectores=lambda ids: db.obtener_vectores(ids, 2048))
+    if DIAS_VENCIMIENTO:
+        db.vencer_reportes(DIAS_VENCIMIENTO)
     
-    todos = db.obtener_todas()
-    m_faiss.limpiar()
-    for mascota in todos:
-        if len(mascota["vector"]) == 2048:
-            m_faiss.agregar_vector(mascota["id"], mascota["vector"])
-        
-    return m_vis, m_geo, m_ocr, m_faiss, m_mapa
+    # Índice persistente: solo se agregan las filas nuevas desde el último guardado,
+    # leídas por partes para no tener toda la BD en memoria, y se aplican los casos
+    # cerrados / vectores cambiados desde entonces (solo los casos abiertos quedan dentro)
+    m_faiss.sincronizar(RUTA_INDICE_FAISS, **FUENTES_INDICE)
+    return m_faiss
 
-motor_vis, motor_geo, motor_ocr, motor_faiss, motor_mapa = cargar_motores()
+# Cómo lee el índice FAISS la BD (sincronizar / compactar)
+FUENTES_INDICE = db.fuentes_indice(2048)
+
+def cerrar_caso(id_db, estado):
+    """Cierra el reporte ("resuelto", "descartado"...) y lo saca del índice: deja de aparecer en búsquedas y en el mapa."""
+    cargar_motor_faiss().eliminar(db.cambiar_estado([id_db], estado))
+
+@st.cache_resource
+def iniciar_mantenimiento():
+    """
+    Cada MANTENIMIENTO_HORAS (6 por defecto): vence los reportes viejos, los saca del
+    índice y, si las lápidas pasan el umbral, compacta el índice (y el almacén de
+    embeddings si acumuló versiones viejas), lo guarda y poda el registro de cambios.
+    """
+    def mantener():
+        while True:
+            time.sleep(3600 * float(os.environ.get("MANTENIMIENTO_HORAS", 6)))
+            try:
+                motor_faiss = cargar_motor_faiss()
+                if DIAS_VENCIMIENTO:
+                    db.vencer_reportes(DIAS_VENCIMIENTO)
+                # Si otro proceso podó el registro más allá de la marca, compactar lo reconstruye
+                if not motor_faiss.aplicar_cambios(FUENTES_INDICE["leer_cambios"]) or motor_faiss.necesita_compactar():
+                    motor_faiss.compactar(**FUENTES_INDICE)
+                # Lo ya guardado en disco no se vuelve a necesitar del registro de cambios
+                db.podar_cambios(motor_faiss.guardar(RUTA_INDICE_FAISS))
+                a = db.almacen()
+                if a is not None and a.cantidad() > 1.2 * db.contar_embeddings(a.dimension, solo_abiertos=False):
+                    db.compactar_almacen()
+            except Exception as e:
+                print(f"Error en el mantenimiento del índice: {e}")
+    hilo = threading.Thread(target=mantener, name="mantenimiento-indice", daemon=True)
+    hilo.start()
+    return hilo
+
+iniciar_mantenimiento()
+
+@st.cache_resource
+def cargar_motor_mapa():
+    from motor_mapa import MotorMapa
+    trazas.instrumentar_clase(MotorMapa)
+    return MotorMapa()
+
+@st.cache_resource
+def cargar_almacen_imagenes():
+    from almacen_imagenes import AlmacenImagenes
+    trazas.instrumentar_clase(AlmacenImagenes)
+    # Fotos por SHA-256 (sin choques ni copias repetidas) con miniaturas WebP pre-generadas
+    return AlmacenImagenes("datos/imagenes")
+
+@st.cache_resource
+def iniciar_precarga():
+    """
+    PRECARGAR_MOTORES=1: construye todos los motores en un hilo de fondo al
+    arrancar, para que la primera búsqueda/registro no espere a ResNet50 ni a FAISS.
+    """
+    def precargar():
+        for cargar in (cargar_motor_faiss, cargar_servicio_inferencia, cargar_motor_geo, cargar_motor_mapa, cargar_motor_ocr):
+            try:
+                cargar()
+            except Exception as e:
+                print(f"Error precarga ({cargar.__name__}): {e}")
+    hilo = threading.Thread(target=precargar, name="precarga-motores", daemon=True)
+    hilo.start()
+    return hilo
+
+if os.environ.get("PRECARGAR_MOTORES") == "1":
+    iniciar_precarga()
 
 # ==========================================
 # BARRA LATERAL: REGISTRO (CON MEMORIA)
@@ -67,59 +196,90 @@ with st.sidebar:
     foto_subida = st.file_uploader("Subir foto", type=["jpg", "png", "jpeg"])
     
     if st.button("Registrar") and foto_subida and nombre:
-        with st.spinner("Procesando..."):
+        with st.spinner("Procesando..."), trazas.tramo("app.registro"):
             # Limpiamos estado anterior
             st.session_state.ultimo_registro = None
+            servicio, motor_geo, motor_faiss = cargar_servicio_inferencia(), cargar_motor_geo(), cargar_motor_faiss()
             
-            es_animal, etiqueta = motor_vis.es_mascota(foto_subida)
-            lat, lon = motor_geo.obtener_coordenadas(distrito, referencia)
+            # Foto idéntica (mismo SHA-256) ya registrada: no se duplica el reporte
+            hash_foto = servicio.motor.cache.hash_imagen(foto_subida.getvalue())
+            duplicado = db.obtener_por_hash(hash_foto)
             
-            if not es_animal:
-                st.error(f"❌ Error: {etiqueta}")
+            if duplicado and duplicado["estado"] in ("vencido", "resuelto"):
+                # La misma foto de un caso cerrado: la mascota se volvió a perder, se reabre
+                # el reporte y vuelve al índice (los descartados como spam siguen bloqueados)
+                for fila in db.obtener_por_ids(db.cambiar_estado([duplicado["id"]], "abierto")):
+                    motor_faiss.agregar_vector(fila["id"], fila["vector"], fila["h3_index"])
+                st.session_state.ultimo_registro = {
+                    "id": duplicado["id"],
+                    "status": "reabierto",
+                    "nombre": duplicado["nombre"],
+                    "alerta": None
+                }
+            elif duplicado:
+                st.session_state.ultimo_registro = {
+                    "id": duplicado["id"],
+                    "status": "duplicado",
+                    "nombre": duplicado["nombre"],
+                    "alerta": None
+                }
             else:
-                ruta_img = f"datos/imagenes/{nombre}_{foto_subida.name}"
-                with open(ruta_img, "wb") as f:
-                    f.write(foto_subida.getbuffer())
+                # Una sola decodificación y una sola pasada del tronco (clasificación + embedding)
+                # (vía el servicio compartido, que la agrupa con las de otras sesiones)
+                # Espera al servicio (cola + inferencia); el detalle queda en los tramos MotorVision.*
+                with trazas.tramo("app.registro.inferencia"):
+                    es_animal, etiqueta, vector_nuevo = servicio.analizar(foto_subida.getvalue()).result()
+                lat, lon = motor_geo.obtener_coordenadas(distrito, referencia)
                 
-                vector_nuevo = motor_vis.obtener_embedding(ruta_img)
-                h3_index = motor_geo.obtener_h3_index(lat, lon)
+                if not es_animal:
+                    st.error(f"❌ Error: {etiqueta}")
+                elif vector_nuevo is None:
+                    st.error("❌ Error: No se pudo procesar la imagen")
+                else:
+                    # Original + miniaturas en el almacén por contenido (mismo hash que la BD)
+                    ruta_img = cargar_almacen_imagenes().guardar(foto_subida.getvalue(), hash_foto)
                 
-                # --- LÓGICA DE ALERTAS ---
-                scores, ids = motor_faiss.buscar(vector_nuevo, k=3)
-                alerta_data = None
+                    h3_index = motor_geo.obtener_h3_index(lat, lon)
                 
-                ids_limpios = [int(i) for i in ids if i != -1]
-                candidatos = db.obtener_por_ids(ids_limpios)
+                    # --- LÓGICA DE ALERTAS ---
+                    # Solo candidatos de la zona (k-ring H3), con respaldo global si no hay suficientes
+                    scores, ids = motor_faiss.buscar_en_zona(vector_nuevo, h3_index, k=3)
+                    alerta_data = None
                 
-                for cand in candidatos:
-                    idx = list(ids).index(cand["id"])
-                    s_vis = scores[idx]
-                    s_geo = motor_geo.calcular_score_geo(h3_index, cand["h3_index"])
-                    s_final = (0.6 * s_vis) + (0.4 * s_geo)
-                    
-                    if s_final > 0.85:
+                    ids_limpios = [int(i) for i in ids if i != -1]
+                    candidatos = db.obtener_por_ids(ids_limpios)
+                
+                    # Re-ranking vectorizado (0.6 visual + 0.4 geo); se alerta por el mejor candidato
+                    ranking = motor_geo.rerankear_candidatos(ids, scores, candidatos, h3_index, lat, lon)
+                    if ranking and ranking[0]["score"] > 0.85:
                         alerta_data = {
-                            "match_id": cand["id"],
-                            "match_nombre": cand["nombre"],
-                            "score": s_final
+                            "match_id": ranking[0]["id"],
+                            "match_nombre": ranking[0]["nombre"],
+                            "match_imagen": ranking[0]["ruta_imagen"],
+                            "score": ranking[0]["score"]
                         }
-                        break 
 
-                # Guardar en BD
-                nuevo_id = db.guardar_mascota(nombre, distrito, h3_index, lat, lon, ruta_img, vector_nuevo)
-                motor_faiss.agregar_vector(nuevo_id, vector_nuevo)
+                    # Guardar en BD
+                    nuevo_id = db.guardar_mascota(nombre, distrito, h3_index, lat, lon, ruta_img, vector_nuevo, hash_foto)
+                    st.session_state.mis_reportes.add(nuevo_id)
+                    motor_faiss.agregar_vector(nuevo_id, vector_nuevo, h3_index)
                 
-                # --- GUARDAR EN MEMORIA PARA QUE NO DESAPAREZCA ---
-                st.session_state.ultimo_registro = {
-                    "id": nuevo_id,
-                    "status": "success",
-                    "alerta": alerta_data
-                }
+                    # --- GUARDAR EN MEMORIA PARA QUE NO DESAPAREZCA ---
+                    st.session_state.ultimo_registro = {
+                        "id": nuevo_id,
+                        "status": "success",
+                        "alerta": alerta_data
+                    }
 
     # --- MOSTRAR RESULTADO DEL REGISTRO (PERSISTENTE) ---
     if st.session_state.ultimo_registro:
         reg = st.session_state.ultimo_registro
-        st.success(f"✅ Registrado (ID: {reg['id']})")
+        if reg["status"] == "duplicado":
+            st.warning(f"♻️ Esta foto ya fue registrada como **{reg['nombre']}** (ID: {reg['id']}). No se creó un reporte nuevo.")
+        elif reg["status"] == "reabierto":
+            st.info(f"🔁 Esta foto pertenece al reporte cerrado **{reg['nombre']}** (ID: {reg['id']}): se reabrió y vuelve a aparecer en búsquedas y en el mapa.")
+        else:
+            st.success(f"✅ Registrado (ID: {reg['id']})")
         
         if reg["alerta"]:
             # Solo mostramos globos una vez (opcional, o cada vez que se renderiza)
@@ -132,8 +292,24 @@ with st.sidebar:
                 📧 **Acción Automática:**
                 Se ha enviado un correo de notificación al propietario original.
             """)
-        else:
+            miniatura = cargar_almacen_imagenes().miniatura(reg["alerta"]["match_imagen"], "mediana")
+            if miniatura:
+                st.image(miniatura, caption=reg["alerta"]["match_nombre"], use_container_width=True)
+        elif reg["status"] == "success":
             st.caption("ℹ️ No se detectaron coincidencias previas.")
+        
+        # El motor ya está cargado si hubo un registro; mostramos la efectividad de la caché
+        cache = cargar_motor_vision().cache
+        st.caption(f"🧠 Caché de inferencia: {cache.tasa_aciertos():.0%} de aciertos "
+                   f"({cache.estadisticas['hits_memoria']} memoria / {cache.estadisticas['hits_disco']} disco / "
+                   f"{cache.estadisticas['fallos']} fallos)")
+
+    if CLAVE_ADMIN:
+        with st.expander("🔐 Moderación"):
+            clave = st.text_input("Clave de administrador", type="password", key="clave_admin")
+            if clave and not hmac.compare_digest(clave, CLAVE_ADMIN):
+                st.error("Clave incorrecta")
+    es_admin = bool(CLAVE_ADMIN) and hmac.compare_digest(st.session_state.get("clave_admin", ""), CLAVE_ADMIN)
 
 # ==========================================
 # ÁREA PRINCIPAL
@@ -150,29 +326,19 @@ with tab1:
         referencia_q = st.text_input("Referencia Hallazgo", placeholder="Ej. Ovalo Higuereta", key="ref_q")
     
     if foto_query and c1.button("Buscar"):
-        with st.spinner("Buscando..."):
-            vector_q = motor_vis.obtener_embedding(foto_query)
+        with st.spinner("Buscando..."), trazas.tramo("app.busqueda"):
+            servicio, motor_geo, motor_faiss = cargar_servicio_inferencia(), cargar_motor_geo(), cargar_motor_faiss()
+            with trazas.tramo("app.busqueda.inferencia"):
+                vector_q = servicio.obtener_embedding(foto_query.getvalue()).result()
             lat_q, lon_q = motor_geo.obtener_coordenadas(distrito_q, referencia_q)
             h3_q = motor_geo.obtener_h3_index(lat_q, lon_q)
             
-            scores_visuales, ids_candidatos = motor_faiss.buscar(vector_q, k=5)
+            scores_visuales, ids_candidatos = motor_faiss.buscar_en_zona(vector_q, h3_q, k=5)
             ids_lista = [int(id) for id in ids_candidatos if id != -1]
             candidatos_db = db.obtener_por_ids(ids_lista)
             
-            resultados_temp = []
-            
-            for cand in candidatos_db:
-                idx_faiss = list(ids_candidatos).index(cand["id"])
-                sim_vis = scores_visuales[idx_faiss]
-                sim_geo = motor_geo.calcular_score_geo(h3_q, cand["h3_index"])
-                score_final = (0.6 * sim_vis) + (0.4 * sim_geo)
-                dist_km = motor_geo.haversine_km(lat_q, lon_q, cand["lat"], cand["lon"])
-                
-                resultados_temp.append({
-                    **cand, "score": score_final, "vis": sim_vis, "geo": sim_geo, "dist_km": dist_km
-                })
-            
-            resultados_temp.sort(key=lambda x: x["score"], reverse=True)
+            # Scores visual + geo, distancias y orden en una sola pasada NumPy
+            resultados_temp = motor_geo.rerankear_candidatos(ids_candidatos, scores_visuales, candidatos_db, h3_q, lat_q, lon_q)
             
             st.session_state.search_results = resultados_temp
             st.session_state.search_center = (lat_q, lon_q)
@@ -183,7 +349,11 @@ with tab1:
             lat_centro, lon_centro = st.session_state.search_center
             
             if st.session_state.search_results:
-                mapa_res = motor_mapa.mapa_resultados(lat_centro, lon_centro, st.session_state.search_results[:5])
+                from streamlit_folium import st_folium
+                mapa_res = cargar_motor_mapa().mapa_resultados(
+                    lat_centro, lon_centro, st.session_state.search_results[:5],
+                    obtener_miniatura=cargar_almacen_imagenes().data_uri
+                )
                 st_folium(mapa_res, height=300, use_container_width=True)
             
             st.divider()
@@ -200,14 +370,29 @@ with tab1:
                 with st.container(border=True):
                     col_img, col_info = st.columns([1, 3])
                     with col_img:
-                        if os.path.exists(res["ruta_imagen"]):
-                            st.image(res["ruta_imagen"], width=100)
+                        # Miniatura de pocos KB en vez del original completo en cada rerun
+                        miniatura = cargar_almacen_imagenes().miniatura(res["ruta_imagen"])
+                        if miniatura:
+                            st.image(miniatura, width=100)
                     with col_info:
                         st.markdown(f"### {res['nombre']} {emoji}")
                         st.caption(f"{msg} (Score: {res['score']*100:.1f}%)")
                         st.progress(float(res['score']))
                         st.markdown(f"**Distancia:** {res['dist_km']:.2f} km")
                         st.text(f"📍 {res['distrito']} | 👁️ Visión: {res['vis']:.2f}")
+                        # Cerrar un caso lo saca de las búsquedas y del mapa: siempre con confirmación,
+                        # y "Spam" solo para el autor del reporte (esta sesión) o un administrador
+                        acciones = [("🏠 Reunida", "resuelto", "¿Esta mascota ya volvió a casa?")]
+                        if es_admin or res["id"] in st.session_state.mis_reportes:
+                            acciones.append(("🚫 Spam", "descartado", "¿Marcar este reporte como spam?"))
+                        for columna, (etiqueta, estado, pregunta) in zip(st.columns(len(acciones)), acciones):
+                            with columna.popover(etiqueta):
+                                st.markdown(pregunta)
+                                st.caption("El reporte dejará de aparecer en las búsquedas y en el mapa.")
+                                if st.button("Confirmar", key=f"{estado}_{res['id']}", type="primary"):
+                                    cerrar_caso(res["id"], estado)
+                                    st.session_state.search_results = [r for r in st.session_state.search_results if r["id"] != res["id"]]
+                                    st.rerun()
 
 # --- PESTAÑA 2: OCR (Diseño "Antes vs Después" para PPT) ---
 with tab2:
@@ -220,7 +405,8 @@ with tab2:
     if afiche and st.button("Analizar Afiche"):
         
         # Procesamiento
-        with st.spinner("Procesando imagen con Tesseract y NLP..."):
+        with st.spinner("Procesando imagen con Tesseract y NLP..."), trazas.tramo("app.ocr"):
+            motor_ocr = cargar_motor_ocr()
             texto = motor_ocr.extraer_texto(afiche)
             info = motor_ocr.analizar_texto(texto)
         
@@ -283,14 +469,57 @@ with tab3:
         st.session_state.mostrar_mapa_global = True
     
     if st.session_state.mostrar_mapa_global:
-        datos = db.obtener_todas()
-        if datos:
+        # Conteos mantenidos por celda H3: el costo depende de las celdas ocupadas, no de los reportes
+        por_distrito = db.contar_por_distrito()
+        if por_distrito:
             col_map, col_tabla = st.columns([2, 1])
             with col_map:
-                mapa_global = motor_mapa.mapa_calor_bd(datos)
+                c_res, c_modo = st.columns(2)
+                resolucion = c_res.select_slider("Detalle (resolución H3)", options=[7, 8, 9], value=9)
+                modo = c_modo.radio("Vista", ["calor", "hexagonos"], horizontal=True)
+                from streamlit_folium import st_folium
+                # Mientras no cambien los datos, el mapa sale de la caché del motor
+                mapa_global = cargar_motor_mapa().mapa_calor_agregado(
+                    resolucion, db.generacion_conteo(), db.obtener_conteo_celdas, modo
+                )
                 st_folium(mapa_global, height=500, use_container_width=True)
             with col_tabla:
-                st.write(f"**Total Registros:** {len(datos)}")
-                st.dataframe([{k:v for k,v in d.items() if k in ['nombre', 'distrito', 'lat', 'lon']} for d in datos], height=400)
+                st.write(f"**Casos abiertos:** {sum(total for _, total in por_distrito)}")
+                st.dataframe([{"distrito": d, "reportes": total} for d, total in por_distrito], height=400)
         else:
-            st.warning("No hay datos registrados aún.")
\ No newline at end of file
+            st.warning("No hay datos registrados aún.")
+
+# --- DIAGNÓSTICO DE RENDIMIENTO (solo con TRAZAS=1) ---
+@st.cache_resource
+def iniciar_exportacion_trazas():
+    # TRAZAS_PROMETHEUS / TRAZAS_JSONL: rutas donde volcar las métricas periódicamente
+    return trazas.iniciar_exportacion(
+        os.environ.get("TRAZAS_PROMETHEUS"), os.environ.get("TRAZAS_JSONL"),
+        cada_s=float(os.environ.get("TRAZAS_CADA_S", 15))
+    )
+
+if trazas.activo():
+    iniciar_exportacion_trazas()
+    with st.sidebar.expander("⏱️ Diagnóstico de rendimiento"):
+        etapas = trazas.instantanea()
+        if etapas:
+            st.dataframe([
+                {"etapa": e["etapa"], "llamadas": e["llamadas"], "errores": e["errores"],
+                 "p50 ms": round(e["p50_ms"], 2), "p95 ms": round(e["p95_ms"], 2), "total s": round(e["total_s"], 2)}
+                for e in etapas
+            ], hide_index=True)
+        else:
+            st.caption("Todavía no hay tramos registrados.")
+        d1, d2 = st.columns(2)
+        d1.download_button("Prometheus", trazas.texto_prometheus(), file_name="mascotas.prom")
+        d2.download_button("JSON lines", trazas.texto_jsonl(), file_name="trazas.jsonl")
+        if st.button("Reiniciar contadores"):
+            trazas.reiniciar()
+            st.rerun()
+
+# --- TIEMPO HASTA EL PRIMER RENDER ---
+# Se mide en la primera ejecución del script de cada sesión (y se registra en el log)
+# para detectar regresiones de arranque; ver benchmarks/bench_arranque.py.
+if "t_primer_render" not in st.session_state:
+    st.session_state.t_primer_render = time.perf_counter() - _T_INICIO_SCRIPT
+    print(f"[arranque] Primer render en {st.session_state.t_primer_render * 1000:.0f} ms")
@@ -0,0 +1,68 @@
+"""
+Benchmark del almacén de embeddings mapeado en memoria frente a leer los BLOBs de SQLite.
+
+- Matriz completa (N, 2048): iterar_embeddings leyendo BLOBs vs. vista memmap.
+- Re-ranking: obtener_vectores de k*factor ids aleatorios, con y sin almacén.
+Trabaja sobre una BD temporal; no toca tesis_mascotas.db.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_almacen.py --n 20000 --consultas 200 --candidatos 40
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+
+def cronometrar(funcion, repeticiones=1):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return (time.perf_counter() - t0) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=20_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--candidatos", type=int, default=40, help="ids por re-ranking (k * factor)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        db.init_db()
+        for inicio in range(0, args.n, 1000):
+            m = min(1000, args.n - inicio)
+            vectores = rng.standard_normal((m, db.DIMENSION_ALMACEN)).astype(np.float32)
+            db.guardar_mascotas_lote([("Bench", "Lima", "898e62c5077ffff", -12.05, -77.04, "x.jpg", v, None) for v in vectores])
+
+        lotes_rerank = [rng.integers(1, args.n + 1, args.candidatos) for _ in range(args.consultas)]
+        print(f"{args.n} filas de {db.DIMENSION_ALMACEN} dimensiones")
+        print(f"{'operación':<28}{'sqlite':>12}{'almacén':>12}")
+
+        def matriz_sqlite():
+            return np.concatenate([m for _, m, _ in db.iterar_embeddings(0, db.DIMENSION_ALMACEN, usar_almacen=False)])
+        t_sql, m_sql = cronometrar(matriz_sqlite)
+        t_mm, m_mm = cronometrar(lambda: db.almacen().matriz())
+        assert np.array_equal(m_sql, np.asarray(m_mm))
+        print(f"{'matriz completa (ms)':<28}{1000 * t_sql:>12.1f}{1000 * t_mm:>12.3f}")
+
+        db.ALMACEN_ACTIVO = False
+        t_sql, _ = cronometrar(lambda: [db.obtener_vectores(ids) for ids in lotes_rerank])
+        db.ALMACEN_ACTIVO = True
+        t_mm, _ = cronometrar(lambda: [db.obtener_vectores(ids) for ids in lotes_rerank])
+        print(f"{'re-ranking por consulta (ms)':<28}{1000 * t_sql / args.consultas:>12.3f}{1000 * t_mm / args.consultas:>12.3f}")
+
+        print(db.almacen().verificar((ids, m) for ids, m, _ in db.iterar_embeddings(0, db.DIMENSION_ALMACEN, usar_almacen=False, solo_abiertos=False)))
+        db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Tiempo hasta el primer render de app.py (sin clics: el usuario solo abre la página).
+
+Ejecuta la app con el arnés de pruebas de Streamlit (AppTest), mide el tiempo
+de la primera ejecución del script y verifica que no se hayan importado los
+módulos pesados: con la carga perezosa, abrir la página no debe cargar
+torch/faiss/folium/pytesseract.
+
+Uso (desde la raíz del repo; conviene un proceso nuevo por medición):
+    python benchmarks/bench_arranque.py --max-segundos 3
+"""
+import argparse
+import os
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULOS_PESADOS = ("torch", "torchvision", "faiss", "folium", "geopy", "pytesseract")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-segundos", type=float, default=None,
+                        help="Falla si el primer render tarda más que esto")
+    args = parser.parse_args()
+
+    os.chdir(RAIZ)
+    sys.path.insert(0, RAIZ)
+    from streamlit.testing.v1 import AppTest
+
+    t0 = time.perf_counter()
+    app = AppTest.from_file("app.py", default_timeout=600)
+    app.run()
+    t_render = time.perf_counter() - t0
+
+    if app.exception:
+        sys.exit(f"ERROR: la app lanzó una excepción: {app.exception[0].message}")
+
+    pesados = [m for m in MODULOS_PESADOS if m in sys.modules]
+    print(f"Primer render: {t_render * 1000:.0f} ms")
+    print(f"Módulos pesados importados: {', '.join(pesados) or 'ninguno'}")
+
+    if pesados:
+        sys.exit("ERROR: el primer render importó módulos pesados (se rompió la carga perezosa)")
+    if args.max_segundos is not None and t_render > args.max_segundos:
+        sys.exit(f"ERROR: primer render {t_render:.2f} s > {args.max_segundos:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
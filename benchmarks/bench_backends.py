@@ -0,0 +1,73 @@
+"""
+Paridad y latencia de los backends de inferencia de MotorVision.
+
+Para cada backend se calculan los embeddings de las fotos de muestra y se
+comparan (similitud coseno) contra el backend eager; también se comprueba que
+la clasificación perro/gato no cambie. Termina con error si algún backend se
+aleja del umbral.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_backends.py --backends eager torchscript onnx int8 --hilos 4
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_vision import MotorVision
+
+# Coseno mínimo aceptado frente a eager (int8 pierde algo de precisión por diseño)
+UMBRAL_COSENO = {"int8": 0.98}
+UMBRAL_COSENO_DEFECTO = 0.9999
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imagenes", default="datos/imagenes")
+    parser.add_argument("--backends", nargs="+", default=list(MotorVision.BACKENDS))
+    parser.add_argument("--hilos", type=int, default=None, help="Hilos de inferencia")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    rutas = sorted(glob.glob(os.path.join(args.imagenes, "*.jpg")))
+    if not rutas:
+        sys.exit(f"No hay imágenes en {args.imagenes}")
+
+    referencia = MotorVision(backend="eager", num_hilos=args.hilos)
+    emb_ref = np.stack([referencia.obtener_embedding(r) for r in rutas])
+    clases_ref = [referencia.es_mascota(r)[0] for r in rutas]
+
+    fallos = []
+    print(f"{'backend':<13}{'carga s':>9}{'ms/img':>9}{'coseno mín':>12}{'clases':>8}")
+    for backend in args.backends:
+        try:
+            t0 = time.perf_counter()
+            motor = MotorVision(backend=backend, num_hilos=args.hilos)
+            t_carga = time.perf_counter() - t0
+        except ImportError as e:
+            print(f"{backend:<13}(omitido: {e})")
+            continue
+
+        motor.obtener_embedding(rutas[0])  # Calentamiento (compile / onnx)
+        t0 = time.perf_counter()
+        for _ in range(args.repeticiones):
+            embs = np.stack([motor.obtener_embedding(r) for r in rutas])
+        ms_img = 1000 * (time.perf_counter() - t0) / (args.repeticiones * len(rutas))
+
+        coseno = np.sum(embs * emb_ref, axis=1) / (np.linalg.norm(embs, axis=1) * np.linalg.norm(emb_ref, axis=1))
+        clases_ok = [motor.es_mascota(r)[0] for r in rutas] == clases_ref
+        print(f"{backend:<13}{t_carga:>9.1f}{ms_img:>9.1f}{coseno.min():>12.5f}{'ok' if clases_ok else 'DIF':>8}")
+
+        if coseno.min() < UMBRAL_COSENO.get(backend, UMBRAL_COSENO_DEFECTO) or not clases_ok:
+            fallos.append(backend)
+
+    if fallos:
+        sys.exit(f"ERROR: backends fuera de paridad con eager: {', '.join(fallos)}")
+
+
+if __name__ == "__main__":
+    main()
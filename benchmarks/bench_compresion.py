@@ -0,0 +1,78 @@
+"""
+Benchmark de almacenamiento compacto de embeddings.
+
+- Índice: memoria (tamaño serializado) y recall@k con/sin re-ranking exacto
+  para PCA, fp16, sq8 y PQ frente al índice plano float32.
+- BD: bytes por fila de cada formato de db.codificar_embedding y error de reconstrucción.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_compresion.py --n 50000 --dim-pca 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from motor_faiss import MotorFAISS
+from bench_faiss import generar_datos, medir, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=2048)
+    parser.add_argument("--dim-pca", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    base, consultas = generar_datos(args.n, args.consultas, args.dimension)
+    ids_db = np.arange(1, args.n + 1, dtype=np.int64)
+    exactos = lambda ids: base[np.asarray(ids) - 1]
+
+    referencia = MotorFAISS(dimension=args.dimension, tipo="flat")
+    referencia.construir(ids_db, base)
+    ids_exactos, _ = medir(referencia, consultas, args.k)
+    bytes_ref = len(faiss.serialize_index(referencia.index))
+
+    configuraciones = [
+        ("flat fp32", dict(tipo="flat")),
+        ("flat fp16", dict(tipo="flat", codificacion="fp16")),
+        ("flat sq8", dict(tipo="flat", codificacion="sq8")),
+        (f"PCA{args.dim_pca} fp32", dict(tipo="flat", dim_pca=args.dim_pca)),
+        (f"PCA{args.dim_pca} sq8", dict(tipo="flat", dim_pca=args.dim_pca, codificacion="sq8")),
+        ("IVF-PQ", dict(tipo="ivfpq")),
+    ]
+
+    print(f"== Índice (N={args.n}, k={args.k}) ==")
+    print(f"{'config':<16}{'MB':>9}{'ahorro':>8}{'recall':>8}{'+rerank':>9}{'p50 ms':>9}")
+    for nombre, config in configuraciones:
+        motor = MotorFAISS(dimension=args.dimension, **config)
+        motor.construir(ids_db, base)
+        tam = len(faiss.serialize_index(motor.index))
+
+        ids_sin, _ = medir(motor, consultas, args.k)
+        motor.obtener_vectores = exactos
+        ids_con, lat = medir(motor, consultas, args.k)
+        print(f"{nombre:<16}{tam / 2**20:>9.1f}{bytes_ref / tam:>7.1f}x{recall(ids_sin, ids_exactos):>8.3f}"
+              f"{recall(ids_con, ids_exactos):>9.3f}{np.percentile(lat, 50):>9.2f}")
+
+    print("\n== BD: bytes por embedding ==")
+    muestra = base[:1000] * 30.0  # escala típica de un pooling ResNet50 sin normalizar
+    for formato in db.FORMATOS_EMBEDDING:
+        t0 = time.perf_counter()
+        blobs = [db.codificar_embedding(v, formato) for v in muestra]
+        t_cod = time.perf_counter() - t0
+        dec = np.stack([db.decodificar_embedding(b, formato) for b in blobs])
+        coseno = np.sum(dec * muestra, axis=1) / (np.linalg.norm(dec, axis=1) * np.linalg.norm(muestra, axis=1))
+        print(f"{formato:<8}{len(blobs[0]):>7} B  ahorro {4 * args.dimension / len(blobs[0]):>4.1f}x  "
+              f"coseno mín {coseno.min():.5f}  codificar {1e6 * t_cod / len(blobs):.1f} µs/vec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Consultas por zona, distrito y fecha sobre mascotas: tiempo con índices frente a
+recorrer toda la tabla en Python, y verificación con EXPLAIN QUERY PLAN de que
+cada consulta es un range scan de índice (nunca "SCAN mascotas").
+Trabaja sobre una BD temporal; no toca tesis_mascotas.db.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_consultas.py --n 100000 --repeticiones 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import h3
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+DISTRITOS = ["Miraflores", "Surco", "San Isidro", "Barranco", "Lince", "La Molina", "Comas", "Callao"]
+
+
+def sembrar(n, rng):
+    """Filas sintéticas repartidas en Lima y en los últimos 180 días (sin embeddings)."""
+    lats = rng.uniform(-12.20, -11.90, n)
+    lons = rng.uniform(-77.15, -76.90, n)
+    ahora = datetime.now(timezone.utc)
+    filas = []
+    for i in range(n):
+        h3_index = h3.latlng_to_cell(lats[i], lons[i], 9)
+        fecha = (ahora - timedelta(minutes=int(rng.integers(0, 180 * 24 * 60)))).strftime("%Y-%m-%d %H:%M:%S")
+        filas.append(("Bench", DISTRITOS[i % len(DISTRITOS)], h3_index, *db._celdas_padre(h3_index),
+                      float(lats[i]), float(lons[i]), fecha))
+    with db.transaccion() as c:
+        c.executemany(
+            "INSERT INTO mascotas (nombre, distrito, h3_index, h3_r7, h3_r8, lat, lon, fecha_registro) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            filas
+        )
+
+
+def plan(funcion):
+    """Ejecuta funcion() capturando sus SELECT y retorna el EXPLAIN QUERY PLAN de cada uno."""
+    conn = db.conexion()
+    sentencias = []
+    conn.set_trace_callback(lambda sql: sentencias.append(sql) if sql.lstrip().upper().startswith("SELECT") else None)
+    try:
+        funcion()
+    finally:
+        conn.set_trace_callback(None)
+    planes = []
+    for sql in sentencias:
+        # El plan no depende de los valores: basta con ligar NULLs a los parámetros que queden
+        filas = conn.execute("EXPLAIN QUERY PLAN " + sql, [None] * sql.count("?")).fetchall()
+        planes.append([fila[-1] for fila in filas])
+    return planes
+
+
+def cronometrar(funcion, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return 1000 * (time.perf_counter() - t0) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        db.ALMACEN_ACTIVO = False
+        db.init_db()
+        sembrar(args.n, rng)
+        db.conexion().execute("ANALYZE")
+
+        centro = h3.latlng_to_cell(-12.1211, -77.0297, 9)  # Miraflores
+        desde = db.hace_dias(14)
+        todas = list(db.iterar_mascotas(("id", "distrito", "h3_index", "fecha_registro")))
+
+        def escaneo_zona():
+            celdas = set(h3.grid_disk(h3.cell_to_parent(centro, 8), 1))
+            limite = db._fecha_sql(desde)
+            return [r for r in todas if h3.cell_to_parent(r["h3_index"], 8) in celdas and r["fecha_registro"] >= limite]
+
+        casos = [
+            ("zona k=1 últimos 14 días", lambda: db.obtener_recientes_cerca(centro, anillos=1, dias=14), escaneo_zona),
+            ("zona res.7 k=2", lambda: db.obtener_por_zona(h3.grid_disk(h3.cell_to_parent(centro, 7), 2)), None),
+            ("distrito últimos 14 días", lambda: db.obtener_por_distrito("Surco", desde=desde),
+             lambda: [r for r in todas if r["distrito"] == "Surco" and r["fecha_registro"] >= db._fecha_sql(desde)]),
+            ("última semana", lambda: db.obtener_por_fecha(desde=db.hace_dias(7)), None),
+        ]
+
+        print(f"{args.n} filas")
+        print(f"{'consulta':<28}{'filas':>8}{'índice ms':>11}{'escaneo ms':>12}")
+        fallas = []
+        for nombre, consulta, escaneo in casos:
+            ms, filas = cronometrar(consulta, args.repeticiones)
+            if escaneo is not None:
+                ms_escaneo, esperadas = cronometrar(escaneo, max(1, args.repeticiones // 10))
+                assert sorted(r["id"] for r in filas) == sorted(r["id"] for r in esperadas), nombre
+                texto_escaneo = f"{ms_escaneo:>12.2f}"
+            else:
+                texto_escaneo = f"{'-':>12}"
+            print(f"{nombre:<28}{len(filas):>8}{ms:>11.2f}{texto_escaneo}")
+
+            # Toda lectura de mascotas debe ser SEARCH (rango de índice), nunca SCAN (tabla o índice completo)
+            for pasos in plan(consulta):
+                print(f"    plan: {' | '.join(pasos)}")
+                fallas += [f"{nombre}: {paso}" for paso in pasos if paso.startswith("SCAN mascotas")]
+
+        db.cerrar_conexion()
+
+    if fallas:
+        sys.exit("Consultas sin índice:\n" + "\n".join(fallas))
+    print("EXPLAIN QUERY PLAN: todas las consultas usan índices")
+
+
+if __name__ == "__main__":
+    main()
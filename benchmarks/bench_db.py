@@ -0,0 +1,109 @@
+"""
+Benchmark de concurrencia de db.py: inserciones y lecturas mezcladas desde varios hilos.
+
+Compara el esquema anterior (una conexión nueva por operación, journal por
+defecto) con las conexiones persistentes por hilo en modo WAL. Trabaja sobre
+una BD temporal; no toca tesis_mascotas.db.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_db.py --escritores 4 --lectores 8 --operaciones 200
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+
+
+def insertar_legado(fila):
+    conn = sqlite3.connect(db.DB_NAME)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO mascotas (nombre, distrito, h3_index, lat, lon, ruta_imagen, embedding)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', fila[:6] + (fila[6].tobytes(),))
+    conn.commit()
+    conn.close()
+
+
+def leer_legado(ids):
+    conn = sqlite3.connect(db.DB_NAME)
+    c = conn.cursor()
+    c.execute(f"SELECT id, nombre, distrito, h3_index, ruta_imagen, embedding, lat, lon FROM mascotas WHERE id IN ({','.join(map(str, ids))})")
+    c.fetchall()
+    conn.close()
+
+
+def correr(modo, args, vectores):
+    insertar = insertar_legado if modo == "legado" else (lambda fila: db.guardar_mascota(*fila))
+    leer = leer_legado if modo == "legado" else db.obtener_por_ids
+    errores, latencias_lectura = [], []
+
+    def escritor():
+        for i in range(args.operaciones):
+            try:
+                insertar(("Bench", "Lima", "898e62c5077ffff", -12.05, -77.04, "x.jpg", vectores[i % len(vectores)]))
+            except sqlite3.OperationalError as e:
+                errores.append(str(e))
+
+    def lector():
+        rng = np.random.default_rng(threading.get_ident())
+        for _ in range(args.operaciones):
+            ids = [int(i) for i in rng.integers(1, args.filas_iniciales, 5)]
+            t0 = time.perf_counter()
+            try:
+                leer(ids)
+            except sqlite3.OperationalError as e:
+                errores.append(str(e))
+            latencias_lectura.append(1000 * (time.perf_counter() - t0))
+
+    hilos = [threading.Thread(target=escritor) for _ in range(args.escritores)]
+    hilos += [threading.Thread(target=lector) for _ in range(args.lectores)]
+    t0 = time.perf_counter()
+    for h in hilos: h.start()
+    for h in hilos: h.join()
+    segundos = time.perf_counter() - t0
+
+    ops = (args.escritores + args.lectores) * args.operaciones
+    lat = np.array(latencias_lectura)
+    print(f"{modo:<8}{ops / segundos:>10.0f}{np.percentile(lat, 50):>10.2f}{np.percentile(lat, 95):>10.2f}{len(errores):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--lectores", type=int, default=8)
+    parser.add_argument("--operaciones", type=int, default=200, help="Operaciones por hilo")
+    parser.add_argument("--filas-iniciales", type=int, default=2000)
+    args = parser.parse_args()
+
+    vectores = np.random.default_rng(1).standard_normal((64, 2048)).astype(np.float32)
+    print(f"{'modo':<8}{'ops/s':>10}{'lect p50':>10}{'lect p95':>10}{'errores':>9}")
+
+    for modo in ("legado", "wal"):
+        with tempfile.TemporaryDirectory() as tmp:
+            db.DB_NAME = os.path.join(tmp, "bench.db")
+            # Esquema y filas semilla con una conexión cruda (journal por defecto, como antes)
+            conn = sqlite3.connect(db.DB_NAME)
+            db._crear_esquema(conn.cursor())
+            conn.executemany(
+                "INSERT INTO mascotas (nombre, distrito, embedding) VALUES (?, ?, ?)",
+                [("Semilla", "Lima", vectores[i % 64].tobytes()) for i in range(args.filas_iniciales)]
+            )
+            conn.commit()
+            conn.close()
+            if modo == "wal":
+                db.init_db()  # Abre la conexión persistente y activa WAL + pragmas
+            correr(modo, args, vectores)
+            db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Eliminación en MotorFAISS: costo de eliminar(), y latencia / recall de la búsqueda
+a medida que se acumulan lápidas (IVF y HNSW no borran en el lugar), comparado con
+el índice ya compactado. El recall se mide contra la búsqueda exacta sobre los vivos.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_eliminacion.py --vectores 50000 --dimension 512 --tipos flat ivf hnsw
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_faiss import MotorFAISS
+
+
+def medir_busqueda(motor, consultas, vivos_ids, vivos, k=10):
+    """(ms por consulta, recall@k contra la fuerza bruta sobre los vectores vivos)."""
+    t0 = time.perf_counter()
+    resultados = [motor.buscar(q, k)[1] for q in consultas]
+    ms = 1000 * (time.perf_counter() - t0) / len(consultas)
+    exactos = vivos_ids[np.argsort(-(consultas @ vivos.T), axis=1)[:, :k]]
+    recall = np.mean([len(set(r.tolist()) & set(e.tolist())) / k for r, e in zip(resultados, exactos)])
+    return ms, recall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectores", type=int, default=50_000)
+    parser.add_argument("--dimension", type=int, default=512)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--tipos", nargs="+", default=["flat", "ivf", "hnsw"])
+    parser.add_argument("--fracciones", type=float, nargs="+", default=[0.1, 0.3, 0.5])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centros = rng.standard_normal((max(1, args.vectores // 500), args.dimension)).astype(np.float32)
+    X = centros[rng.integers(0, len(centros), args.vectores)] + 0.5 * rng.standard_normal((args.vectores, args.dimension)).astype(np.float32)
+    X /= np.linalg.norm(X, axis=1, keepdims=True)
+    ids = np.arange(1, args.vectores + 1, dtype=np.int64)
+    orden_baja = rng.permutation(ids)
+    consultas = X[rng.integers(0, args.vectores, args.consultas)]
+
+    print(f"{'tipo':<6}{'eliminados':>11}{'eliminar ms':>13}{'ms/consulta':>13}{'recall@10':>11}"
+          f"{'compactado ms':>15}{'recall':>8}{'compactar s':>13}")
+    for tipo in args.tipos:
+        motor = MotorFAISS(dimension=args.dimension, tipo=tipo)
+        motor.construir(ids, X)
+        eliminados = 0
+        for fraccion in args.fracciones:
+            objetivo = int(fraccion * args.vectores)
+            t0 = time.perf_counter()
+            motor.eliminar(orden_baja[eliminados:objetivo])
+            ms_eliminar = 1000 * (time.perf_counter() - t0)
+            eliminados = objetivo
+
+            vivos_mask = ~np.isin(ids, orden_baja[:eliminados])
+            vivos_ids, vivos = ids[vivos_mask], X[vivos_mask]
+            ms, recall = medir_busqueda(motor, consultas, vivos_ids, vivos)
+
+            compacto = MotorFAISS(dimension=args.dimension, tipo=tipo)
+            t0 = time.perf_counter()
+            compacto.compactar(lambda id_min: [(vivos_ids[vivos_ids > id_min], vivos[vivos_ids > id_min], None)],
+                               lambda: len(vivos_ids))
+            s_compactar = time.perf_counter() - t0
+            ms_c, recall_c = medir_busqueda(compacto, consultas, vivos_ids, vivos)
+            print(f"{motor.tipo_activo:<6}{eliminados:>11}{ms_eliminar:>13.1f}{ms:>13.2f}{recall:>11.3f}"
+                  f"{ms_c:>15.2f}{recall_c:>8.3f}{s_compactar:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
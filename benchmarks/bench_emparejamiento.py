@@ -0,0 +1,131 @@
+"""
+Emparejamiento de todos contra todos: el trabajo por lotes (emparejamiento.py)
+frente a repetir, reporte por reporte, lo que hace la alerta del registro
+(buscar + obtener_por_ids + rerankear_candidatos). Reporta segundos por cada mil
+consultas y cuántas de las parejas plantadas (otra foto de la misma mascota,
+cerca y unos días después) quedan en coincidencias.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_emparejamiento.py --reportes 20000 --dimension 2048 --muestra 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import h3
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+import emparejamiento
+from motor_faiss import MotorFAISS
+from utils_geo import MotorGeo
+from bench_geocodificacion import GeocodificadorStub
+
+
+def sembrar(n, dimension, rng, motor_geo, proporcion_parejas=0.1, tamano_lote=5000):
+    """
+    n reportes al azar alrededor de los distritos de Lima, con fechas en los
+    últimos 90 días; una fracción tiene una "pareja" (vector + ruido, a ~300 m y
+    hasta 10 días después). Retorna el conjunto de parejas plantadas (id_a, id_b).
+    """
+    distritos = list(motor_geo.coordenadas_distritos.values())
+    n_parejas = int(n * proporcion_parejas / 2)
+    n_base = n - n_parejas
+    centros = rng.standard_normal((max(1, n // 200), dimension)).astype(np.float32)
+
+    vectores = centros[rng.integers(0, len(centros), n_base)] + 0.6 * rng.standard_normal((n_base, dimension)).astype(np.float32)
+    elegidos = np.array(distritos)[rng.integers(0, len(distritos), n_base)]
+    coordenadas = elegidos + rng.normal(0, 0.015, (n_base, 2))
+    dias = rng.uniform(0, 90, n_base)
+
+    originales = rng.choice(n_base, n_parejas, replace=False)
+    vectores = np.concatenate([vectores, vectores[originales] + 0.25 * rng.standard_normal((n_parejas, dimension)).astype(np.float32)])
+    coordenadas = np.concatenate([coordenadas, coordenadas[originales] + rng.normal(0, 0.003, (n_parejas, 2))])
+    dias = np.concatenate([dias, np.maximum(0, dias[originales] - rng.uniform(0, 10, n_parejas))])
+    vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+
+    for inicio in range(0, n, tamano_lote):
+        fin = min(n, inicio + tamano_lote)
+        db.guardar_mascotas_lote([
+            (f"Sintetico {i}", "Lima", h3.latlng_to_cell(float(coordenadas[i, 0]), float(coordenadas[i, 1]), 9),
+             float(coordenadas[i, 0]), float(coordenadas[i, 1]), "", vectores[i], None)
+            for i in range(inicio, fin)
+        ])
+    # fecha_registro sale de CURRENT_TIMESTAMP: se reparte en los últimos 90 días
+    with db.transaccion() as c:
+        c.executemany("UPDATE mascotas SET fecha_registro = datetime('now', ?) WHERE id = ?",
+                      [(f"-{d * 86400:.0f} seconds", i + 1) for i, d in enumerate(dias)])
+    return {(int(o) + 1, n_base + j + 1) for j, o in enumerate(originales)}
+
+
+def uno_por_uno(motor_faiss, motor_geo, ids, vectores, k):
+    """El camino del registro, repetido por cada reporte (sin el término de tiempo)."""
+    pares = 0
+    for id_q, v in zip(ids, vectores):
+        scores, encontrados = motor_faiss.buscar(v, k + 1)
+        candidatos = db.obtener_por_ids([int(i) for i in encontrados if i not in (-1, id_q)])
+        propio = db.obtener_por_ids([int(id_q)])[0]
+        ranking = motor_geo.rerankear_candidatos(encontrados, scores, candidatos, propio["h3_index"], propio["lat"], propio["lon"])
+        pares += sum(r["score"] >= 0.8 for r in ranking)
+    return pares
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reportes", type=int, default=20_000)
+    parser.add_argument("--dimension", type=int, default=2048)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lote", type=int, default=256)
+    parser.add_argument("--muestra", type=int, default=500, help="Consultas del camino uno por uno (se extrapola)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench_emparejamiento.db")
+        db.DIMENSION_ALMACEN = args.dimension
+        db.init_db()
+        motor_geo = MotorGeo(resolucion=9, geocodificador=GeocodificadorStub(0.0, {}))
+        plantadas = sembrar(args.reportes, args.dimension, rng, motor_geo)
+
+        motor_faiss = MotorFAISS(dimension=args.dimension, tipo="auto",
+                                 obtener_vectores=lambda ids: db.obtener_vectores(ids, args.dimension))
+        motor_faiss.sincronizar(
+            os.path.join(tmp, "indice.faiss"),
+            leer_desde=lambda id_min: db.iterar_embeddings(id_min, args.dimension),
+            contar_filas=lambda: db.contar_embeddings(args.dimension)
+        )
+        print(f"{args.reportes} reportes, {len(plantadas)} parejas plantadas, índice {motor_faiss.tipo_activo}")
+
+        ids, vectores, _ = db.obtener_embeddings_desde(0, args.dimension)
+        muestra = rng.choice(len(ids), min(args.muestra, len(ids)), replace=False)
+        t0 = time.perf_counter()
+        uno_por_uno(motor_faiss, motor_geo, ids[muestra], vectores[muestra], args.k)
+        s_por_mil_uno = (time.perf_counter() - t0) * 1000 / len(muestra)
+
+        t0 = time.perf_counter()
+        e = emparejamiento.emparejar(motor_faiss, k=args.k, dias=None, lote=args.lote)
+        total_s = time.perf_counter() - t0
+        s_por_mil = total_s * 1000 / e["consultas"]
+
+        guardados = {(p["id_a"], p["id_b"]) for p in db.obtener_coincidencias(0.0, limite=10 * args.reportes)}
+        print(f"{'variante':<28}{'s / 1000 consultas':>20}")
+        print(f"{'uno por uno (registro)':<28}{s_por_mil_uno:>20.2f}")
+        print(f"{'por lotes (emparejamiento)':<28}{s_por_mil:>20.2f}   ({s_por_mil_uno / s_por_mil:.1f}x)")
+        por_mil = 1000 / e["consultas"]
+        print(f"  búsqueda {e['busqueda_s'] * por_mil:.2f} s | fusión {e['fusion_s'] * por_mil:.2f} s | "
+              f"escritura {e['escritura_s'] * por_mil:.2f} s")
+        print(f"Pares guardados: {len(guardados)}; parejas plantadas encontradas: "
+              f"{len(plantadas & guardados)}/{len(plantadas)} ({len(plantadas & guardados) / max(1, len(plantadas)):.0%})")
+
+        # Segunda corrida sin reportes nuevos: no hay nada que reprocesar
+        t0 = time.perf_counter()
+        e = emparejamiento.emparejar(motor_faiss, k=args.k, dias=None, lote=args.lote)
+        print(f"Corrida incremental sin reportes nuevos: {e['consultas']} consultas en {time.perf_counter() - t0:.2f} s")
+        db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()
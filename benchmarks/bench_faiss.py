@@ -0,0 +1,94 @@
+"""
+Benchmark de índices de MotorFAISS: recall@k y latencia frente al índice exacto (flat).
+
+Los datos son sintéticos: embeddings agrupados en "razas" (mezcla de gaussianas
+normalizadas), y las consultas son fotos "nuevas" de mascotas ya registradas
+(el vector de la BD más ruido), que es el caso real de búsqueda.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_faiss.py --n 100000 --tipos ivf hnsw --nprobe 8 16 32
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_faiss import MotorFAISS
+
+
+def generar_datos(n, n_consultas, dimension, semilla=0):
+    rng = np.random.default_rng(semilla)
+    centros = rng.standard_normal((max(1, n // 500), dimension)).astype(np.float32)
+    base = centros[rng.integers(0, len(centros), n)] + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+    base /= np.linalg.norm(base, axis=1, keepdims=True)
+    elegidos = rng.integers(0, n, n_consultas)
+    # Ruido de norma ~0.3 sobre vectores unitarios: otra foto de la misma mascota
+    consultas = base[elegidos] + 0.3 * rng.standard_normal((n_consultas, dimension)).astype(np.float32) / np.sqrt(dimension)
+    return base, consultas
+
+
+def medir(motor, consultas, k):
+    """Consultas de a una (como en la app). Retorna (ids (Q, k), latencias en ms)."""
+    ids, latencias = [], []
+    for q in consultas:
+        t0 = time.perf_counter()
+        _, I = motor.buscar(q, k=k)
+        latencias.append(1000 * (time.perf_counter() - t0))
+        ids.append(I)
+    return np.stack(ids), np.array(latencias)
+
+
+def recall(ids, ids_exactos):
+    k = ids_exactos.shape[1]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, ids_exactos)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50_000, help="Vectores en el índice")
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=2048)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--tipos", nargs="+", default=["ivf", "ivfpq", "hnsw"])
+    parser.add_argument("--nprobe", nargs="+", type=int, default=[4, 16, 64])
+    parser.add_argument("--ef-search", nargs="+", type=int, default=[16, 64, 256])
+    args = parser.parse_args()
+
+    base, consultas = generar_datos(args.n, args.consultas, args.dimension)
+    ids_db = np.arange(1, args.n + 1, dtype=np.int64)
+
+    exacto = MotorFAISS(dimension=args.dimension, tipo="flat")
+    exacto.construir(ids_db, base)
+    ids_exactos, lat = medir(exacto, consultas, args.k)
+
+    print(f"N={args.n}  consultas={args.consultas}  k={args.k}")
+    print(f"{'tipo':<8}{'param':<14}{'build s':>9}{'recall@k':>10}{'p50 ms':>9}{'p95 ms':>9}")
+    print(f"{'flat':<8}{'-':<14}{'-':>9}{1.0:>10.3f}{np.percentile(lat, 50):>9.2f}{np.percentile(lat, 95):>9.2f}")
+
+    for tipo in args.tipos:
+        motor = MotorFAISS(dimension=args.dimension, tipo=tipo)
+        t0 = time.perf_counter()
+        motor.construir(ids_db, base)
+        t_build = time.perf_counter() - t0
+        if motor.tipo_activo != tipo:
+            print(f"{tipo:<8}(degradado a {motor.tipo_activo}: datos insuficientes para entrenar)")
+            continue
+
+        barrido = args.ef_search if tipo == "hnsw" else args.nprobe
+        for valor in barrido:
+            if tipo == "hnsw":
+                motor.ajustar(ef_search=valor)
+                etiqueta = f"efSearch={valor}"
+            else:
+                motor.ajustar(nprobe=valor)
+                etiqueta = f"nprobe={valor}"
+            ids, lat = medir(motor, consultas, args.k)
+            print(f"{tipo:<8}{etiqueta:<14}{t_build:>9.1f}{recall(ids, ids_exactos):>10.3f}"
+                  f"{np.percentile(lat, 50):>9.2f}{np.percentile(lat, 95):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Latencia de MotorGeo.obtener_coordenadas contra un geocodificador stub local
+(sin red): primera consulta, repeticiones (caché en memoria), tras reiniciar
+(caché en disco), negativos, servicio lento (respaldo del gazetteer) y consultas
+idénticas simultáneas (un solo llamado al servicio).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_geocodificacion.py --latencia-ms 300 --repeticiones 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache_geocodificacion import CacheGeocodificacion
+from utils_geo import MotorGeo
+
+Ubicacion = namedtuple("Ubicacion", "latitude longitude")
+
+
+class GeocodificadorStub:
+    """Responde como Nominatim.geocode tras `latencia` segundos; None para lo que no conoce."""
+    def __init__(self, latencia, conocidos):
+        self.latencia = latencia
+        self.conocidos = conocidos
+        self.llamadas = 0
+
+    def geocode(self, query, timeout=None):
+        self.llamadas += 1
+        time.sleep(self.latencia)
+        for texto, (lat, lon) in self.conocidos.items():
+            if texto in query:
+                return Ubicacion(lat, lon)
+        return None
+
+
+def medir_us(funcion, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return 1e6 * (time.perf_counter() - t0) / repeticiones, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencia-ms", type=float, default=300)
+    parser.add_argument("--repeticiones", type=int, default=1000)
+    args = parser.parse_args()
+
+    stub = GeocodificadorStub(args.latencia_ms / 1000, {"Calle Schell 300": (-12.1203, -77.0301)})
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_cache = os.path.join(tmp, "geo.db")
+        motor = MotorGeo(geocodificador=stub, cache=CacheGeocodificacion(ruta_cache), espera_max_s=5.0)
+
+        print(f"{'caso':<34}{'latencia':>14}  resultado")
+        us, r = medir_us(lambda: motor.obtener_coordenadas("Miraflores", "Calle Schell 300"), 1)
+        print(f"{'primera consulta':<34}{us / 1000:>11.1f} ms  {r}")
+        us, r = medir_us(lambda: motor.obtener_coordenadas("miraflores", "  calle SCHELL, 300 "), args.repeticiones)
+        print(f"{'repetida (memoria, normalizada)':<34}{us:>11.1f} µs  {r}")
+
+        reiniciado = MotorGeo(geocodificador=stub, cache=CacheGeocodificacion(ruta_cache))
+        us, r = medir_us(lambda: reiniciado.obtener_coordenadas("Miraflores", "Calle Schell 300"), 1)
+        print(f"{'tras reinicio (disco)':<34}{us:>11.1f} µs  {r}")
+
+        motor.obtener_coordenadas("Lince", "Casa de mi tía")
+        llamadas = stub.llamadas
+        us, r = medir_us(lambda: motor.obtener_coordenadas("Lince", "Casa de mi tía"), args.repeticiones)
+        print(f"{'negativo repetido':<34}{us:>11.1f} µs  {r} (llamadas extra al servicio: {stub.llamadas - llamadas})")
+
+        lento = MotorGeo(geocodificador=GeocodificadorStub(2.0, {}), cache=CacheGeocodificacion(os.path.join(tmp, "lento.db")), espera_max_s=0.2)
+        us, r = medir_us(lambda: lento.obtener_coordenadas("Miraflores", "frente al Parque Kennedy"), 1)
+        print(f"{'servicio lento -> gazetteer':<34}{us / 1000:>11.1f} ms  {r}")
+
+        concurrente = GeocodificadorStub(args.latencia_ms / 1000, {})
+        motor_c = MotorGeo(geocodificador=concurrente, cache=CacheGeocodificacion(os.path.join(tmp, "conc.db")))
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: motor_c.obtener_coordenadas("Surco", "Av. Primavera 1200"), range(8)))
+        print(f"{'8 consultas idénticas simultáneas':<34}{'':>14}  llamadas al servicio: {concurrente.llamadas}")
+        print(f"Tasa de aciertos de la caché: {motor.cache.tasa_aciertos():.0%}")
+
+
+if __name__ == "__main__":
+    main()
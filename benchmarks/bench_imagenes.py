@@ -0,0 +1,92 @@
+"""
+Fotos en la vista de resultados: bytes leídos de disco y enviados por cada
+página de búsqueda (3 tarjetas + 5 popups del mapa) con los originales, como
+antes, frente a las miniaturas del almacén por contenido. También mide el costo
+de guardar una foto al registrar (original + miniaturas) y la deduplicación.
+
+Las fotos son sintéticas, del tamaño de una foto de celular (4000x3000 JPEG).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_imagenes.py --fotos 20 --ancho 4000 --alto 3000
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from almacen_imagenes import AlmacenImagenes
+
+
+def foto_sintetica(rng, ancho, alto):
+    """Degradado suave + ruido, para que el JPEG pese lo que pesa una foto real."""
+    y, x = np.mgrid[0:alto, 0:ancho].astype(np.float32)
+    base = np.stack([x / ancho, y / alto, (x + y) / (ancho + alto)], axis=-1) * rng.uniform(120, 255, 3)
+    pixeles = np.clip(base + rng.normal(0, 18, (alto, ancho, 3)), 0, 255).astype(np.uint8)
+    salida = io.BytesIO()
+    Image.fromarray(pixeles).save(salida, "JPEG", quality=90)
+    return salida.getvalue()
+
+
+def bytes_pagina(rutas_tarjetas, rutas_popups, incrustar):
+    """Bytes leídos de disco para una página: tarjetas (archivo) + popups (data URI)."""
+    total = 0
+    for ruta in rutas_tarjetas:
+        with open(ruta, "rb") as f:
+            total += len(f.read())
+    for ruta in rutas_popups:
+        total += len(incrustar(ruta))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fotos", type=int, default=20)
+    parser.add_argument("--ancho", type=int, default=4000)
+    parser.add_argument("--alto", type=int, default=3000)
+    parser.add_argument("--paginas", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    fotos = [foto_sintetica(rng, args.ancho, args.alto) for _ in range(args.fotos)]
+    print(f"{args.fotos} fotos de {args.ancho}x{args.alto}, {np.mean([len(f) for f in fotos]) / 1e6:.2f} MB en promedio")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        almacen = AlmacenImagenes(os.path.join(tmp, "imagenes"))
+        t0 = time.perf_counter()
+        rutas = [almacen.guardar(f) for f in fotos]
+        ms_guardar = 1000 * (time.perf_counter() - t0) / len(fotos)
+        t0 = time.perf_counter()
+        repetidas = [almacen.guardar(f) for f in fotos]
+        ms_repetida = 1000 * (time.perf_counter() - t0) / len(fotos)
+        archivos = sum(1 for _ in almacen.archivos())
+        print(f"Registro: {ms_guardar:.0f} ms por foto nueva (original + miniaturas {almacen.formato}), "
+              f"{ms_repetida:.1f} ms por foto repetida; {archivos} archivos en disco "
+              f"({'sin duplicados' if repetidas == rutas else 'RUTAS DISTINTAS'})")
+        for tamano in ("pequena", "mediana"):
+            kb = np.mean([os.path.getsize(almacen.miniatura(r, tamano)) for r in rutas]) / 1e3
+            print(f"  miniatura {tamano}: {kb:.1f} KB en promedio")
+
+        original_uri = lambda ruta: base64.b64encode(open(ruta, "rb").read())
+        print(f"\n{'variante':<24}{'KB por página':>15}{'ms por página':>15}")
+        for nombre, tarjeta, popup in (
+            ("originales", lambda r: r, original_uri),
+            ("miniaturas", almacen.miniatura, almacen.data_uri),
+        ):
+            t0 = time.perf_counter()
+            total = 0
+            for p in range(args.paginas):
+                elegidas = [rutas[i] for i in rng.choice(len(rutas), 5, replace=False)]
+                total += bytes_pagina([tarjeta(r) for r in elegidas[:3]], elegidas, popup)
+            ms = 1000 * (time.perf_counter() - t0) / args.paginas
+            print(f"{nombre:<24}{total / args.paginas / 1e3:>15.0f}{ms:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Mapa global: mapa_calor_bd (un punto por reporte, reconstruido en cada rerun)
+frente a mapa_calor_agregado (un punto/hexágono por celda, cacheado por generación),
+y la tabla por distrito (recorrido de mascotas frente a conteo_distritos).
+Trabaja sobre una BD temporal; no toca tesis_mascotas.db.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_mapa.py --n 50000 --reruns 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import h3
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+from motor_mapa import MotorMapa
+
+
+def medir_ms(funcion, repeticiones):
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return 1000 * (time.perf_counter() - t0) / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=50_000)
+    parser.add_argument("--reruns", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        db.ALMACEN_ACTIVO = False
+        db.init_db()
+        lats, lons = rng.normal(-12.08, 0.05, args.n), rng.normal(-77.03, 0.05, args.n)
+        with db.transaccion() as c:
+            filas = []
+            for lat, lon in zip(lats, lons):
+                h3_index = h3.latlng_to_cell(lat, lon, 9)
+                filas.append(("Bench", "Lima", h3_index, *db._celdas_padre(h3_index), float(lat), float(lon)))
+            c.executemany("INSERT INTO mascotas (nombre, distrito, h3_index, h3_r7, h3_r8, lat, lon) VALUES (?, ?, ?, ?, ?, ?, ?)", filas)
+
+        motor = MotorMapa()
+        print(f"{args.n} reportes")
+        print(f"{'variante':<34}{'celdas':>8}{'ms/rerun':>10}")
+        t = medir_ms(lambda: motor.mapa_calor_bd(list(db.iterar_mascotas(("lat", "lon")))), args.reruns)
+        print(f"{'por reporte (mapa_calor_bd)':<34}{args.n:>8}{t:>10.1f}")
+        for resolucion in (9, 8, 7):
+            celdas = len(db.obtener_conteo_celdas(resolucion))
+            for modo in ("calor", "hexagonos"):
+                motor.cache_agregados.clear()
+                frio = medir_ms(lambda: motor.mapa_calor_agregado(resolucion, db.generacion_conteo(), db.obtener_conteo_celdas, modo), 1)
+                tibio = medir_ms(lambda: motor.mapa_calor_agregado(resolucion, db.generacion_conteo(), db.obtener_conteo_celdas, modo), args.reruns)
+                print(f"{f'res. {resolucion} {modo} (sin caché)':<34}{celdas:>8}{frio:>10.1f}")
+                print(f"{f'res. {resolucion} {modo} (cacheado)':<34}{celdas:>8}{tibio:>10.3f}")
+
+        # Tabla de distritos de la misma pestaña: recorrido de mascotas frente al agregado
+        distritos = len(db.contar_por_distrito())
+        escaneo = medir_ms(lambda: db.conexion().execute(
+            "SELECT distrito, COUNT(*) FROM mascotas WHERE estado = 'abierto' GROUP BY distrito").fetchall(), args.reruns)
+        agregado = medir_ms(db.contar_por_distrito, args.reruns)
+        print(f"{'distritos (GROUP BY mascotas)':<34}{distritos:>8}{escaneo:>10.3f}")
+        print(f"{'distritos (conteo_distritos)':<34}{distritos:>8}{agregado:>10.3f}")
+
+        # Un alta invalida la caché vía generacion_conteo
+        generacion = db.generacion_conteo()
+        db.guardar_mascota("Nueva", "Lima", h3.latlng_to_cell(-12.1, -77.0, 9), -12.1, -77.0, "x.jpg", np.zeros(2048, dtype=np.float32))
+        assert db.generacion_conteo() > generacion
+        db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Análisis de texto de afiches: MotorOCR.analizar_texto anterior (decenas de
+búsquedas `in` y regex sin compilar por llamada) frente a AnalizadorTexto
+(texto partido en palabras una vez + búsquedas en diccionario). Usa textos
+sintéticos de afiches, opcionalmente con relleno para simular la salida larga
+y ruidosa de Tesseract, y reporta en cuántos difieren los resultados (las
+diferencias esperadas vienen de tildes, límites de palabra en distritos y el
+distrito más largo).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_ocr.py --textos 20000 --relleno 0 40 120
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_ocr import ANALIZADOR, DISTRITOS, KEYWORDS
+
+
+def analizar_texto_legado(texto_crudo):
+    """Copia de MotorOCR.analizar_texto antes del analizador precompilado."""
+    datos = {
+        "telefonos": [], "recompensa": False, 
+        "palabras_clave": [], "atributos_extraidos": {}
+    }
+
+    if not texto_crudo: return datos
+    texto_lower = texto_crudo.lower()
+
+    # Teléfonos y Recompensa
+    encontrados = re.findall(r'(?:9\d{2}[-\s]?\d{3}[-\s]?\d{3})', texto_crudo)
+    for num in encontrados:
+        limpio = num.replace(" ", "").replace("-", "")
+        if len(limpio) == 9: datos["telefonos"].append(f"+51{limpio}")
+
+    if re.search(r'(recompensa|s/|soles|\$)', texto_lower): datos["recompensa"] = True
+
+    # Palabras clave y Atributos básicos
+    keywords = ["blanco", "negro", "marrón", "café", "crema", "caramelo", "dorado", "gris", "manchas", 
+                "chico", "pequeño", "mediano", "grande", "macho", "hembra", "perro", "gato"]
+    datos["palabras_clave"] = [w for w in keywords if w in texto_lower]
+
+    # Búsqueda Estricta (Color: X)
+    patrones = {
+        "color": r'color\s*[:\.]?\s*([a-zA-Z\s]+)',
+        "raza": r'raza\s*[:\.]?\s*([a-zA-Z\s]+)',
+        "sexo": r'sexo\s*[:\.]?\s*([a-zA-Z\s]+)'
+    }
+    for k, v in patrones.items():
+        m = re.search(v, texto_lower)
+        if m: datos["atributos_extraidos"][k] = m.group(1).split('\n')[0].title()
+
+    # Fallbacks
+    if "color" not in datos["atributos_extraidos"]:
+        for c in ["blanco", "negro", "marrón", "caramelo", "crema", "dorado"]:
+            if c in texto_lower: 
+                datos["atributos_extraidos"]["color"] = c.title(); break
+
+    if "sexo" not in datos["atributos_extraidos"]:
+        if "macho" in texto_lower: datos["atributos_extraidos"]["sexo"] = "Macho"
+        elif "hembra" in texto_lower: datos["atributos_extraidos"]["sexo"] = "Hembra"
+
+    # --- FALLBACK DISTRITOS (Tus 43 exactos) ---
+    # Ordenados por longitud para que encuentre "San Juan de Lurigancho" antes que "San Juan"
+    distritos_target = [
+        "villa maría del triunfo", "san juan de lurigancho", "san juan de miraflores", 
+        "santiago de surco", "san martín de porres", "santa maría del mar", "magdalena del mar", 
+        "villa el salvador", "carmen de la legua", "lurigancho", "la victoria", "puente piedra", 
+        "punta hermosa", "independencia", "el agustino", "jesús maría", "pueblo libre", 
+        "pachacamac", "san bartolo", "san isidro", "san miguel", "santa anita", "santa rosa", 
+        "carabayllo", "chaclacayo", "chorrillos", "cieneguilla", "la molina", "los olivos", 
+        "miraflores", "punta negra", "san borja", "san luis", "surquillo", "barranco", 
+        "pucusana", "san luis", "ancon", "breña", "comas", "lince", "lurin", "rimac", "lima", "ate"
+    ]
+
+    for d in distritos_target:
+        if d in texto_lower:
+            # Aquí hacemos el match con la lista bonita de app.py
+            # Mapeo manual rápido para corregir tildes al mostrar
+            nombre_final = d.title()
+            if d == "ancon": nombre_final = "Ancon"
+            if d == "ate": nombre_final = "Ate"
+            # (El sistema usará el string detectado, que es suficiente para el MVP)
+            datos["atributos_extraidos"]["distrito"] = nombre_final
+            break
+
+    return datos
+
+
+PLANTILLAS = [
+    "SE BUSCA\n{nombre}\nPerro {kw1} {kw2}\nColor: {kw1}\nSexo: {sexo}\nVisto por ultima vez en {distrito}\nCel: 9{t1} {t2} {t3}\nRECOMPENSA S/ 500",
+    "PERDIDO - {nombre}\nGato {kw1}, {kw2}. Raza: mestizo\nZona {distrito}, cerca al parque\nLlamar al 9{t1}-{t2}-{t3}",
+    "AYUDA!! {nombre} se perdió en {distrito}. Es {kw1} con {kw2}. {sexo}. Comunicarse 9{t1}{t2}{t3} / 9{t2}{t1}{t3}",
+    "{nombre} chocolate, muy cariñoso, {kw1}. Se ofrece gratificación en soles. {distrito}",
+]
+
+
+RELLENO = ("por favor ayudanos a encontrarlo es parte de la familia lo extrañamos mucho salio de casa "
+           "el dia domingo en la tarde tiene collar azul y placa responde a su nombre es muy jugueton").split()
+
+
+def generar_textos(n, semilla=0, palabras_relleno=0):
+    rng = random.Random(semilla)
+    textos = []
+    for _ in range(n):
+        relleno = " ".join(rng.choice(RELLENO) for _ in range(palabras_relleno))
+        textos.append(rng.choice(PLANTILLAS).format(
+            nombre=rng.choice(["Bobby", "Firulais", "Luna", "Max", "Rocky", "Canela"]),
+            kw1=rng.choice(KEYWORDS), kw2=rng.choice(KEYWORDS),
+            sexo=rng.choice(["Macho", "Hembra"]),
+            distrito=rng.choice(DISTRITOS) if rng.random() < 0.8 else rng.choice(DISTRITOS).lower().replace("í", "i"),
+            t1=rng.randint(10, 99), t2=rng.randint(100, 999), t3=rng.randint(100, 999),
+        ) + ("\n" + relleno if relleno else ""))
+    return textos
+
+
+def medir(funcion, textos):
+    t0 = time.perf_counter()
+    resultados = funcion(textos)
+    return time.perf_counter() - t0, resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--textos", type=int, default=20_000)
+    parser.add_argument("--relleno", type=int, nargs="+", default=[0, 40, 120],
+                        help="palabras de relleno por texto (una medición por valor)")
+    args = parser.parse_args()
+
+    print(f"{args.textos} textos")
+    print(f"{'relleno':>8}{'caracteres':>12}{'legado µs':>11}{'compilado µs':>14}{'aceleración':>13}")
+    for palabras_relleno in args.relleno:
+        textos = generar_textos(args.textos, palabras_relleno=palabras_relleno)
+        caracteres = sum(map(len, textos)) / len(textos)
+        t_legado, legado = medir(lambda ts: [analizar_texto_legado(t) for t in ts], textos)
+        t_nuevo, nuevo = medir(ANALIZADOR.analizar_lote, textos)
+        print(f"{palabras_relleno:>8}{caracteres:>12.0f}{1e6 * t_legado / args.textos:>11.1f}"
+              f"{1e6 * t_nuevo / args.textos:>14.1f}{t_legado / t_nuevo:>12.1f}x")
+
+    for campo in ("telefonos", "recompensa", "palabras_clave"):
+        distintos = sum(a[campo] != b[campo] for a, b in zip(legado, nuevo))
+        print(f"{campo:<22} difiere en {distintos} textos")
+    for atributo in ("color", "raza", "sexo", "distrito"):
+        distintos = sum(
+            (a["atributos_extraidos"].get(atributo) or "").lower() != (b["atributos_extraidos"].get(atributo) or "").lower()
+            for a, b in zip(legado, nuevo)
+        )
+        print(f"{'atributo ' + atributo:<22} difiere en {distintos} textos")
+
+
+if __name__ == "__main__":
+    main()
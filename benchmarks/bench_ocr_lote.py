@@ -0,0 +1,99 @@
+"""
+OCR de afiches por lotes: el camino anterior (Tesseract sobre la imagen
+completa, uno por uno) frente a MotorOCR.extraer_textos con preprocesado,
+varios procesos y caché por hash. Genera afiches sintéticos (foto ruidosa +
+texto) en una carpeta temporal; necesita Tesseract instalado (TESSERACT_CMD o PATH).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_ocr_lote.py --afiches 24 --procesos 1 4
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache_ocr import CacheOCR
+from motor_ocr import ANALIZADOR, MotorOCR, ubicar_tesseract
+
+LINEAS = [
+    "SE BUSCA", "{nombre}", "Perro {color}, {sexo}", "Visto en {distrito}",
+    "Cel: 9{t1} {t2} {t3}", "RECOMPENSA S/ 500",
+]
+
+
+def generar_afiche(rng, ancho=2480, alto=3508):
+    """Afiche tipo foto de celular: fondo con ruido, un bloque 'foto' y texto grande."""
+    fondo = rng.randint(200, 245)
+    img = Image.effect_noise((ancho, alto), 18).point(lambda v: min(255, max(0, v - 128 + fondo))).convert("RGB")
+    dibujo = ImageDraw.Draw(img)
+    dibujo.rectangle((300, 900, ancho - 300, 2000), fill=tuple(rng.randint(60, 160) for _ in range(3)))
+    campos = {
+        "nombre": rng.choice(["BOBBY", "LUNA", "MAX", "ROCKY"]),
+        "color": rng.choice(["negro", "blanco", "marron"]),
+        "sexo": rng.choice(["macho", "hembra"]),
+        "distrito": rng.choice(["Miraflores", "San Isidro", "Surco", "Lince"]),
+        "t1": rng.randint(10, 99), "t2": rng.randint(100, 999), "t3": rng.randint(100, 999),
+    }
+    for i, linea in enumerate(LINEAS):
+        y = 250 + i * 300 if i < 2 else 1800 + i * 260
+        dibujo.text((320, y), linea.format(**campos), fill=(15, 15, 15), font_size=150 if i < 2 else 110)
+    salida = io.BytesIO()
+    img.save(salida, "JPEG", quality=88)
+    return salida.getvalue()
+
+
+def medir(motor, rutas, procesos):
+    t0 = time.perf_counter()
+    textos = motor.extraer_textos(rutas, procesos)
+    segundos = time.perf_counter() - t0
+    return len(rutas) / segundos, textos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--afiches", type=int, default=24)
+    parser.add_argument("--procesos", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    parser.add_argument("--tesseract", default=None)
+    args = parser.parse_args()
+
+    if ubicar_tesseract(args.tesseract) is None:
+        sys.exit("No se encontró tesseract (configure TESSERACT_CMD o agréguelo al PATH)")
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        rutas = []
+        for i in range(args.afiches):
+            rutas.append(os.path.join(tmp, f"afiche_{i:04d}.jpg"))
+            with open(rutas[-1], "wb") as f:
+                f.write(generar_afiche(rng))
+
+        print(f"{args.afiches} afiches de 2480x3508")
+        print(f"{'variante':<36}{'afiches/s':>10}{'con teléfono':>14}")
+
+        def reportar(nombre, resultado):
+            velocidad, textos = resultado
+            leidos = sum(bool(ANALIZADOR.analizar(t)["telefonos"]) for t in textos)
+            print(f"{nombre:<36}{velocidad:>10.2f}{leidos:>10}/{len(textos)}")
+
+        legado = MotorOCR(args.tesseract, preprocesar=False)
+        reportar("sin preprocesar, secuencial", medir(legado, rutas, 1))
+
+        for procesos in args.procesos:
+            motor = MotorOCR(args.tesseract, preprocesar=True)
+            reportar(f"preprocesado, {procesos} proceso(s)", medir(motor, rutas, procesos))
+
+        cache = CacheOCR(os.path.join(tmp, "cache_ocr.db"))
+        motor = MotorOCR(args.tesseract, cache=cache)
+        medir(motor, rutas, max(args.procesos))
+        reportar("caché por hash (segunda pasada)", medir(motor, rutas, max(args.procesos)))
+        print(f"Tasa de aciertos de la caché: {cache.tasa_aciertos():.0%}")
+
+
+if __name__ == "__main__":
+    main()
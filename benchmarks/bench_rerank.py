@@ -0,0 +1,74 @@
+"""
+Re-ranking visual + geográfico de candidatos: el bucle anterior de app.py
+(list.index + calcular_score_geo + haversine_km por candidato) frente a
+MotorGeo.rerankear_candidatos (escalar con pocos candidatos, una pasada NumPy
+desde MotorGeo.MIN_CANDIDATOS_NUMPY). Verifica que ambos coincidan.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_rerank.py --candidatos 5 50 500 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import h3
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils_geo import MotorGeo
+
+
+def rerank_legado(motor_geo, ids_candidatos, scores_visuales, candidatos_db, h3_q, lat_q, lon_q):
+    """Copia del bucle original de la pestaña de búsqueda."""
+    resultados = []
+    for cand in candidatos_db:
+        idx_faiss = list(ids_candidatos).index(cand["id"])
+        sim_vis = scores_visuales[idx_faiss]
+        sim_geo = motor_geo.calcular_score_geo(h3_q, cand["h3_index"])
+        score_final = (0.6 * sim_vis) + (0.4 * sim_geo)
+        dist_km = motor_geo.haversine_km(lat_q, lon_q, cand["lat"], cand["lon"])
+        resultados.append({**cand, "score": score_final, "vis": sim_vis, "geo": sim_geo, "dist_km": dist_km})
+    resultados.sort(key=lambda x: x["score"], reverse=True)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidatos", type=int, nargs="+", default=[5, 50, 500, 2000])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    motor_geo = MotorGeo()
+    rng = np.random.default_rng(0)
+    lat_q, lon_q = -12.1211, -77.0297
+    h3_q = motor_geo.obtener_h3_index(lat_q, lon_q)
+
+    print(f"{'candidatos':>11}{'bucle ms':>11}{'nuevo ms':>11}{'aceleración':>13}")
+    for n in args.candidatos:
+        lats = rng.uniform(-12.25, -11.85, n)
+        lons = rng.uniform(-77.15, -76.85, n)
+        ids = rng.permutation(np.arange(1, 10 * n + 1))[:n]
+        scores = rng.uniform(0.3, 1.0, n).astype(np.float32)
+        candidatos = [
+            {"id": int(ids[i]), "nombre": "Bench", "h3_index": h3.latlng_to_cell(lats[i], lons[i], 9),
+             "lat": float(lats[i]), "lon": float(lons[i])}
+            for i in rng.permutation(n)  # la BD no los devuelve en el orden de FAISS
+        ]
+
+        tiempos = []
+        for funcion in (rerank_legado, MotorGeo.rerankear_candidatos):
+            t0 = time.perf_counter()
+            for _ in range(args.repeticiones):
+                resultado = funcion(motor_geo, ids, scores, candidatos, h3_q, lat_q, lon_q)
+            tiempos.append(1000 * (time.perf_counter() - t0) / args.repeticiones)
+            if funcion is rerank_legado:
+                esperado = resultado
+
+        assert np.allclose([r["score"] for r in resultado], [r["score"] for r in esperado], atol=1e-6)
+        assert np.allclose([r["dist_km"] for r in resultado], [r["dist_km"] for r in esperado], atol=1e-6)
+        print(f"{n:>11}{tiempos[0]:>11.2f}{tiempos[1]:>11.2f}{tiempos[0] / tiempos[1]:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
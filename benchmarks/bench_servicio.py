@@ -0,0 +1,79 @@
+"""
+Throughput bajo concurrencia: N "sesiones" (hilos) llamando a MotorVision.analizar
+directamente vs. las mismas sesiones usando ServicioInferencia (micro-lotes).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_servicio.py --sesiones 8 --solicitudes 4 --max-lote 16 --max-espera-ms 10
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_vision import MotorVision
+from servicio_inferencia import ServicioInferencia
+
+
+def correr(sesiones, trabajo):
+    """Lanza `sesiones` hilos; retorna (segundos totales, latencias en ms)."""
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sesiones) as pool:
+        latencias = [l for ls in pool.map(lambda _: trabajo(), range(sesiones)) for l in ls]
+    return time.perf_counter() - t0, np.array(latencias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imagenes", default="datos/imagenes")
+    parser.add_argument("--sesiones", type=int, default=8)
+    parser.add_argument("--solicitudes", type=int, default=4, help="Solicitudes por sesión")
+    parser.add_argument("--max-lote", type=int, default=16)
+    parser.add_argument("--max-espera-ms", type=float, default=10)
+    parser.add_argument("--hilos", type=int, default=None, help="Hilos de torch")
+    args = parser.parse_args()
+
+    fotos = []
+    for ruta in sorted(glob.glob(os.path.join(args.imagenes, "*.jpg"))):
+        with open(ruta, "rb") as f:
+            fotos.append(f.read())
+    if not fotos:
+        sys.exit(f"No hay imágenes en {args.imagenes}")
+
+    motor = MotorVision(num_hilos=args.hilos)  # sin caché: se mide la inferencia
+    motor.analizar(fotos[0])
+
+    def directo():
+        latencias = []
+        for i in range(args.solicitudes):
+            t0 = time.perf_counter()
+            motor.analizar(fotos[i % len(fotos)])
+            latencias.append(1000 * (time.perf_counter() - t0))
+        return latencias
+
+    servicio = ServicioInferencia(motor, max_lote=args.max_lote, max_espera_ms=args.max_espera_ms)
+
+    def con_servicio():
+        latencias = []
+        for i in range(args.solicitudes):
+            t0 = time.perf_counter()
+            servicio.analizar(fotos[i % len(fotos)]).result()
+            latencias.append(1000 * (time.perf_counter() - t0))
+        return latencias
+
+    total = args.sesiones * args.solicitudes
+    print(f"{args.sesiones} sesiones x {args.solicitudes} solicitudes")
+    print(f"{'modo':<10}{'img/s':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for nombre, trabajo in (("directo", directo), ("servicio", con_servicio)):
+        segundos, lat = correr(args.sesiones, trabajo)
+        print(f"{nombre:<10}{total / segundos:>9.2f}{np.percentile(lat, 50):>9.0f}{np.percentile(lat, 95):>9.0f}")
+    print(f"Tamaño medio de micro-lote: {servicio.tamano_medio_lote():.1f}")
+    servicio.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Costo de las trazas por llamada: función sin instrumentar, instrumentada con las
+trazas desactivadas (lo que paga la app por defecto) y activadas, más el de un
+tramo vacío. Se compara contra una consulta real a la BD (db.obtener_por_ids)
+para ver el costo relativo.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_trazas.py --llamadas 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import trazas
+
+
+def funcion_vacia(x):
+    return x
+
+
+def ns_por_llamada(funcion, llamadas):
+    t0 = time.perf_counter()
+    for i in range(llamadas):
+        funcion(i)
+    return 1e9 * (time.perf_counter() - t0) / llamadas
+
+
+def ns_por_tramo(llamadas):
+    t0 = time.perf_counter()
+    for _ in range(llamadas):
+        with trazas.tramo("bench.tramo"):
+            pass
+    return 1e9 * (time.perf_counter() - t0) / llamadas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llamadas", type=int, default=200_000)
+    args = parser.parse_args()
+
+    instrumentada = trazas.medido("bench.funcion")(funcion_vacia)
+    base = ns_por_llamada(funcion_vacia, args.llamadas)
+
+    print(f"{'variante':<34}{'ns/llamada':>12}{'extra':>10}")
+    print(f"{'sin instrumentar':<34}{base:>12.0f}{'':>10}")
+    for activo in (False, True):
+        trazas.activar(activo)
+        estado = "activadas" if activo else "desactivadas"
+        ns = ns_por_llamada(instrumentada, args.llamadas)
+        print(f"{'medido(), trazas ' + estado:<34}{ns:>12.0f}{ns - base:>+10.0f}")
+        ns = ns_por_tramo(args.llamadas)
+        print(f"{'tramo vacío, trazas ' + estado:<34}{ns:>12.0f}")
+
+    # Referencia: una consulta pequeña a la BD (lo más barato que se instrumenta en la app)
+    import db
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench_trazas.db")
+        db.init_db()
+        db.guardar_mascotas_lote([
+            (f"Mascota {i}", "Lince", None, -12.08, -77.03, f"img_{i}.jpg", None, f"hash_{i}")
+            for i in range(10)
+        ])
+        ids = list(range(1, 11))
+        trazas.activar(False)
+        consulta = ns_por_llamada(lambda _: db.obtener_por_ids(ids), 2000)
+        print(f"\nobtener_por_ids(10 ids): {consulta / 1000:.1f} µs por llamada")
+        db.cerrar_conexion()
+
+
+if __name__ == "__main__":
+    main()
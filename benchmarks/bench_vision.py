@@ -0,0 +1,73 @@
+"""
+Benchmarks de MotorVision:
+- obtener_embedding (bucle imagen por imagen) vs obtener_embeddings_lote.
+- Registro: es_mascota + obtener_embedding vs analizar (una sola pasada).
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_vision.py --repeticiones 8 --batch-size 16
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from motor_vision import MotorVision
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--imagenes", default="datos/imagenes", help="Carpeta con fotos de muestra")
+    parser.add_argument("--repeticiones", type=int, default=8, help="Veces que se repite la carpeta")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rutas = sorted(glob.glob(os.path.join(args.imagenes, "*.jpg"))) * args.repeticiones
+    if not rutas:
+        sys.exit(f"No hay imágenes en {args.imagenes}")
+
+    motor = MotorVision()
+    motor.obtener_embedding(rutas[0])  # Calentamiento
+
+    t0 = time.perf_counter()
+    bucle = [motor.obtener_embedding(r) for r in rutas]
+    t_bucle = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    lote = list(motor.obtener_embeddings_lote(rutas, batch_size=args.batch_size, num_workers=args.workers))
+    t_lote = time.perf_counter() - t0
+
+    dif_max = max(float(np.abs(a - b).max()) for a, b in zip(bucle, lote))
+
+    print(f"Imágenes:          {len(rutas)}")
+    print(f"Bucle (1 a 1):     {len(rutas) / t_bucle:8.2f} img/s  ({t_bucle:.2f} s)")
+    print(f"Lote (bs={args.batch_size:<3}):     {len(rutas) / t_lote:8.2f} img/s  ({t_lote:.2f} s)")
+    print(f"Aceleración:       {t_bucle / t_lote:8.2f}x")
+    print(f"Dif. máx. absoluta: {dif_max:.2e}")
+
+    if not np.allclose(np.stack(bucle), np.stack(lote), rtol=1e-4, atol=1e-5):
+        sys.exit("ERROR: los embeddings por lote no coinciden con el bucle")
+
+    # --- Flujo de registro ---
+    muestras = rutas[:len(rutas) // args.repeticiones]
+    t0 = time.perf_counter()
+    separados = [(motor.es_mascota(r), motor.obtener_embedding(r)) for r in muestras]
+    t_separado = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    combinados = [motor.analizar(r) for r in muestras]
+    t_combinado = time.perf_counter() - t0
+
+    print(f"Registro separado: {1000 * t_separado / len(muestras):8.1f} ms/img")
+    print(f"Registro analizar: {1000 * t_combinado / len(muestras):8.1f} ms/img")
+    for ((es_a, etq_a), emb_a), (es_b, etq_b, emb_b) in zip(separados, combinados):
+        if es_a != es_b or not np.allclose(emb_a, emb_b, rtol=1e-4, atol=1e-5):
+            sys.exit(f"ERROR: analizar difiere del flujo separado ({etq_a} vs {etq_b})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Suite de rendimiento: genera reportes sintéticos a varias escalas y mide los
+caminos calientes de la app, con latencia p50/p95, throughput y memoria pico,
+guardando/comparando una línea base JSON entre corridas.
+
+Datos: embeddings normalizados de `--dimension` agrupados en "razas", y
+coordenadas alrededor de los centros de MotorGeo.coordenadas_distritos. Las
+consultas son vectores de la BD más ruido (otra foto de la misma mascota).
+
+Casos por escala:
+    faiss.buscar, faiss.buscar_en_zona, faiss.sincronizar (construcción)
+    db.obtener_por_ids, db.obtener_todas, db.iterar_mascotas
+    geo.calcular_score_geo, geo.rerankear_candidatos
+    ocr.analizar_texto
+    mapa.mapa_calor_bd, mapa.mapa_calor_agregado
+    busqueda.extremo_a_extremo: geocodificación (stub local, con caché) + H3 +
+        buscar_en_zona + obtener_por_ids + re-ranking (sin ResNet50: el vector de
+        consulta ya viene dado; la inferencia se mide en bench_vision.py).
+
+Memoria: "pico MB" es el pico de asignaciones de Python/NumPy (tracemalloc) en una
+ejecución del caso; no incluye la memoria interna de FAISS ni de SQLite, que sí
+entran en el RSS máximo del proceso que se reporta al final.
+
+Escala 1M con 2048 dimensiones ocupa ~17 GB en disco (BD + almacén); para una
+máquina de escritorio use --dimension 512 o --directorio en un disco con espacio.
+
+Uso (desde la raíz del repo):
+    python benchmarks/suite.py --escalas 1k 100k
+    python benchmarks/suite.py --escalas 1k 100k --guardar          # actualiza la línea base
+    python benchmarks/suite.py --escalas 1M --dimension 512 --linea-base benchmarks/linea_base_512.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import h3
+import numpy as np
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+import db
+from cache_geocodificacion import CacheGeocodificacion
+from motor_faiss import MotorFAISS
+from motor_mapa import MotorMapa
+from motor_ocr import ANALIZADOR
+from utils_geo import MotorGeo
+from bench_geocodificacion import GeocodificadorStub
+from bench_ocr import generar_textos
+
+LINEA_BASE = os.path.join(RAIZ, "benchmarks", "linea_base.json")
+
+
+def escala(texto):
+    """'1k' -> 1000, '100k' -> 100000, '1M' -> 1000000."""
+    multiplicadores = {"k": 1_000, "m": 1_000_000}
+    sufijo = texto[-1].lower()
+    if sufijo in multiplicadores:
+        return int(float(texto[:-1]) * multiplicadores[sufijo])
+    return int(texto)
+
+
+def nombre_escala(n):
+    if n >= 1_000_000 and n % 1_000_000 == 0: return f"{n // 1_000_000}M"
+    if n >= 1_000 and n % 1_000 == 0: return f"{n // 1_000}k"
+    return str(n)
+
+
+# --- DATOS SINTÉTICOS ---
+
+def sembrar(n, dimension, rng, motor_geo, tamano_lote=5000):
+    """Inserta n reportes sintéticos por lotes (sin tener todos los vectores en memoria)."""
+    distritos = list(motor_geo.coordenadas_distritos.items())
+    centros = rng.standard_normal((min(2000, max(1, n // 500)), dimension)).astype(np.float32)
+    for inicio in range(0, n, tamano_lote):
+        m = min(tamano_lote, n - inicio)
+        vectores = centros[rng.integers(0, len(centros), m)] + 0.5 * rng.standard_normal((m, dimension)).astype(np.float32)
+        vectores /= np.linalg.norm(vectores, axis=1, keepdims=True)
+        elegidos = rng.integers(0, len(distritos), m)
+        # ~1 km de dispersión alrededor del centro del distrito
+        desvios = rng.normal(0, 0.01, (m, 2))
+        registros = []
+        for j in range(m):
+            distrito, (lat_c, lon_c) = distritos[elegidos[j]]
+            lat, lon = lat_c + desvios[j, 0], lon_c + desvios[j, 1]
+            registros.append((f"Sintetico {inicio + j}", distrito, h3.latlng_to_cell(lat, lon, 9),
+                              float(lat), float(lon), "", vectores[j], None))
+        db.guardar_mascotas_lote(registros)
+
+
+# --- MEDICIÓN ---
+
+def medir(funcion, repeticiones, calentamiento=1):
+    """Latencias (ms) de `repeticiones` llamadas, tras `calentamiento` llamadas sin medir."""
+    for _ in range(calentamiento):
+        funcion()
+    latencias = []
+    t_total = time.perf_counter()
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        latencias.append(1000 * (time.perf_counter() - t0))
+    t_total = time.perf_counter() - t_total
+    return latencias, t_total
+
+
+def pico_memoria_mb(funcion):
+    """Pico de memoria asignada (Python + NumPy) durante una llamada."""
+    tracemalloc.start()
+    try:
+        funcion()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def percentil(valores, p):
+    return float(np.percentile(valores, p)) if valores else float("nan")
+
+
+def resumir(latencias, t_total, pico_mb):
+    return {
+        "n": len(latencias),
+        "p50_ms": percentil(latencias, 50),
+        "p95_ms": percentil(latencias, 95),
+        "media_ms": statistics.fmean(latencias),
+        "ops_s": len(latencias) / t_total if t_total > 0 else float("inf"),
+        "pico_mb": pico_mb,
+    }
+
+
+def rss_maximo_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 2**10
+
+
+# --- CASOS ---
+
+def correr_escala(n, args, rng):
+    resultados = {}
+
+    def caso(nombre, funcion, repeticiones, calentamiento=1):
+        latencias, t_total = medir(funcion, repeticiones, calentamiento)
+        resultados[nombre] = resumir(latencias, t_total, pico_memoria_mb(funcion))
+        r = resultados[nombre]
+        print(f"  {nombre:<30}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['ops_s']:>12.1f}{r['pico_mb']:>10.1f}")
+
+    def omitir(nombre, motivo):
+        print(f"  {nombre:<30}  (omitido: {motivo})")
+
+    with tempfile.TemporaryDirectory(dir=args.directorio) as tmp:
+        db.DB_NAME = os.path.join(tmp, "suite.db")
+        db.DIMENSION_ALMACEN = args.dimension
+        db.init_db()
+        stub = GeocodificadorStub(args.latencia_geo_ms / 1000, {})
+        motor_geo = MotorGeo(geocodificador=stub, cache=CacheGeocodificacion(os.path.join(tmp, "geo.db")))
+        # El stub es local: sin el RateLimiter de 1 consulta/s que exige Nominatim
+        motor_geo.geocode = stub.geocode
+
+        t0 = time.perf_counter()
+        sembrar(n, args.dimension, rng, motor_geo)
+        print(f"  {'(siembra)':<30}{time.perf_counter() - t0:>10.1f} s")
+
+        # Construcción del índice como en app.cargar_motor_faiss (una sola vez: es el arranque en frío)
+        motor_faiss = MotorFAISS(dimension=args.dimension, tipo="auto",
+                                 obtener_vectores=lambda ids: db.obtener_vectores(ids, args.dimension))
+        ruta_indice = os.path.join(tmp, "indice", "suite.faiss")
+        def sincronizar_en_frio():
+            if os.path.exists(ruta_indice): os.remove(ruta_indice)
+            motor_faiss.sincronizar(
+                ruta_indice,
+                leer_desde=lambda id_min: db.iterar_embeddings(id_min, args.dimension),
+                contar_filas=lambda: db.contar_embeddings(args.dimension)
+            )
+        caso(f"faiss.sincronizar ({motor_faiss.tipo_sugerido(n)})", sincronizar_en_frio, 1, calentamiento=0)
+
+        # Consultas: vectores de la BD + ruido, con su celda H3
+        elegidos = rng.integers(1, n + 1, args.consultas)
+        base = db.obtener_vectores(elegidos, args.dimension)
+        consultas = base + 0.3 * rng.standard_normal(base.shape).astype(np.float32) / np.sqrt(args.dimension)
+        celdas = {r["id"]: r["h3_index"] for r in db.obtener_por_ids([int(i) for i in elegidos])}
+        pares = [(consultas[i], celdas[int(elegidos[i])]) for i in range(args.consultas)]
+        elegir = lambda: pares[random.randrange(len(pares))]
+
+        caso("faiss.buscar", lambda: motor_faiss.buscar(elegir()[0], k=5), args.consultas)
+        caso("faiss.buscar_en_zona", lambda: motor_faiss.buscar_en_zona(*elegir(), k=5), args.consultas)
+
+        ids_top = [[int(i) for i in rng.integers(1, n + 1, 5)] for _ in range(64)]
+        caso("db.obtener_por_ids (5)", lambda: db.obtener_por_ids(ids_top[random.randrange(64)]), args.consultas)
+        if n <= args.max_filas_completas:
+            caso("db.obtener_todas", db.obtener_todas, args.repeticiones_pesadas)
+        else:
+            omitir("db.obtener_todas", f"más de {args.max_filas_completas} filas (--max-filas-completas)")
+        caso("db.iterar_mascotas (ligeras)", lambda: sum(1 for _ in db.iterar_mascotas()), args.repeticiones_pesadas)
+
+        celdas_lista = [c for _, c in pares]
+        origen = celdas_lista[0]
+        caso("geo.calcular_score_geo",
+             lambda: motor_geo.calcular_score_geo(origen, celdas_lista[random.randrange(len(celdas_lista))]),
+             10 * args.consultas)
+        candidatos = db.obtener_por_ids([int(i) for i in elegidos[:5]])
+        scores = np.linspace(0.9, 0.5, 5).astype(np.float32)
+        lat_o, lon_o = h3.cell_to_latlng(origen)
+        caso("geo.rerankear_candidatos (5)",
+             lambda: motor_geo.rerankear_candidatos(elegidos[:5], scores, candidatos, origen, lat_o, lon_o),
+             10 * args.consultas)
+
+        textos = generar_textos(1000, palabras_relleno=40)
+        caso("ocr.analizar_texto", lambda: ANALIZADOR.analizar(textos[random.randrange(len(textos))]), 10 * args.consultas)
+
+        motor_mapa = MotorMapa()
+        puntos = list(db.iterar_mascotas(("lat", "lon")))
+        caso("mapa.mapa_calor_bd", lambda: motor_mapa.mapa_calor_bd(puntos), args.repeticiones_pesadas)
+        def agregado_sin_cache():
+            motor_mapa.cache_agregados.clear()
+            return motor_mapa.mapa_calor_agregado(9, db.generacion_conteo(), db.obtener_conteo_celdas)
+        caso("mapa.mapa_calor_agregado", agregado_sin_cache, args.repeticiones_pesadas)
+
+        # Búsqueda completa de la pestaña 1 (sin la inferencia de la red)
+        distritos = list(motor_geo.coordenadas_distritos)
+        referencias = [f"Calle {i}" for i in range(50)]
+        def busqueda():
+            vector_q, _ = elegir()
+            lat_q, lon_q = motor_geo.obtener_coordenadas(random.choice(distritos), random.choice(referencias))
+            h3_q = motor_geo.obtener_h3_index(lat_q, lon_q)
+            scores_q, ids_q = motor_faiss.buscar_en_zona(vector_q, h3_q, k=5)
+            candidatos_q = db.obtener_por_ids([int(i) for i in ids_q if i != -1])
+            return motor_geo.rerankear_candidatos(ids_q, scores_q, candidatos_q, h3_q, lat_q, lon_q)
+        caso("busqueda.extremo_a_extremo", busqueda, args.consultas)
+
+        db.cerrar_conexion()
+    return resultados
+
+
+# --- LÍNEA BASE ---
+
+def metadatos():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """Imprime p50 actual vs. línea base; retorna los casos que empeoraron más que la tolerancia."""
+    empeorados = []
+    print(f"\nComparación con la línea base ({base['meta'].get('fecha')}, commit {base['meta'].get('commit')})")
+    print(f"  {'escala / caso':<40}{'base p50':>10}{'actual p50':>12}{'cambio':>9}")
+    for nombre_n, casos in actual.items():
+        for caso, r in casos.items():
+            anterior = base["resultados"].get(nombre_n, {}).get(caso)
+            if not anterior: continue
+            cambio = r["p50_ms"] / anterior["p50_ms"] - 1 if anterior["p50_ms"] > 0 else 0.0
+            marca = "  <-- más lento" if cambio > tolerancia else ""
+            print(f"  {nombre_n + ' / ' + caso:<40}{anterior['p50_ms']:>10.3f}{r['p50_ms']:>12.3f}{cambio:>+9.0%}{marca}")
+            if marca: empeorados.append(f"{nombre_n} / {caso}")
+    return empeorados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", nargs="+", default=["1k", "100k"], help="Filas sintéticas (1k, 100k, 1M, ...)")
+    parser.add_argument("--dimension", type=int, default=2048)
+    parser.add_argument("--consultas", type=int, default=200, help="Repeticiones de los casos livianos")
+    parser.add_argument("--repeticiones-pesadas", type=int, default=3, help="Repeticiones de lecturas completas y mapas")
+    parser.add_argument("--max-filas-completas", type=int, default=200_000,
+                        help="db.obtener_todas carga todos los vectores: se omite por encima de este tamaño")
+    parser.add_argument("--latencia-geo-ms", type=float, default=0.0, help="Latencia del geocodificador stub")
+    parser.add_argument("--directorio", default=None, help="Dónde crear las BD temporales")
+    parser.add_argument("--linea-base", default=LINEA_BASE)
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como nueva línea base")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Empeoramiento de p50 tolerado (0.2 = 20%%)")
+    parser.add_argument("--fallar-si-empeora", action="store_true", help="Código de salida 1 si algún caso empeora")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    random.seed(args.semilla)
+    db.ALMACEN_ACTIVO = True
+
+    resultados = {}
+    for texto in args.escalas:
+        n = escala(texto)
+        print(f"\n== {nombre_escala(n)} reportes (dimensión {args.dimension})")
+        print(f"  {'caso':<30}{'p50 ms':>10}{'p95 ms':>10}{'ops/s':>12}{'pico MB':>10}")
+        resultados[nombre_escala(n)] = correr_escala(n, args, rng)
+
+    rss = rss_maximo_mb()
+    if rss is not None:
+        print(f"\nRSS máximo del proceso: {rss:.0f} MB")
+
+    empeorados = []
+    if os.path.exists(args.linea_base):
+        with open(args.linea_base, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("meta", {}).get("dimension") == args.dimension:
+            empeorados = comparar(resultados, base, args.tolerancia)
+        else:
+            print(f"\nLínea base {args.linea_base} con otra dimensión: no se compara")
+    else:
+        base = None
+
+    if args.guardar:
+        # Se conservan las escalas de la línea base que no se corrieron esta vez
+        anteriores = base["resultados"] if base and base.get("meta", {}).get("dimension") == args.dimension else {}
+        salida = {
+            "meta": {**metadatos(), "dimension": args.dimension, "rss_maximo_mb": rss},
+            "resultados": {**anteriores, **resultados},
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.linea_base)), exist_ok=True)
+        with open(args.linea_base, "w", encoding="utf-8") as f:
+            json.dump(salida, f, indent=2, ensure_ascii=False)
+        print(f"Línea base guardada en {args.linea_base}")
+
+    if empeorados and args.fallar_si_empeora:
+        sys.exit("Casos más lentos que la línea base:\n" + "\n".join(empeorados))
+
+
+if __name__ == "__main__":
+    main()
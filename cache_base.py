@@ -0,0 +1,65 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class CacheDosNiveles:
+    """
+    Base de las cachés de resultados (inferencia, OCR, geocodificación):
+    - Nivel 1: LRU en memoria (capacidad_memoria entradas).
+    - Nivel 2: SQLite en disco, sobrevive a reinicios.
+    Cada subclase define ESQUEMA (su tabla) y _leer (fila de disco -> entrada); si
+    sus entradas vencen, también _vigente. Las escrituras usan self.conn y self.lock.
+    """
+    ESQUEMA = None
+
+    def __init__(self, ruta_db, capacidad_memoria):
+        self.capacidad_memoria = capacidad_memoria
+        self.memoria = OrderedDict()
+        self.lock = threading.Lock()
+        self.estadisticas = {"hits_memoria": 0, "hits_disco": 0, "fallos": 0}
+
+        os.makedirs(os.path.dirname(ruta_db) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(ruta_db, check_same_thread=False)
+        self.conn.execute(self.ESQUEMA)
+        self._migrar()
+        self.conn.commit()
+
+    def _migrar(self):
+        """Columnas agregadas en versiones posteriores de la tabla (si las hay)."""
+
+    def _leer(self, clave):
+        """Entrada guardada en disco para la clave, o None."""
+        raise NotImplementedError
+
+    def _vigente(self, entrada):
+        return True
+
+    def _obtener(self, clave):
+        """Entrada de la memoria o, si no está (o venció), del disco; None si no hay."""
+        with self.lock:
+            if clave in self.memoria and self._vigente(self.memoria[clave]):
+                self.memoria.move_to_end(clave)
+                self.estadisticas["hits_memoria"] += 1
+                return self.memoria[clave]
+
+            entrada = self._leer(clave)
+            if entrada is None or not self._vigente(entrada):
+                self.memoria.pop(clave, None)
+                self.estadisticas["fallos"] += 1
+                return None
+
+            self.estadisticas["hits_disco"] += 1
+            self._recordar(clave, entrada)
+            return entrada
+
+    def _recordar(self, clave, entrada):
+        self.memoria[clave] = entrada
+        self.memoria.move_to_end(clave)
+        while len(self.memoria) > self.capacidad_memoria:
+            self.memoria.popitem(last=False)
+
+    def tasa_aciertos(self):
+        total = sum(self.estadisticas.values())
+        if total == 0: return 0.0
+        return (self.estadisticas["hits_memoria"] + self.estadisticas["hits_disco"]) / total
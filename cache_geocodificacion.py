@@ -0,0 +1,78 @@
+import re
+import time
+import unicodedata
+
+from cache_base import CacheDosNiveles
+
+def normalizar(texto):
+    """'  Parque  Kennedy, MIRAFLORES ' -> 'parque kennedy miraflores' (sin tildes ni signos)."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(ch for ch in texto if not unicodedata.combining(ch)).lower()
+    return " ".join(re.sub(r"[^a-z0-9ñ]+", " ", texto).split())
+
+class CacheGeocodificacion(CacheDosNiveles):
+    """
+    Caché de geocodificación por (distrito, referencia) normalizados, en memoria
+    y en disco (ver CacheDosNiveles).
+    - Resultados positivos vencen a los ttl_dias; los negativos ("no encontrado":
+      el servicio respondió sin resultados) a las ttl_negativo_horas, para no
+      reintentar cada vez.
+    - Errores pasajeros del servicio (timeout, 429, caída de red) se guardan aparte
+      y vencen a los ttl_error_minutos: un corte breve no deja las referencias
+      consultadas durante él en el respaldo local por un día.
+    """
+    ESQUEMA = '''
+        CREATE TABLE IF NOT EXISTS geocodificacion (
+            clave TEXT PRIMARY KEY,
+            lat REAL,
+            lon REAL,
+            fecha REAL
+        )
+    '''
+
+    def __init__(self, ruta_db="datos/cache_geocodificacion.db", capacidad_memoria=2048,
+                 ttl_dias=30, ttl_negativo_horas=24, ttl_error_minutos=5):
+        self.ttl = ttl_dias * 86400
+        self.ttl_negativo = ttl_negativo_horas * 3600
+        self.ttl_error = ttl_error_minutos * 60
+        super().__init__(ruta_db, capacidad_memoria)
+
+    def _migrar(self):
+        columnas = {fila[1] for fila in self.conn.execute("PRAGMA table_info(geocodificacion)")}
+        if "error" not in columnas:
+            self.conn.execute("ALTER TABLE geocodificacion ADD COLUMN error INTEGER DEFAULT 0")
+
+    @staticmethod
+    def clave(distrito, referencia):
+        return f"{normalizar(distrito)}|{normalizar(referencia)}"
+
+    def _vigente(self, entrada):
+        """entrada: (lat, lon, fecha, error)."""
+        lat, _, fecha, error = entrada
+        if error: ttl = self.ttl_error
+        elif lat is not None: ttl = self.ttl
+        else: ttl = self.ttl_negativo
+        return time.time() - fecha < ttl
+
+    def obtener(self, distrito, referencia):
+        """
+        (lat, lon) si la consulta está en caché y vigente; (None, None) si hay un
+        negativo vigente; None si hay que geocodificar.
+        """
+        entrada = self._obtener(self.clave(distrito, referencia))
+        return None if entrada is None else entrada[:2]
+
+    def _leer(self, clave):
+        return self.conn.execute("SELECT lat, lon, fecha, error FROM geocodificacion WHERE clave = ?", (clave,)).fetchone()
+
+    def guardar(self, distrito, referencia, lat=None, lon=None, error=False):
+        """Guarda el resultado; lat/lon en None registra un negativo (error=True: falla pasajera, TTL corto)."""
+        clave = self.clave(distrito, referencia)
+        entrada = (lat, lon, time.time(), int(error))
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geocodificacion (clave, lat, lon, fecha, error) VALUES (?, ?, ?, ?, ?)",
+                (clave, *entrada)
+            )
+            self.conn.commit()
+            self._recordar(clave, entrada)
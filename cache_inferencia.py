@@ -0,0 +1,66 @@
+import hashlib
+import numpy as np
+
+from cache_base import CacheDosNiveles
+
+class CacheInferencia(CacheDosNiveles):
+    """
+    Caché de resultados de MotorVision por contenido de la imagen (SHA-256 de los bytes),
+    en memoria y en disco (ver CacheDosNiveles).
+    La clave incluye el backend, porque int8/onnx/eager no dan vectores idénticos.
+    Cada entrada guarda el embedding y/o la clasificación (es_animal, etiqueta).
+    """
+    ESQUEMA = '''
+        CREATE TABLE IF NOT EXISTS inferencia (
+            hash TEXT,
+            backend TEXT,
+            es_animal INTEGER,
+            etiqueta TEXT,
+            embedding BLOB,
+            PRIMARY KEY (hash, backend)
+        )
+    '''
+
+    def __init__(self, ruta_db="datos/cache_inferencia.db", capacidad_memoria=512):
+        super().__init__(ruta_db, capacidad_memoria)
+
+    @staticmethod
+    def hash_imagen(datos):
+        return hashlib.sha256(datos).hexdigest()
+
+    def obtener(self, hash_img, backend="eager"):
+        """
+        Retorna {"es_animal", "etiqueta", "embedding"} (campos ausentes = None)
+        o None si la imagen nunca se procesó.
+        """
+        return self._obtener((hash_img, backend))
+
+    def _leer(self, clave):
+        fila = self.conn.execute(
+            "SELECT es_animal, etiqueta, embedding FROM inferencia WHERE hash = ? AND backend = ?", clave
+        ).fetchone()
+        if fila is None: return None
+        return {
+            "es_animal": None if fila[0] is None else bool(fila[0]),
+            "etiqueta": fila[1],
+            "embedding": None if fila[2] is None else np.frombuffer(fila[2], dtype=np.float32)
+        }
+
+    def guardar(self, hash_img, backend="eager", es_animal=None, etiqueta=None, embedding=None):
+        """Guarda (o completa) la entrada. Los campos en None no pisan lo que ya había."""
+        clave = (hash_img, backend)
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO inferencia (hash, backend, es_animal, etiqueta, embedding) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (hash, backend) DO UPDATE SET
+                    es_animal = COALESCE(excluded.es_animal, es_animal),
+                    etiqueta = COALESCE(excluded.etiqueta, etiqueta),
+                    embedding = COALESCE(excluded.embedding, embedding)
+            ''', (
+                hash_img, backend,
+                None if es_animal is None else int(es_animal), etiqueta,
+                None if embedding is None else np.asarray(embedding, dtype=np.float32).tobytes()
+            ))
+            self.conn.commit()
+            # La entrada combinada está en disco; la próxima lectura la sube a memoria
+            self.memoria.pop(clave, None)
@@ -0,0 +1,44 @@
+from cache_base import CacheDosNiveles
+
+class CacheOCR(CacheDosNiveles):
+    """
+    Caché de texto OCR por contenido del afiche (SHA-256 de los bytes), en memoria
+    y en disco (ver CacheDosNiveles).
+    La clave incluye la firma de configuración (preprocesado, idioma), porque
+    el mismo afiche con otro preprocesado no da el mismo texto.
+    """
+    ESQUEMA = '''
+        CREATE TABLE IF NOT EXISTS ocr (
+            hash TEXT,
+            firma TEXT,
+            texto TEXT,
+            PRIMARY KEY (hash, firma)
+        )
+    '''
+
+    def __init__(self, ruta_db="datos/cache_ocr.db", capacidad_memoria=1024):
+        super().__init__(ruta_db, capacidad_memoria)
+
+    def obtener(self, hash_img, firma=""):
+        """Texto guardado para el afiche, o None si nunca se procesó con esta configuración."""
+        return self._obtener((hash_img, firma))
+
+    def _leer(self, clave):
+        fila = self.conn.execute("SELECT texto FROM ocr WHERE hash = ? AND firma = ?", clave).fetchone()
+        return None if fila is None else fila[0]
+
+    def guardar_lote(self, entradas, firma=""):
+        """entradas: [(hash, texto)] en una sola transacción."""
+        entradas = list(entradas)
+        if not entradas: return
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ocr (hash, firma, texto) VALUES (?, ?, ?)",
+                [(h, firma, texto) for h, texto in entradas]
+            )
+            self.conn.commit()
+            for h, texto in entradas:
+                self._recordar((h, firma), texto)
+
+    def guardar(self, hash_img, texto, firma=""):
+        self.guardar_lote([(hash_img, texto)], firma)
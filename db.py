@@ -1,11 +1,185 @@
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import h3
 import numpy as np
 
 DB_NAME = "tesis_mascotas.db"
 
+# --- CONEXIONES ---
+# Una conexión persistente por hilo (las sesiones de Streamlit corren en hilos distintos)
+# en modo WAL: los lectores no se bloquean mientras otra sesión registra una mascota.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",     # En WAL es seguro ante caídas del proceso, y mucho más rápido que FULL
+    "cache_size": -65536,        # 64 MB de caché de páginas (negativo = KB)
+    "mmap_size": 268435456,      # Lecturas de hasta 256 MB vía mmap
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,        # ms esperando un lock de escritura antes de fallar
+}
+
+_local = threading.local()
+
+# Copia columnar mapeada en memoria de los embeddings (ver almacen_embeddings.py),
+# junto al archivo de la BD: <DB_NAME sin extensión>_embeddings.f32 / .ids.
+# SQLite sigue siendo la fuente de verdad; ALMACEN_ACTIVO = False la desactiva.
+ALMACEN_ACTIVO = True
+DIMENSION_ALMACEN = 2048
+_almacen = None
+
+def conexion():
+    """
+    Conexión del hilo actual (se crea la primera vez y se reutiliza).
+    Trabaja en modo autocommit; las escrituras van dentro de transaccion().
+    cached_statements hace que las consultas repetidas reutilicen el statement preparado.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.db_name != DB_NAME:
+        conn = sqlite3.connect(DB_NAME, isolation_level=None, cached_statements=256)
+        for pragma, valor in PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {valor}")
+        _local.conn, _local.db_name, _local.profundidad = conn, DB_NAME, 0
+    return conn
+
+def almacen():
+    """AlmacenEmbeddings de la BD actual (o None si ALMACEN_ACTIVO = False)."""
+    global _almacen
+    if not ALMACEN_ACTIVO: return None
+    ruta_base = os.path.splitext(DB_NAME)[0] + "_embeddings"
+    if _almacen is None or _almacen.ruta_base != ruta_base:
+        from almacen_embeddings import AlmacenEmbeddings
+        _almacen = AlmacenEmbeddings(ruta_base, DIMENSION_ALMACEN)
+    return _almacen
+
+def _anexar_almacen(ids_db, embeddings):
+    """
+    Copia al almacén los embeddings recién insertados. Se llama como último paso
+    DENTRO de la transacción: BEGIN IMMEDIATE serializa a los escritores, así que
+    las filas se anexan en el mismo orden que los ids. Un fallo aquí no impide el
+    registro (el almacén se puede reconstruir desde la BD).
+    """
+    a = almacen()
+    if a is None: return
+    pares = [(i, e) for i, e in zip(ids_db, embeddings) if e is not None and np.size(e) == a.dimension]
+    if not pares: return
+    try:
+        a.agregar([i for i, _ in pares], np.stack([np.asarray(e, dtype=np.float32).reshape(-1) for _, e in pares]))
+    except OSError as e:
+        print(f"No se pudo actualizar el almacén de embeddings ({e}); corra `python almacen_embeddings.py reconstruir`")
+
+def _lotes_almacen(dimension):
+    """(ids, matriz) de TODAS las filas con embedding (abiertas o no), leídas de la BD."""
+    return ((ids, m) for ids, m, _ in iterar_embeddings(0, dimension, usar_almacen=False, solo_abiertos=False))
+
+def compactar_almacen():
+    """
+    Reescribe el almacén desde la BD: descarta las filas borradas y las versiones
+    viejas de los vectores actualizados (actualizar_embedding anexa la nueva).
+    Retorna las filas escritas (None si el almacén está desactivado).
+    """
+    a = almacen()
+    if a is None: return None
+    return a.reconstruir(_lotes_almacen(a.dimension))
+
+def cerrar_conexion():
+    """Cierra la conexión del hilo actual (la próxima llamada abre otra)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaccion():
+    """
+    with transaccion() as c: ...  -> BEGIN IMMEDIATE / COMMIT, o ROLLBACK si hay excepción.
+    Las transacciones anidadas se integran en la exterior.
+    """
+    conn = conexion()
+    if _local.profundidad:
+        _local.profundidad += 1
+        try:
+            yield conn.cursor()
+        finally:
+            _local.profundidad -= 1
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    _local.profundidad = 1
+    try:
+        yield conn.cursor()
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        _local.profundidad = 0
+
+# Formato de los embeddings nuevos: "float32" (8 KB por mascota), "float16" (4 KB)
+# o "int8" (2 KB: escala float32 + 2048 enteros). Cada fila guarda su formato, así
+# que se puede cambiar en cualquier momento (DB_FORMATO_EMBEDDING); para convertir
+# también las filas ya guardadas y recuperar el espacio:
+#     python -c "import db; db.init_db(); print(db.recodificar_embeddings('float16'))"
+FORMATOS_EMBEDDING = ("float32", "float16", "int8")
+FORMATO_EMBEDDING = os.environ.get("DB_FORMATO_EMBEDDING", "float32")
+if FORMATO_EMBEDDING not in FORMATOS_EMBEDDING:
+    raise ValueError(f"DB_FORMATO_EMBEDDING desconocido: {FORMATO_EMBEDDING} (opciones: {FORMATOS_EMBEDDING})")
+
+def codificar_embedding(embedding_array, formato=None):
+    formato = formato or FORMATO_EMBEDDING
+    vector = np.asarray(embedding_array, dtype=np.float32)
+    if formato == "float32":
+        return vector.tobytes()
+    if formato == "float16":
+        return vector.astype(np.float16).tobytes()
+    if formato == "int8":
+        # Cuantización escalar simétrica por vector: v ≈ escala * q, q en [-127, 127]
+        escala = np.float32(np.abs(vector).max() / 127.0 or 1.0)
+        q = np.clip(np.round(vector / escala), -127, 127).astype(np.int8)
+        return escala.tobytes() + q.tobytes()
+    raise ValueError(f"Formato de embedding desconocido: {formato}")
+
+def decodificar_embedding(blob, formato="float32"):
+    if formato == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    if formato == "int8":
+        escala = np.frombuffer(blob[:4], dtype=np.float32)[0]
+        return np.frombuffer(blob[4:], dtype=np.int8).astype(np.float32) * escala
+    return np.frombuffer(blob, dtype=np.float32)
+
+# Filtro SQL "embedding de la dimensión pedida", según el formato de cada fila
+_FILTRO_DIMENSION = """(
+    (embedding_formato = 'float32' AND length(embedding) = ?) OR
+    (embedding_formato = 'float16' AND length(embedding) = ?) OR
+    (embedding_formato = 'int8' AND length(embedding) = ?)
+)"""
+
+def _parametros_dimension(dimension):
+    return (dimension * 4, dimension * 2, dimension + 4)
+
+def _filtro_embeddings(dimension, solo_abiertos):
+    """WHERE (y parámetros) de las filas con embedding válido; solo_abiertos deja fuera los casos cerrados."""
+    condicion = _FILTRO_DIMENSION + (" AND estado = 'abierto'" if solo_abiertos else "")
+    return condicion, _parametros_dimension(dimension)
+
+def _agregar_columna(c, tabla, columna, definicion):
+    """Migración simple: agrega la columna si la BD es de una versión anterior."""
+    c.execute(f"PRAGMA table_info({tabla})")
+    if columna not in [fila[1] for fila in c.fetchall()]:
+        c.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    with transaccion() as c:
+        _crear_esquema(c)
+    
+    # BD de una versión anterior (o almacén borrado): se arma desde las filas existentes
+    a = almacen()
+    if a is not None and a.cantidad() == 0 and contar_embeddings(a.dimension, solo_abiertos=False):
+        total = a.reconstruir(_lotes_almacen(a.dimension))
+        print(f"Almacén de embeddings creado desde la BD: {total} filas")
+
+def _crear_esquema(c):
     c.execute('''
         CREATE TABLE IF NOT EXISTS mascotas (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -19,38 +193,190 @@ def init_db():
             fecha_registro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
-    conn.commit()
-    conn.close()
-
-def guardar_mascota(nombre, distrito, h3_index, lat, lon, ruta_img, embedding_array):
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    embedding_blob = embedding_array.tobytes()
+    _agregar_columna(c, "mascotas", "embedding_formato", "TEXT DEFAULT 'float32'")
+    # SHA-256 de la foto: detecta registros duplicados exactos
+    _agregar_columna(c, "mascotas", "hash_imagen", "TEXT")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_hash ON mascotas (hash_imagen)")
     
+    # Celdas H3 padre (res. 7 ≈ 5 km², res. 8 ≈ 0.7 km²) para consultas por zona con índice
+    _agregar_columna(c, "mascotas", "h3_r7", "TEXT")
+    _agregar_columna(c, "mascotas", "h3_r8", "TEXT")
+    c.execute("SELECT id, h3_index FROM mascotas WHERE h3_r7 IS NULL AND h3_index IS NOT NULL AND h3_index != ''")
+    c.executemany("UPDATE mascotas SET h3_r7 = ?, h3_r8 = ? WHERE id = ?",
+                  [(*_celdas_padre(h3_index), id_db) for id_db, h3_index in c.fetchall()])
+    
+    # Índices secundarios: cada consulta por zona/distrito (+ ventana de tiempo) es un range scan
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_h3 ON mascotas (h3_index, fecha_registro)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_r7 ON mascotas (h3_r7, fecha_registro)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_r8 ON mascotas (h3_r8, fecha_registro)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_distrito ON mascotas (distrito, fecha_registro)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_fecha ON mascotas (fecha_registro)")
+    
+    # Ciclo de vida del reporte (ver ESTADOS): solo los abiertos entran al índice FAISS y al mapa
+    _agregar_columna(c, "mascotas", "estado", "TEXT DEFAULT 'abierto'")
+    _agregar_columna(c, "mascotas", "fecha_estado", "TIMESTAMP")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_mascotas_estado ON mascotas (estado, fecha_registro)")
+    # Registro de filas cuyo vector o estado cambió: el índice FAISS lo relee desde su marca
+    c.execute("CREATE TABLE IF NOT EXISTS cambios_embeddings (seq INTEGER PRIMARY KEY AUTOINCREMENT, id_mascota INTEGER)")
+    # Hasta qué seq se podó ese registro (podar_cambios): una marca anterior ya no se puede poner al día
+    c.execute("CREATE TABLE IF NOT EXISTS poda_cambios (hasta INTEGER)")
+    c.execute("INSERT INTO poda_cambios (hasta) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM poda_cambios)")
+    
+    _crear_conteo_celdas(c)
+    _crear_coincidencias(c)
+
+# Versión de los triggers de conteo_celdas / conteo_distritos (en PRAGMA user_version):
+# subirla cuando cambien, para que init_db los recree y rearme el agregado
+VERSION_CONTEO = 1
+
+def _crear_conteo_celdas(c):
+    """
+    Agregado mantenido de reportes por celda H3 (res. 7, 8 y 9) y por distrito para
+    la pestaña del mapa: los triggers lo actualizan en cada INSERT/DELETE/UPDATE de
+    mascotas, y generacion_conteo sube en cada cambio (sirve de llave para cachear el mapa).
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS conteo_celdas (
+            resolucion INTEGER,
+            celda TEXT,
+            total INTEGER,
+            PRIMARY KEY (resolucion, celda)
+        ) WITHOUT ROWID
+    ''')
     c.execute('''
-        INSERT INTO mascotas (nombre, distrito, h3_index, lat, lon, ruta_imagen, embedding)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (nombre, distrito, h3_index, lat, lon, ruta_img, embedding_blob))
+        CREATE TABLE IF NOT EXISTS conteo_distritos (
+            distrito TEXT PRIMARY KEY,
+            total INTEGER
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE TABLE IF NOT EXISTS generacion_conteo (valor INTEGER)")
+    c.execute("INSERT INTO generacion_conteo (valor) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM generacion_conteo)")
+    
+    # Solo cuentan los casos abiertos: resolver, descartar o vencer un reporte lo saca del mapa
+    def sumar(fila, delta):
+        return "\n".join(
+            f"""INSERT INTO conteo_celdas (resolucion, celda, total) SELECT {r}, {fila}.{col}, {delta}
+                WHERE {fila}.{col} IS NOT NULL AND {fila}.estado IS 'abierto'
+                ON CONFLICT (resolucion, celda) DO UPDATE SET total = total + {delta};"""
+            for r, col in RESOLUCIONES_ZONA
+        ) + f"""
+                INSERT INTO conteo_distritos (distrito, total) SELECT COALESCE({fila}.distrito, ''), {delta}
+                WHERE {fila}.estado IS 'abierto'
+                ON CONFLICT (distrito) DO UPDATE SET total = total + {delta};"""
+    limpiar = "DELETE FROM conteo_celdas WHERE total <= 0; DELETE FROM conteo_distritos WHERE total <= 0;"
+    subir = "UPDATE generacion_conteo SET valor = valor + 1;"
     
-    id_generado = c.lastrowid
-    conn.commit()
-    conn.close()
+    # Solo una vez por BD (PRAGMA user_version): recrear los triggers en cada arranque
+    # invalidaría los statements preparados de las demás conexiones
+    c.execute("PRAGMA user_version")
+    if c.fetchone()[0] >= VERSION_CONTEO:
+        return
+    # BD de una versión anterior: triggers sin el filtro por estado / sin distritos
+    for nombre in ("trg_conteo_insert", "trg_conteo_delete", "trg_conteo_update"):
+        c.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    c.execute(f"CREATE TRIGGER trg_conteo_insert AFTER INSERT ON mascotas BEGIN {sumar('NEW', 1)} {subir} END")
+    c.execute(f"CREATE TRIGGER trg_conteo_delete AFTER DELETE ON mascotas BEGIN {sumar('OLD', -1)} {limpiar} {subir} END")
+    c.execute(f"""CREATE TRIGGER trg_conteo_update AFTER UPDATE OF h3_index, h3_r7, h3_r8, distrito, estado ON mascotas
+                  BEGIN {sumar('OLD', -1)} {sumar('NEW', 1)} {limpiar} {subir} END""")
+    # ... y el agregado se arma desde las filas existentes
+    _reconstruir_conteo_celdas(c)
+    c.execute(f"PRAGMA user_version = {VERSION_CONTEO}")
+
+def _reconstruir_conteo_celdas(c):
+    c.execute("DELETE FROM conteo_celdas")
+    for r, col in RESOLUCIONES_ZONA:
+        c.execute(f"INSERT INTO conteo_celdas (resolucion, celda, total) SELECT {r}, {col}, COUNT(*) FROM mascotas WHERE {col} IS NOT NULL AND estado IS 'abierto' GROUP BY {col}")
+    c.execute("DELETE FROM conteo_distritos")
+    c.execute("INSERT INTO conteo_distritos (distrito, total) SELECT COALESCE(distrito, ''), COUNT(*) FROM mascotas WHERE estado IS 'abierto' GROUP BY 1")
+    c.execute("UPDATE generacion_conteo SET valor = valor + 1")
+
+def reconstruir_conteo_celdas():
+    """Recalcula conteo_celdas y conteo_distritos desde cero (p. ej. tras editar la BD a mano)."""
+    with transaccion() as c:
+        _reconstruir_conteo_celdas(c)
+
+def obtener_conteo_celdas(resolucion=9):
+    """[(celda, total)] de las celdas ocupadas a esa resolución (7, 8 o 9)."""
+    c = conexion().cursor()
+    c.execute("SELECT celda, total FROM conteo_celdas WHERE resolucion = ?", (resolucion,))
+    return c.fetchall()
+
+def generacion_conteo():
+    """Sube con cada alta/baja/cambio de celda: si no cambió, el mapa cacheado sigue vigente."""
+    c = conexion().cursor()
+    c.execute("SELECT valor FROM generacion_conteo")
+    fila = c.fetchone()
+    return fila[0] if fila else 0
+
+def contar_por_distrito():
+    """
+    [(distrito, total)] de casos abiertos, de mayor a menor, desde el agregado que
+    mantienen los triggers: una fila por distrito, sin recorrer mascotas.
+    """
+    c = conexion().cursor()
+    c.execute("SELECT NULLIF(distrito, ''), total FROM conteo_distritos ORDER BY total DESC")
+    return c.fetchall()
+
+# Resoluciones con columna propia: (resolución, columna)
+RESOLUCIONES_ZONA = ((7, "h3_r7"), (8, "h3_r8"), (9, "h3_index"))
+
+def _celdas_padre(h3_index):
+    """(h3_r7, h3_r8) de la celda registrada; None si no es una celda H3 válida."""
+    try:
+        resolucion = h3.get_resolution(h3_index)
+        return tuple(
+            h3.cell_to_parent(h3_index, r) if resolucion >= r else None
+            for r in (7, 8)
+        )
+    except Exception:
+        return None, None
+
+def guardar_mascota(nombre, distrito, h3_index, lat, lon, ruta_img, embedding_array, hash_imagen=None):
+    embedding_blob = codificar_embedding(embedding_array)
+    
+    with transaccion() as c:
+        c.execute('''
+            INSERT INTO mascotas (nombre, distrito, h3_index, lat, lon, ruta_imagen, embedding, embedding_formato, hash_imagen, h3_r7, h3_r8)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (nombre, distrito, h3_index, lat, lon, ruta_img, embedding_blob, FORMATO_EMBEDDING, hash_imagen, *_celdas_padre(h3_index)))
+        id_generado = c.lastrowid
+        _anexar_almacen([id_generado], [embedding_array])
     return id_generado
 
+def guardar_mascotas_lote(registros):
+    """
+    Inserción masiva (importaciones): registros es una lista de tuplas
+    (nombre, distrito, h3_index, lat, lon, ruta_img, embedding_array, hash_imagen).
+    Un solo executemany dentro de UNA transacción.
+    """
+    filas = [
+        (nombre, distrito, h3_index, lat, lon, ruta_img, codificar_embedding(emb), FORMATO_EMBEDDING, hash_img, *_celdas_padre(h3_index))
+        for nombre, distrito, h3_index, lat, lon, ruta_img, emb, hash_img in registros
+    ]
+    with transaccion() as c:
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM mascotas")
+        id_previo = c.fetchone()[0]
+        c.executemany('''
+            INSERT INTO mascotas (nombre, distrito, h3_index, lat, lon, ruta_imagen, embedding, embedding_formato, hash_imagen, h3_r7, h3_r8)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', filas)
+        # AUTOINCREMENT + transacción exclusiva: los ids nuevos son los > id_previo, en orden de inserción
+        c.execute("SELECT id FROM mascotas WHERE id > ? ORDER BY id", (id_previo,))
+        _anexar_almacen([fila[0] for fila in c.fetchall()], [r[6] for r in registros])
+    return len(filas)
+
 def obtener_todas():
     """
     CORREGIDO: Ahora incluye lat y lon en el SELECT
     """
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = conexion().cursor()
     # Agregamos lat, lon a la consulta
-    c.execute("SELECT id, nombre, distrito, h3_index, ruta_imagen, embedding, lat, lon FROM mascotas")
+    c.execute("SELECT id, nombre, distrito, h3_index, ruta_imagen, embedding, lat, lon, embedding_formato FROM mascotas")
     filas = c.fetchall()
-    conn.close()
     
     resultados = []
     for fila in filas:
-        emb_array = np.frombuffer(fila[5], dtype=np.float32)
+        emb_array = decodificar_embedding(fila[5], fila[8])
         resultados.append({
             "id": fila[0],
             "nombre": fila[1],
@@ -69,17 +395,15 @@ def obtener_por_ids(lista_ids):
     """
     if not len(lista_ids): return []
     
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+    c = conexion().cursor()
     
-    query = f"SELECT id, nombre, distrito, h3_index, ruta_imagen, embedding, lat, lon FROM mascotas WHERE id IN ({','.join(map(str, lista_ids))})"
-    c.execute(query)
+    query = f"SELECT id, nombre, distrito, h3_index, ruta_imagen, embedding, lat, lon, embedding_formato FROM mascotas WHERE id IN ({','.join('?' * len(lista_ids))})"
+    c.execute(query, [int(i) for i in lista_ids])
     filas = c.fetchall()
-    conn.close()
     
     resultados = []
     for fila in filas:
-        emb_array = np.frombuffer(fila[5], dtype=np.float32)
+        emb_array = decodificar_embedding(fila[5], fila[8])
         resultados.append({
             "id": fila[0],
             "nombre": fila[1],
@@ -90,4 +414,490 @@ def obtener_por_ids(lista_ids):
             "lat": fila[6], # <--- IMPORTANTE
             "lon": fila[7]  # <--- IMPORTANTE
         })
-    return resultados
\ No newline at end of file
+    return resultados
+
+def contar_embeddings(dimension=2048, solo_abiertos=True):
+    """
+    Cantidad de filas con un embedding válido de la dimensión indicada
+    (por defecto solo casos abiertos, que son los que van al índice).
+    Sirve para verificar que el índice FAISS esté sincronizado con la BD.
+    """
+    condicion, parametros = _filtro_embeddings(dimension, solo_abiertos)
+    c = conexion().cursor()
+    c.execute(f"SELECT COUNT(*) FROM mascotas WHERE {condicion}", parametros)
+    total = c.fetchone()[0]
+    return total
+
+def obtener_embeddings_desde(id_minimo=0, dimension=2048):
+    """
+    Embeddings de las filas con id > id_minimo, listos para agregarse al
+    índice en un solo lote.
+    Retorna: (ids int64 de forma (N,), matriz float32 de forma (N, dimension), lista de h3_index)
+    """
+    lotes = list(iterar_embeddings(id_minimo, dimension))
+    if not lotes:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, dimension), dtype=np.float32), []
+    return (
+        np.concatenate([l[0] for l in lotes]),
+        np.concatenate([l[1] for l in lotes]),
+        [h for l in lotes for h in l[2]]
+    )
+
+def iterar_embeddings(id_minimo=0, dimension=2048, tamano_lote=4096, usar_almacen=True, solo_abiertos=True):
+    """
+    Igual que obtener_embeddings_desde, pero por partes (fetchmany): genera tuplas
+    (ids, matriz (n, dimension), h3_indices) de a lo sumo tamano_lote filas.
+    La memoria usada no depende del tamaño de la tabla.
+    Con el almacén activo no se leen los BLOBs: los vectores salen del memmap
+    (y de SQLite solo los que falten). usar_almacen=False fuerza leer la BD.
+    solo_abiertos=False incluye los casos cerrados (para el almacén, que refleja toda la tabla).
+    """
+    condicion, parametros = _filtro_embeddings(dimension, solo_abiertos)
+    a = almacen() if usar_almacen else None
+    if a is not None and a.dimension == dimension:
+        c = conexion().cursor()
+        c.execute(f"SELECT id, h3_index FROM mascotas WHERE id > ? AND {condicion} ORDER BY id", (id_minimo, *parametros))
+        while True:
+            filas = c.fetchmany(tamano_lote)
+            if not filas: break
+            ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+            yield ids, obtener_vectores(ids, dimension), [fila[1] for fila in filas]
+        return
+
+    c = conexion().cursor()
+    c.execute(
+        f"SELECT id, embedding, h3_index, embedding_formato FROM mascotas WHERE id > ? AND {condicion} ORDER BY id",
+        (id_minimo, *parametros)
+    )
+    while True:
+        filas = c.fetchmany(tamano_lote)
+        if not filas: break
+        ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+        matriz = np.zeros((len(filas), dimension), dtype=np.float32)
+        for i, fila in enumerate(filas):
+            matriz[i] = decodificar_embedding(fila[1], fila[3])
+        yield ids, matriz, [fila[2] for fila in filas]
+
+# Columnas que se pueden pedir a iterar_mascotas. "vector" es el embedding ya decodificado.
+COLUMNAS_MASCOTAS = ("id", "nombre", "distrito", "h3_index", "h3_r7", "h3_r8", "lat", "lon", "ruta_imagen",
+                     "fecha_registro", "hash_imagen", "vector")
+# Proyección liviana para mapas y tablas (sin el BLOB de 8 KB)
+COLUMNAS_LIGERAS = ("id", "nombre", "distrito", "lat", "lon")
+
+def iterar_mascotas(columnas=COLUMNAS_LIGERAS, tamano_lote=1000):
+    """
+    Recorre la tabla por partes (fetchmany) leyendo SOLO las columnas pedidas.
+    Genera un dict por fila; sin "vector" no se lee ningún embedding.
+    """
+    return _seleccionar(columnas, orden="id", tamano_lote=tamano_lote)
+
+def _seleccionar(columnas, condicion="1", parametros=(), orden="id", tamano_lote=1000):
+    """SELECT de las columnas pedidas con un WHERE armado por el llamador; genera dicts."""
+    desconocidas = set(columnas) - set(COLUMNAS_MASCOTAS)
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {sorted(desconocidas)}")
+    
+    sql_columnas = [col for col in columnas if col != "vector"]
+    if "vector" in columnas:
+        sql_columnas += ["embedding", "embedding_formato"]
+    
+    c = conexion().cursor()
+    c.execute(f"SELECT {', '.join(sql_columnas)} FROM mascotas WHERE {condicion} ORDER BY {orden}", parametros)
+    while True:
+        filas = c.fetchmany(tamano_lote)
+        if not filas: break
+        for fila in filas:
+            registro = dict(zip(sql_columnas, fila))
+            if "vector" in columnas:
+                blob, formato = registro.pop("embedding"), registro.pop("embedding_formato")
+                registro["vector"] = None if blob is None else decodificar_embedding(blob, formato)
+            yield registro
+
+# --- CONSULTAS POR ZONA, DISTRITO Y FECHA (todas resueltas con índices) ---
+
+def _fecha_sql(fecha):
+    """datetime (o texto ya formateado) -> texto comparable con fecha_registro (UTC, CURRENT_TIMESTAMP)."""
+    if isinstance(fecha, datetime):
+        if fecha.tzinfo is not None:
+            fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+        return fecha.strftime("%Y-%m-%d %H:%M:%S")
+    return fecha
+
+def _condicion_fechas(desde, hasta):
+    condiciones, parametros = [], []
+    if desde is not None:
+        condiciones.append("fecha_registro >= ?")
+        parametros.append(_fecha_sql(desde))
+    if hasta is not None:
+        condiciones.append("fecha_registro < ?")
+        parametros.append(_fecha_sql(hasta))
+    return condiciones, parametros
+
+def hace_dias(dias):
+    """Inicio de una ventana de los últimos `dias` días, para usar como `desde`."""
+    return datetime.now(timezone.utc) - timedelta(days=dias)
+
+def _condicion_zona(h3_celdas):
+    """
+    WHERE para un conjunto de celdas de cualquier resolución: cada celda se compara
+    contra la columna de su resolución (h3_r7, h3_r8 o h3_index). Las más gruesas
+    que 7 se expanden a sus hijas de res. 7; las más finas que 9 se llevan a res. 9.
+    """
+    por_columna = {columna: set() for _, columna in RESOLUCIONES_ZONA}
+    for celda in h3_celdas:
+        resolucion = h3.get_resolution(celda)
+        if resolucion < 7:
+            por_columna["h3_r7"].update(h3.cell_to_children(celda, 7))
+        elif resolucion > 9:
+            por_columna["h3_index"].add(h3.cell_to_parent(celda, 9))
+        else:
+            por_columna[dict(RESOLUCIONES_ZONA)[resolucion]].add(celda)
+
+    condiciones, parametros = [], []
+    for columna, celdas in por_columna.items():
+        if celdas:
+            condiciones.append(f"{columna} IN ({','.join('?' * len(celdas))})")
+            parametros.extend(sorted(celdas))
+    return condiciones, parametros
+
+def obtener_por_zona(h3_celdas, desde=None, hasta=None, columnas=COLUMNAS_LIGERAS):
+    """
+    Reportes dentro de un conjunto de celdas H3 (p. ej. h3.grid_disk(centro, k)),
+    opcionalmente en [desde, hasta). Lista de dicts con las columnas pedidas.
+    """
+    condiciones_zona, parametros = _condicion_zona(h3_celdas)
+    if not condiciones_zona: return []
+    condiciones_fecha, parametros_fecha = _condicion_fechas(desde, hasta)
+    # Cada rama del OR usa su propio índice (multi-index OR); la fecha acota cada rango
+    condicion = " AND ".join([f"({' OR '.join(condiciones_zona)})"] + condiciones_fecha)
+    # "+fecha_registro": el orden se resuelve con un sort de las filas de la zona; sin el "+",
+    # cuando no hay rango de fechas SQLite prefiere recorrer idx_mascotas_fecha entero para evitar el sort
+    return list(_seleccionar(columnas, condicion, parametros + parametros_fecha, orden="+fecha_registro DESC"))
+
+def obtener_recientes_cerca(h3_centro, anillos=1, dias=14, resolucion=8, columnas=COLUMNAS_LIGERAS):
+    """Reportes de los últimos `dias` días en el k-ring de `anillos` alrededor de h3_centro."""
+    if h3.get_resolution(h3_centro) > resolucion:
+        h3_centro = h3.cell_to_parent(h3_centro, resolucion)
+    return obtener_por_zona(h3.grid_disk(h3_centro, anillos), desde=hace_dias(dias), columnas=columnas)
+
+def obtener_por_distrito(distrito, desde=None, hasta=None, columnas=COLUMNAS_LIGERAS):
+    condiciones, parametros = _condicion_fechas(desde, hasta)
+    condicion = " AND ".join(["distrito = ?"] + condiciones)
+    return list(_seleccionar(columnas, condicion, [distrito] + parametros, orden="fecha_registro DESC"))
+
+def obtener_por_fecha(desde=None, hasta=None, columnas=COLUMNAS_LIGERAS):
+    """Reportes registrados en [desde, hasta) (datetime o 'YYYY-MM-DD HH:MM:SS', UTC)."""
+    condiciones, parametros = _condicion_fechas(desde, hasta)
+    condicion = " AND ".join(condiciones) or "1"
+    return list(_seleccionar(columnas, condicion, parametros, orden="fecha_registro DESC"))
+
+def obtener_vectores(lista_ids, dimension=2048):
+    """
+    Embeddings a precisión completa para el re-ranking exacto.
+    Retorna una matriz (N, dimension) alineada con lista_ids; IDs inexistentes quedan en cero.
+    Primero se buscan en el almacén mapeado en memoria; solo los que falten se leen de SQLite.
+    """
+    matriz = np.zeros((len(lista_ids), dimension), dtype=np.float32)
+    if not len(lista_ids): return matriz
+    
+    faltantes = list(range(len(lista_ids)))
+    a = almacen()
+    if a is not None and a.dimension == dimension:
+        matriz, encontrados = a.obtener(lista_ids)
+        faltantes = np.flatnonzero(~encontrados).tolist()
+    if not faltantes: return matriz
+    
+    posicion = {int(lista_ids[i]): i for i in faltantes}
+    c = conexion().cursor()
+    ids_faltantes = list(posicion)
+    # En tandas: SQLite limita la cantidad de parámetros por consulta
+    for inicio in range(0, len(ids_faltantes), 900):
+        tanda = ids_faltantes[inicio:inicio + 900]
+        c.execute(
+            f"SELECT id, embedding, embedding_formato FROM mascotas WHERE id IN ({','.join('?' * len(tanda))})",
+            tanda
+        )
+        for fila in c.fetchall():
+            vector = decodificar_embedding(fila[1], fila[2])
+            if len(vector) == dimension:
+                matriz[posicion[fila[0]]] = vector
+    return matriz
+
+def recodificar_embeddings(formato):
+    """
+    Convierte todos los embeddings guardados al formato indicado y compacta el
+    archivo (VACUUM) para que el ahorro se vea en disco.
+    Retorna la cantidad de filas convertidas.
+    """
+    if formato not in FORMATOS_EMBEDDING:
+        raise ValueError(f"Formato de embedding desconocido: {formato}")
+    with transaccion() as c:
+        c.execute("SELECT id, embedding, embedding_formato FROM mascotas WHERE embedding IS NOT NULL AND embedding_formato != ?", (formato,))
+        filas = c.fetchall()
+        c.executemany(
+            "UPDATE mascotas SET embedding = ?, embedding_formato = ? WHERE id = ?",
+            [(codificar_embedding(decodificar_embedding(blob, fmt), formato), formato, id_db) for id_db, blob, fmt in filas]
+        )
+    # VACUUM no puede correr dentro de una transacción
+    conexion().execute("VACUUM")
+    return len(filas)
+
+def hashes_existentes(lista_hashes, tamano_lote=500):
+    """
+    Subconjunto de lista_hashes que ya está registrado (para saltar fotos ya importadas).
+    Consulta en tandas para no exceder el límite de parámetros de SQLite.
+    """
+    lista_hashes = [h for h in lista_hashes if h]
+    existentes = set()
+    c = conexion().cursor()
+    for inicio in range(0, len(lista_hashes), tamano_lote):
+        tanda = lista_hashes[inicio:inicio + tamano_lote]
+        c.execute(f"SELECT hash_imagen FROM mascotas WHERE hash_imagen IN ({','.join('?' * len(tanda))})", tanda)
+        existentes.update(fila[0] for fila in c.fetchall())
+    return existentes
+
+def obtener_por_hash(hash_imagen):
+    """
+    Registro previo con exactamente la misma foto (mismo SHA-256), o None.
+    Incluye su estado: un caso cerrado con la misma foto se puede reabrir.
+    """
+    if not hash_imagen: return None
+    
+    c = conexion().cursor()
+    c.execute("SELECT id, nombre, distrito, estado FROM mascotas WHERE hash_imagen = ? ORDER BY id LIMIT 1", (hash_imagen,))
+    fila = c.fetchone()
+    
+    if fila is None: return None
+    return {"id": fila[0], "nombre": fila[1], "distrito": fila[2], "estado": fila[3]}
+
+def actualizar_rutas_imagen(cambios):
+    """
+    Apunta los reportes a su foto en el almacén de imágenes (almacen_imagenes.py migrar).
+    cambios: [(id, ruta_imagen, hash_imagen)]; el hash solo se completa si faltaba.
+    """
+    with transaccion() as c:
+        c.executemany(
+            "UPDATE mascotas SET ruta_imagen = ?, hash_imagen = COALESCE(hash_imagen, ?) WHERE id = ?",
+            [(ruta, hash_img, int(id_db)) for id_db, ruta, hash_img in cambios]
+        )
+    return len(cambios)
+
+# --- COINCIDENCIAS (trabajo offline de emparejamiento, ver emparejamiento.py) ---
+
+def _crear_coincidencias(c):
+    """
+    Pares candidatos encontrados por el emparejamiento de todos contra todos.
+    Cada par se guarda una sola vez, con id_a < id_b. marcas_trabajo guarda el
+    mayor id ya procesado por cada trabajo, para reprocesar solo lo nuevo.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS coincidencias (
+            id_a INTEGER,
+            id_b INTEGER,
+            score REAL,
+            vis REAL,
+            geo REAL,
+            tiempo REAL,
+            dist_km REAL,
+            fecha_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_a, id_b)
+        ) WITHOUT ROWID
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_coincidencias_b ON coincidencias (id_b)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_coincidencias_score ON coincidencias (score)")
+    c.execute("CREATE TABLE IF NOT EXISTS marcas_trabajo (nombre TEXT PRIMARY KEY, ultimo_id INTEGER)")
+
+def marca_trabajo(nombre):
+    """Mayor id de mascotas ya procesado por el trabajo (0 si nunca corrió)."""
+    c = conexion().cursor()
+    c.execute("SELECT ultimo_id FROM marcas_trabajo WHERE nombre = ?", (nombre,))
+    fila = c.fetchone()
+    return fila[0] if fila else 0
+
+def guardar_coincidencias(pares, nombre_trabajo=None, ultimo_id=None):
+    """
+    pares: [(id_a, id_b, score, vis, geo, tiempo, dist_km)]; el orden de los ids no importa.
+    Un par ya guardado se reemplaza con el cálculo nuevo. Si se indica nombre_trabajo,
+    su marca avanza a ultimo_id en la MISMA transacción: si el trabajo se interrumpe,
+    el lote en curso se vuelve a procesar entero.
+    """
+    filas = [(min(a, b), max(a, b), *resto) for a, b, *resto in pares]
+    with transaccion() as c:
+        c.executemany('''
+            INSERT OR REPLACE INTO coincidencias (id_a, id_b, score, vis, geo, tiempo, dist_km)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', filas)
+        if nombre_trabajo is not None:
+            c.execute("INSERT OR REPLACE INTO marcas_trabajo (nombre, ultimo_id) VALUES (?, ?)", (nombre_trabajo, ultimo_id))
+    return len(filas)
+
+def reiniciar_coincidencias(nombre_trabajo):
+    """Borra los pares y la marca del trabajo (la próxima corrida procesa todo)."""
+    with transaccion() as c:
+        c.execute("DELETE FROM coincidencias")
+        c.execute("DELETE FROM marcas_trabajo WHERE nombre = ?", (nombre_trabajo,))
+
+def obtener_coincidencias(score_minimo=0.0, id_mascota=None, limite=100, solo_abiertos=True):
+    """
+    Pares de mayor a menor score (opcionalmente solo los de una mascota), con el
+    nombre y distrito de ambos reportes. Por defecto, solo pares entre casos abiertos.
+    """
+    condicion, parametros = "co.score >= ?", [score_minimo]
+    if solo_abiertos:
+        condicion += " AND a.estado = 'abierto' AND b.estado = 'abierto'"
+    if id_mascota is not None:
+        condicion += " AND (co.id_a = ? OR co.id_b = ?)"
+        parametros += [id_mascota, id_mascota]
+    c = conexion().cursor()
+    c.execute(f'''
+        SELECT co.id_a, a.nombre, a.distrito, co.id_b, b.nombre, b.distrito,
+               co.score, co.vis, co.geo, co.tiempo, co.dist_km, co.fecha_calculo
+        FROM coincidencias co
+        JOIN mascotas a ON a.id = co.id_a
+        JOIN mascotas b ON b.id = co.id_b
+        WHERE {condicion}
+        ORDER BY co.score DESC
+        LIMIT ?
+    ''', (*parametros, limite))
+    claves = ("id_a", "nombre_a", "distrito_a", "id_b", "nombre_b", "distrito_b",
+              "score", "vis", "geo", "tiempo", "dist_km", "fecha_calculo")
+    return [dict(zip(claves, fila)) for fila in c.fetchall()]
+
+# --- CICLO DE VIDA DE LOS REPORTES ---
+
+# "abierto" es un caso activo: está en el índice FAISS, en el mapa y recibe alertas.
+# Los demás son casos cerrados: "resuelto" (mascota reunida), "descartado" (spam o
+# error) y "vencido" (sin novedades durante demasiado tiempo, ver vencer_reportes).
+ESTADOS = ("abierto", "resuelto", "descartado", "vencido")
+
+def _tandas(ids, tamano=900):
+    """Listas de a lo sumo `tamano` ids (SQLite limita la cantidad de parámetros por consulta)."""
+    ids = [int(i) for i in ids]
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+def _registrar_cambios(c, ids):
+    """Anota en cambios_embeddings las filas cuyo vector o estado cambió (dentro de la transacción)."""
+    c.executemany("INSERT INTO cambios_embeddings (id_mascota) VALUES (?)", [(int(i),) for i in ids])
+
+def cambiar_estado(lista_ids, estado):
+    """
+    Pasa los reportes al estado indicado (p. ej. "resuelto" al reunir a la mascota).
+    Retorna los ids que efectivamente cambiaron: el índice FAISS debe sacarlos
+    (MotorFAISS.eliminar), o volver a agregarlos si se reabrieron.
+    """
+    if estado not in ESTADOS:
+        raise ValueError(f"Estado desconocido: {estado} (opciones: {ESTADOS})")
+    cambiados = []
+    with transaccion() as c:
+        for tanda in _tandas(lista_ids):
+            marcas = ",".join("?" * len(tanda))
+            c.execute(f"SELECT id FROM mascotas WHERE id IN ({marcas}) AND estado IS NOT ?", (*tanda, estado))
+            ids = [fila[0] for fila in c.fetchall()]
+            c.execute(f"UPDATE mascotas SET estado = ?, fecha_estado = CURRENT_TIMESTAMP WHERE id IN ({marcas}) AND estado IS NOT ?",
+                      (estado, *tanda, estado))
+            cambiados += ids
+        _registrar_cambios(c, cambiados)
+    return cambiados
+
+def vencer_reportes(dias):
+    """
+    Política de vencimiento: los casos abiertos registrados (o reabiertos) hace más
+    de `dias` días pasan a "vencido" (range scan sobre idx_mascotas_estado). Retorna sus ids.
+    """
+    limite = _fecha_sql(hace_dias(dias))
+    condicion = "estado = 'abierto' AND fecha_registro < ? AND (fecha_estado IS NULL OR fecha_estado < ?)"
+    with transaccion() as c:
+        c.execute(f"SELECT id FROM mascotas WHERE {condicion}", (limite, limite))
+        ids = [fila[0] for fila in c.fetchall()]
+        c.execute(f"UPDATE mascotas SET estado = 'vencido', fecha_estado = CURRENT_TIMESTAMP WHERE {condicion}",
+                  (limite, limite))
+        _registrar_cambios(c, ids)
+    return ids
+
+def actualizar_embedding(id_db, embedding_array, hash_imagen=None):
+    """
+    Reemplaza el vector de un reporte (p. ej. una foto nueva del mismo animal).
+    El almacén recibe la versión nueva al final (la lectura se queda con la última).
+    Retorna False si el id no existe.
+    """
+    embedding_blob = codificar_embedding(embedding_array)
+    with transaccion() as c:
+        c.execute(
+            "UPDATE mascotas SET embedding = ?, embedding_formato = ?, hash_imagen = COALESCE(?, hash_imagen) WHERE id = ?",
+            (embedding_blob, FORMATO_EMBEDDING, hash_imagen, int(id_db))
+        )
+        if c.rowcount == 0: return False
+        _registrar_cambios(c, [id_db])
+        _anexar_almacen([int(id_db)], [embedding_array])
+    return True
+
+def eliminar_mascotas(lista_ids):
+    """
+    Borra los reportes (y sus pares en coincidencias). Para casos reales conviene
+    cambiar_estado, que conserva el historial; esto es para datos que no deben quedar.
+    Retorna la cantidad de filas borradas.
+    """
+    borradas = 0
+    with transaccion() as c:
+        for tanda in _tandas(lista_ids):
+            marcas = ",".join("?" * len(tanda))
+            c.execute(f"DELETE FROM coincidencias WHERE id_a IN ({marcas}) OR id_b IN ({marcas})", (*tanda, *tanda))
+            c.execute(f"DELETE FROM mascotas WHERE id IN ({marcas})", tanda)
+            borradas += c.rowcount
+            _registrar_cambios(c, tanda)
+    return borradas
+
+def fuentes_indice(dimension=2048):
+    """Cómo lee MotorFAISS esta BD: argumentos de sincronizar / compactar (solo casos abiertos)."""
+    return {
+        "leer_desde": lambda id_min: iterar_embeddings(id_min, dimension),
+        "contar_filas": lambda: contar_embeddings(dimension),
+        "leer_cambios": lambda marca: cambios_desde(marca, dimension),
+        "marca_cambios": ultima_marca_cambios,
+    }
+
+def ultima_marca_cambios():
+    """Última seq de cambios_embeddings (sin leer el registro: MAX de la llave primaria)."""
+    c = conexion().cursor()
+    c.execute("SELECT MAX((SELECT COALESCE(MAX(seq), 0) FROM cambios_embeddings), (SELECT hasta FROM poda_cambios))")
+    return c.fetchone()[0]
+
+def podar_cambios(marca):
+    """
+    Borra de cambios_embeddings lo ya aplicado hasta `marca` (la del índice guardado en
+    disco, ver MotorFAISS.guardar). Un índice con una marca anterior recibe None de
+    cambios_desde y se reconstruye. Retorna las filas borradas.
+    """
+    with transaccion() as c:
+        c.execute("DELETE FROM cambios_embeddings WHERE seq <= ?", (marca,))
+        borradas = c.rowcount
+        c.execute("UPDATE poda_cambios SET hasta = MAX(hasta, ?)", (marca,))
+    return borradas
+
+def cambios_desde(seq, dimension=2048):
+    """
+    Filas cuyo vector o estado cambió después de la marca `seq` de cambios_embeddings.
+    Retorna (última seq, ids cambiados, iterable de (ids, matriz, h3_indices) con los que
+    siguen abiertos y con embedding válido, como iterar_embeddings), o (None, None, None)
+    si el registro ya se podó más allá de `seq`.
+    """
+    c = conexion().cursor()
+    c.execute("SELECT hasta FROM poda_cambios")
+    if seq < c.fetchone()[0]:
+        return None, None, None
+    ultima = ultima_marca_cambios()
+    c.execute("SELECT DISTINCT id_mascota FROM cambios_embeddings WHERE seq > ? AND seq <= ? ORDER BY id_mascota", (seq, ultima))
+    ids = np.array([fila[0] for fila in c.fetchall()], dtype=np.int64)
+    return ultima, ids, _abiertos_con_embedding(ids, dimension)
+
+def _abiertos_con_embedding(lista_ids, dimension):
+    condicion, parametros = _filtro_embeddings(dimension, True)
+    c = conexion().cursor()
+    for tanda in _tandas(lista_ids):
+        c.execute(f"SELECT id, h3_index FROM mascotas WHERE id IN ({','.join('?' * len(tanda))}) AND {condicion} ORDER BY id",
+                  (*tanda, *parametros))
+        filas = c.fetchall()
+        if not filas: continue
+        ids = np.array([fila[0] for fila in filas], dtype=np.int64)
+        yield ids, obtener_vectores(ids, dimension), [fila[1] for fila in filas]
@@ -0,0 +1,192 @@
+"""
+Emparejamiento offline de todos contra todos: cada reporte reciente se busca
+contra el índice FAISS completo, y los pares candidatos quedan en la tabla
+coincidencias. Cubre lo que la alerta del registro (buscar_en_zona k=3 contra
+lo ya indexado en ese momento) no ve: la pareja que se registró después, y
+coincidencias que quedaron justo debajo del umbral.
+
+- Búsqueda kNN por lotes (MotorFAISS.buscar_lote) con un piso de similitud visual.
+- Fusión vectorizada visual + geo + tiempo de todo el lote en una pasada NumPy:
+      score = 0.6 * visual + 0.3 * geo + 0.1 * tiempo
+  (geo: caída lineal hasta 20 km entre centros de celda, como en MotorGeo;
+   tiempo: caída lineal hasta ventana_tiempo_dias entre las fechas de registro).
+- Cada par se guarda una sola vez (id_a < id_b); una nueva corrida lo recalcula.
+- Incremental: solo se procesan los reportes con id mayor a la marca de la
+  corrida anterior; la marca avanza junto con cada lote guardado.
+
+Uso (desde la raíz del repo):
+    python emparejamiento.py --dias 60 --k 10 --score-minimo 0.8
+    python emparejamiento.py --completo        # descarta los pares y reprocesa todo
+"""
+import argparse
+import time
+
+import numpy as np
+
+import db
+from utils_geo import MotorGeo
+
+RUTA_INDICE_FAISS = "datos/indice/mascotas.faiss"
+NOMBRE_TRABAJO = "emparejamiento"
+
+# Pesos de la fusión (visual, geo, tiempo)
+PESOS = (0.6, 0.3, 0.1)
+
+
+def _a_dias(fechas):
+    """Textos de fecha_registro -> días desde 1970 (float, nan si falta)."""
+    fechas = np.array(fechas, dtype="datetime64[s]")
+    return (fechas - np.datetime64(0, "s")) / np.timedelta64(1, "D")
+
+
+def cargar_metadatos():
+    """
+    Columnas que necesita la fusión, de TODA la tabla, como arrays alineados y
+    ordenados por id (sin leer embeddings): ids, celdas, centros, lat, lon, dias.
+    """
+    ids, celdas, lats, lons, fechas = [], [], [], [], []
+    for r in db.iterar_mascotas(("id", "h3_index", "lat", "lon", "fecha_registro"), tamano_lote=5000):
+        ids.append(r["id"])
+        celdas.append(r["h3_index"] or None)
+        lats.append(r["lat"])
+        lons.append(r["lon"])
+        fechas.append(r["fecha_registro"])
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "celdas": np.array(celdas, dtype=object),
+        "centros": MotorGeo.centros_celdas(celdas),
+        "lat": np.array(lats, dtype=np.float64),
+        "lon": np.array(lons, dtype=np.float64),
+        "dias": _a_dias(fechas),
+    }
+
+
+def _posiciones(meta, ids):
+    """Posición de cada id en los metadatos y máscara de los que están."""
+    posiciones = np.minimum(np.searchsorted(meta["ids"], ids), max(len(meta["ids"]) - 1, 0))
+    return posiciones, meta["ids"][posiciones] == ids
+
+
+def fusionar(meta, pos_q, pos_c, vis, pesos=PESOS, ventana_tiempo_dias=30.0, max_radio_km=20.0):
+    """
+    Scores de todos los pares del lote a la vez. pos_q: (n, 1) posiciones de las
+    consultas; pos_c: (n, k) de sus candidatos; vis: (n, k) similitud visual.
+    Retorna un dict de arrays (n, k): score, vis, geo, tiempo, dist_km.
+    """
+    centros_q, centros_c = meta["centros"][pos_q], meta["centros"][pos_c]
+    distancias = MotorGeo.haversine_km_lote(centros_q[..., 0], centros_q[..., 1], centros_c[..., 0], centros_c[..., 1])
+    celdas_c = meta["celdas"][pos_c]
+    misma_celda = (meta["celdas"][pos_q] == celdas_c) & np.not_equal(celdas_c, None)
+    geo = MotorGeo.scores_geo_por_distancia(distancias, misma_celda, max_radio_km)
+
+    diferencia_dias = np.abs(meta["dias"][pos_q] - meta["dias"][pos_c])
+    tiempo = np.nan_to_num(np.clip(1 - diferencia_dias / ventana_tiempo_dias, 0.0, 1.0), nan=0.0)
+
+    dist_km = MotorGeo.haversine_km_lote(meta["lat"][pos_q], meta["lon"][pos_q], meta["lat"][pos_c], meta["lon"][pos_c])
+    peso_visual, peso_geo, peso_tiempo = pesos
+    score = peso_visual * vis + peso_geo * geo + peso_tiempo * tiempo
+    return {"score": score, "vis": vis, "geo": geo, "tiempo": tiempo, "dist_km": dist_km}
+
+
+def emparejar(motor_faiss, k=10, umbral_visual=0.6, score_minimo=0.8, dias=60, lote=256,
+              pesos=PESOS, ventana_tiempo_dias=30.0, max_radio_km=20.0, completo=False):
+    """
+    Corre el trabajo sobre los reportes con id > marca registrados en los últimos
+    `dias` días (dias=None: sin límite). El índice debe estar sincronizado con la BD.
+    Retorna estadísticas: consultas, pares, ultimo_id y segundos por etapa.
+    """
+    if completo:
+        db.reiniciar_coincidencias(NOMBRE_TRABAJO)
+    marca = db.marca_trabajo(NOMBRE_TRABAJO)
+    meta = cargar_metadatos()
+    if len(meta["ids"]) == 0 or meta["ids"][-1] <= marca:
+        return {"consultas": 0, "pares": 0, "ultimo_id": marca, "busqueda_s": 0.0, "fusion_s": 0.0, "escritura_s": 0.0}
+
+    # Reportes insertados después de leer los metadatos quedan para la próxima corrida
+    ultimo_id = int(meta["ids"][-1])
+    desde = time.time() / 86400 - dias if dias else -np.inf
+    estadisticas = {"consultas": 0, "pares": 0, "ultimo_id": marca, "busqueda_s": 0.0, "fusion_s": 0.0, "escritura_s": 0.0}
+
+    for ids, matriz, _ in db.iterar_embeddings(marca, motor_faiss.dimension, tamano_lote=lote):
+        dentro = ids <= ultimo_id
+        pos_q, presentes = _posiciones(meta, ids)
+        consultas = dentro & presentes & (meta["dias"][pos_q] >= desde)
+        pares = {}
+
+        if consultas.any():
+            ids_q, pos_q = ids[consultas], pos_q[consultas][:, None]
+            t0 = time.perf_counter()
+            # k + 1: el propio reporte también está en el índice
+            D, I = motor_faiss.buscar_lote(matriz[consultas], k + 1)
+            t1 = time.perf_counter()
+
+            pos_c, validos = _posiciones(meta, I)
+            validos &= (I != ids_q[:, None]) & (D >= umbral_visual)
+            r = fusionar(meta, pos_q, pos_c, D.astype(np.float64), pesos, ventana_tiempo_dias, max_radio_km)
+            filas, columnas = np.nonzero(validos & (r["score"] >= score_minimo))
+            for f, c in zip(filas, columnas):
+                clave = (min(ids_q[f], I[f, c]), max(ids_q[f], I[f, c]))
+                if clave not in pares or r["score"][f, c] > pares[clave][0]:
+                    pares[clave] = tuple(float(r[campo][f, c]) for campo in ("score", "vis", "geo", "tiempo", "dist_km"))
+            t2 = time.perf_counter()
+
+            estadisticas["consultas"] += len(ids_q)
+            estadisticas["busqueda_s"] += t1 - t0
+            estadisticas["fusion_s"] += t2 - t1
+
+        t0 = time.perf_counter()
+        marca_lote = int(min(ids[-1], ultimo_id))
+        db.guardar_coincidencias(
+            [(int(a), int(b), *valores) for (a, b), valores in pares.items()],
+            NOMBRE_TRABAJO, marca_lote
+        )
+        estadisticas["escritura_s"] += time.perf_counter() - t0
+        estadisticas["pares"] += len(pares)
+        estadisticas["ultimo_id"] = marca_lote
+        if ids[-1] >= ultimo_id: break
+
+    return estadisticas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=10, help="Vecinos por reporte")
+    parser.add_argument("--umbral-visual", type=float, default=0.6, help="Similitud visual mínima de un candidato")
+    parser.add_argument("--score-minimo", type=float, default=0.8, help="Score fusionado mínimo para guardar el par")
+    parser.add_argument("--dias", type=int, default=60, help="Solo reportes de los últimos N días (0 = todos)")
+    parser.add_argument("--ventana-tiempo", type=float, default=30.0, help="Días en que el score de tiempo cae a 0")
+    parser.add_argument("--lote", type=int, default=256, help="Consultas por llamada a FAISS")
+    parser.add_argument("--completo", action="store_true", help="Descarta los pares guardados y reprocesa todo")
+    parser.add_argument("--indice", default=RUTA_INDICE_FAISS, help="Índice FAISS persistente")
+    args = parser.parse_args()
+
+    from motor_faiss import MotorFAISS
+
+    db.init_db()
+    t0 = time.perf_counter()
+    # Mismo índice y compresión (FAISS_DIM_PCA / FAISS_CODIFICACION) que la app
+    motor_faiss = MotorFAISS.desde_entorno(obtener_vectores=lambda ids: db.obtener_vectores(ids, 2048))
+    motor_faiss.sincronizar(args.indice, **db.fuentes_indice(2048))
+    print(f"Índice: {motor_faiss.cantidad()} vectores ({motor_faiss.tipo_activo}) en {time.perf_counter() - t0:.1f} s")
+
+    t0 = time.perf_counter()
+    e = emparejar(
+        motor_faiss, k=args.k, umbral_visual=args.umbral_visual, score_minimo=args.score_minimo,
+        dias=args.dias or None, lote=args.lote, ventana_tiempo_dias=args.ventana_tiempo, completo=args.completo
+    )
+    total_s = time.perf_counter() - t0
+
+    print(f"{e['consultas']} reportes procesados, {e['pares']} pares guardados, marca en id {e['ultimo_id']} ({total_s:.1f} s)")
+    if e["consultas"]:
+        por_mil = 1000 / e["consultas"]
+        print(f"Por cada 1000 consultas: búsqueda {e['busqueda_s'] * por_mil:.2f} s | fusión {e['fusion_s'] * por_mil:.2f} s | "
+              f"escritura {e['escritura_s'] * por_mil:.2f} s | total {total_s * por_mil:.2f} s")
+
+    for par in db.obtener_coincidencias(args.score_minimo, limite=10):
+        print(f"  {par['score']:.2f}  #{par['id_a']} {par['nombre_a']} ({par['distrito_a']})  <->  "
+              f"#{par['id_b']} {par['nombre_b']} ({par['distrito_b']})  [vis {par['vis']:.2f}, geo {par['geo']:.2f}, "
+              f"tiempo {par['tiempo']:.2f}, {par['dist_km']:.1f} km]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Importación masiva de mascotas desde un directorio con el mismo formato que datos/:
+    <directorio>/imagenes/<nombre>.jpg
+    <directorio>/metadata/<nombre>.json   {"nombre", "distrito", "h3_index", "lat", "lon"}
+
+- Decodificación, clasificación y embedding en paralelo y por lotes (MotorVision.analizar_lote).
+- Cada foto aceptada se copia al almacén por contenido con sus miniaturas
+  (almacen_imagenes.py), en los mismos hilos de lectura.
+- Inserción con executemany en transacciones grandes (db.guardar_mascotas_lote).
+- Al final, los vectores nuevos entran al índice FAISS persistente de una vez (MotorFAISS.sincronizar).
+- Reanudable: las fotos ya registradas (mismo SHA-256) se saltan, así que si se
+  interrumpe basta con volver a correrlo; solo se pierde la transacción en curso.
+
+Uso (desde la raíz del repo):
+    python importar.py /ruta/a/exportacion --lote 32 --hilos 4 --filas-por-transaccion 1000
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+
+RUTA_INDICE_FAISS = "datos/indice/mascotas.faiss"
+
+
+def leer_metadata(ruta_imagen, dir_metadata):
+    """Metadata asociada a la imagen (mismo nombre base), o None si falta o está incompleta."""
+    base = os.path.splitext(os.path.basename(ruta_imagen))[0]
+    ruta_json = os.path.join(dir_metadata, base + ".json")
+    try:
+        with open(ruta_json, encoding="utf-8") as f:
+            meta = json.load(f)
+        meta["lat"], meta["lon"] = float(meta["lat"]), float(meta["lon"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"  [omitida] {os.path.basename(ruta_imagen)}: metadata inválida ({e})")
+        return None
+
+    if not meta.get("h3_index"):
+        import h3
+        meta["h3_index"] = h3.latlng_to_cell(meta["lat"], meta["lon"], 9)
+    meta.setdefault("nombre", base)
+    meta.setdefault("distrito", "")
+    return meta
+
+
+def leer_archivo(ruta):
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    return datos, hashlib.sha256(datos).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directorio", help="Carpeta con imagenes/ y metadata/")
+    parser.add_argument("--lote", type=int, default=32, help="Imágenes por pasada de la red")
+    parser.add_argument("--hilos", type=int, default=4, help="Hilos de lectura/decodificación")
+    parser.add_argument("--filas-por-transaccion", type=int, default=1000)
+    parser.add_argument("--backend", default=os.environ.get("MOTOR_VISION_BACKEND", "eager"))
+    parser.add_argument("--imagenes", default="datos/imagenes", help="Almacén de fotos y miniaturas")
+    parser.add_argument("--indice", default=RUTA_INDICE_FAISS, help="Índice FAISS a actualizar")
+    parser.add_argument("--sin-indice", action="store_true", help="No actualizar el índice FAISS")
+    args = parser.parse_args()
+
+    dir_imagenes = os.path.join(args.directorio, "imagenes")
+    dir_metadata = os.path.join(args.directorio, "metadata")
+    rutas = sorted(
+        ruta for ext in ("jpg", "jpeg", "png")
+        for ruta in glob.glob(os.path.join(dir_imagenes, f"*.{ext}"))
+    )
+    if not rutas:
+        sys.exit(f"No hay imágenes en {dir_imagenes}")
+
+    db.init_db()
+    from motor_vision import MotorVision
+    motor = MotorVision(backend=args.backend)
+    from almacen_imagenes import AlmacenImagenes
+    almacen = AlmacenImagenes(args.imagenes)
+
+    conteo = {"importadas": 0, "ya_registradas": 0, "no_animal": 0, "errores": 0, "sin_metadata": 0}
+    vistos = set()
+    pendientes = []
+    t0 = time.perf_counter()
+
+    def confirmar():
+        if pendientes:
+            conteo["importadas"] += db.guardar_mascotas_lote(pendientes)
+            pendientes.clear()
+
+    with ThreadPoolExecutor(max_workers=args.hilos) as pool:
+        for inicio in range(0, len(rutas), args.lote):
+            tanda = rutas[inicio:inicio + args.lote]
+            archivos = list(pool.map(leer_archivo, tanda))
+
+            # Reanudación: fuera lo ya registrado (en la BD o antes en esta misma corrida)
+            existentes = db.hashes_existentes([h for _, h in archivos])
+            nuevos = []
+            for ruta, (datos, hash_img) in zip(tanda, archivos):
+                if hash_img in existentes or hash_img in vistos:
+                    conteo["ya_registradas"] += 1
+                    continue
+                meta = leer_metadata(ruta, dir_metadata)
+                if meta is None:
+                    conteo["sin_metadata"] += 1
+                    continue
+                vistos.add(hash_img)
+                nuevos.append((ruta, datos, hash_img, meta))
+
+            resultados = motor.analizar_lote([datos for _, datos, _, _ in nuevos], pool)
+            aceptadas = []
+            for (ruta, datos, hash_img, meta), (es_animal, etiqueta, embedding) in zip(nuevos, resultados):
+                if embedding is None:
+                    conteo["errores"] += 1
+                elif not es_animal:
+                    conteo["no_animal"] += 1
+                    print(f"  [omitida] {os.path.basename(ruta)}: {etiqueta}")
+                else:
+                    aceptadas.append((datos, hash_img, meta, embedding))
+
+            rutas_almacen = pool.map(lambda a: almacen.guardar(a[0], a[1]), aceptadas)
+            for (_, hash_img, meta, embedding), ruta_almacen in zip(aceptadas, rutas_almacen):
+                if ruta_almacen is None:
+                    conteo["errores"] += 1
+                    continue
+                pendientes.append((
+                    meta["nombre"], meta["distrito"], meta["h3_index"],
+                    meta["lat"], meta["lon"], ruta_almacen, embedding, hash_img
+                ))
+
+            if len(pendientes) >= args.filas_por_transaccion:
+                confirmar()
+
+            procesadas = min(inicio + args.lote, len(rutas))
+            segundos = time.perf_counter() - t0
+            print(f"[{procesadas}/{len(rutas)}] {procesadas / segundos:.1f} img/s | "
+                  f"importadas {conteo['importadas'] + len(pendientes)} | ya registradas {conteo['ya_registradas']}")
+
+        confirmar()
+
+    segundos = time.perf_counter() - t0
+    print(f"Listo en {segundos:.1f} s ({len(rutas) / segundos:.1f} img/s): " +
+          ", ".join(f"{k} {v}" for k, v in conteo.items()))
+
+    if conteo["importadas"] and not args.sin_indice:
+        from motor_faiss import MotorFAISS
+        # Misma configuración que app.cargar_motor_faiss; las filas nuevas entran por lotes tras la marca de agua
+        m_faiss = MotorFAISS.desde_entorno(obtener_vectores=lambda ids: db.obtener_vectores(ids, 2048))
+        m_faiss.sincronizar(args.indice, **db.fuentes_indice(2048))
+        print(f"Índice FAISS actualizado: {m_faiss.cantidad()} vectores en {args.indice}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,342 @@
+import copy
 import faiss
+import h3
 import numpy as np
 import pickle
 import os
+import threading
 
 class MotorFAISS:
-    def __init__(self, dimension=512):
+    # Tipos de índice soportados. "auto" elige según la cantidad de vectores (ver tipo_sugerido).
+    TIPOS = ("auto", "flat", "ivf", "ivfpq", "hnsw")
+    # Codificación de los vectores dentro del índice: 4, 2 o 1 byte por dimensión.
+    CODIFICACIONES = {
+        "fp32": None,
+        "fp16": faiss.ScalarQuantizer.QT_fp16,
+        "sq8": faiss.ScalarQuantizer.QT_8bit,
+    }
+
+    # buscar_en_zona: hasta cuántos IDs se puntúa la zona exacto (reconstruyendo sus vectores)
+    # en índices aproximados. Más allá, copiar los vectores cuesta más que buscar con un
+    # IDSelector (~600 IDs en HNSW con 2048 dims); en flat el selector ya es exacto y siempre gana.
+    MAX_ZONA_EXACTA = 512
+
+    # Fracción de lápidas (entradas eliminadas que IVF/HNSW no pueden borrar en el lugar)
+    # a partir de la cual conviene compactar: reescribir el índice solo con los vivos.
+    UMBRAL_COMPACTACION = 0.2
+
+    # Versión del formato en disco (guardar/cargar). Índices de otra versión se reconstruyen.
+    # v3: mapa directo en arreglo para IVF (los v2 no podían reconstruir vectores por ID).
+    # v4: lápidas y marca del registro de cambios de la BD.
+    VERSION_FORMATO = 4
+
+    def __init__(self, dimension=512, tipo="flat", nprobe=16, ef_search=64, hnsw_m=32, pq_m=64,
+                 resolucion_zona=7, dim_pca=None, codificacion="fp32",
+                 obtener_vectores=None, factor_reordenamiento=4):
+        if tipo not in self.TIPOS:
+            raise ValueError(f"Tipo de índice desconocido: {tipo} (opciones: {self.TIPOS})")
+        if codificacion not in self.CODIFICACIONES:
+            raise ValueError(f"Codificación desconocida: {codificacion} (opciones: {list(self.CODIFICACIONES)})")
         self.dimension = dimension
+        self.tipo = tipo
+        self.nprobe = nprobe        # Listas IVF visitadas por consulta
+        self.ef_search = ef_search  # Tamaño de la cola de búsqueda HNSW
+        self.hnsw_m = hnsw_m        # Vecinos por nodo del grafo HNSW
+        self.pq_m = pq_m            # Sub-cuantizadores PQ (debe dividir a la dimensión)
+        # Compresión: PCA aprendida (2048 -> dim_pca) + codificación escalar.
+        # Las versiones "activas" son las que realmente tiene el índice construido.
+        self.dim_pca = dim_pca
+        self.codificacion = codificacion
+        self.dim_pca_activa = None
+        self.codificacion_activa = "fp32"
+        # Re-ranking exacto: obtener_vectores(ids) -> matriz (N, dimension) a precisión completa.
+        # Con un índice comprimido se piden k * factor candidatos y se reordenan con estos vectores.
+        self.obtener_vectores = obtener_vectores
+        self.factor_reordenamiento = factor_reordenamiento
         # Usamos IndexFlatIP (Inner Product). 
         # Si los vectores están normalizados, esto equivale a Similitud Coseno.
-        self.index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        # Los tipos aproximados necesitan entrenamiento: se crean en construir().
+        self.tipo_activo = "flat"
+        self.index = self._crear_indice("flat", 0)
+        # Marca de agua: mayor ID de la BD que ya está dentro del índice
+        self.ultimo_id = 0
+        # Búsqueda geo-restringida: celda H3 (a resolucion_zona) -> IDs de la BD en esa celda.
+        # Resolución 7 = hexágonos de ~1.4 km de lado.
+        self.resolucion_zona = resolucion_zona
+        self.ids_por_celda = {}
+        self.celda_por_id = {}  # inverso, para que eliminar solo toque las celdas afectadas
+        # Eliminación: en IVF/HNSW la entrada queda como lápida (id negativo) hasta compactar
+        self.eliminados = 0
+        self._selector_vivos = faiss.IDSelectorRange(0, 2**62)
+        # Marca del registro de cambios de la BD (db.cambios_desde) ya aplicada al índice
+        self.ultimo_cambio = 0
+        # El motor es compartido entre las sesiones y el hilo de mantenimiento: toda lectura
+        # o modificación del índice va bajo este lock (reentrante: buscar_en_zona usa buscar)
+        self.lock = threading.RLock()
+        # IDs que compactar() ya trajo de la BD y cuyo agregar_vector todavía no llegó
+        self._ya_agregados = set()
+
+    # --- TIPOS DE ÍNDICE ---
+
+    @classmethod
+    def desde_entorno(cls, obtener_vectores=None, dimension=2048):
+        """
+        Motor con la configuración compartida por la app, importar.py y emparejamiento.py
+        (usan el mismo índice en disco): tipo "auto" y compresión por entorno, p. ej.
+        FAISS_DIM_PCA=256 FAISS_CODIFICACION=sq8 -> 256 bytes por vector en vez de 8 KB.
+        Si el índice queda comprimido, el top-k se re-rankea con obtener_vectores, así que
+        el orden final no pierde precisión. Cambiarla reconstruye el índice.
+        """
+        return cls(
+            dimension=dimension, tipo="auto",
+            dim_pca=int(os.environ.get("FAISS_DIM_PCA", 0)) or None,
+            codificacion=os.environ.get("FAISS_CODIFICACION", "fp32"),
+            obtener_vectores=obtener_vectores
+        )
+
+    @staticmethod
+    def tipo_sugerido(n):
+        """
+        Elección automática según ntotal:
+        - < 20k: fuerza bruta exacta (es suficientemente rápida).
+        - < 200k: HNSW (sin entrenamiento, recall muy alto).
+        - < 2M: IVF-Flat.
+        - resto: IVF-PQ (vectores comprimidos para que quepan en RAM).
+        """
+        if n < 20_000: return "flat"
+        if n < 200_000: return "hnsw"
+        if n < 2_000_000: return "ivf"
+        return "ivfpq"
+
+    @staticmethod
+    def _nlist(n):
+        # Regla habitual: ~4*sqrt(n) listas, con al menos ~39 puntos de entrenamiento por lista
+        return int(max(1, min(4 * np.sqrt(n), n // 39, 65536)))
 
-    def agregar_vector(self, id_db, vector):
+    def _tipo_viable(self, tipo, n):
+        """Degrada a un tipo más simple si no hay datos suficientes para entrenar."""
+        if tipo == "ivfpq" and n < 256 * 39:
+            tipo = "ivf"
+        if tipo == "ivf" and self._nlist(n) < 16:
+            tipo = "flat"
+        return tipo
+
+    def _crear_indice(self, tipo, n, dim_pca=None, codificacion="fp32"):
+        d = dim_pca or self.dimension
+        qtype = self.CODIFICACIONES[codificacion]
+        metrica = faiss.METRIC_INNER_PRODUCT
+        if tipo == "flat":
+            base = faiss.IndexFlatIP(d) if qtype is None else faiss.IndexScalarQuantizer(d, qtype, metrica)
+        elif tipo == "ivf":
+            if qtype is None:
+                base = faiss.IndexIVFFlat(faiss.IndexFlatIP(d), d, self._nlist(n), metrica)
+            else:
+                base = faiss.IndexIVFScalarQuantizer(faiss.IndexFlatIP(d), d, self._nlist(n), qtype, metrica)
+        elif tipo == "ivfpq":
+            base = faiss.IndexIVFPQ(faiss.IndexFlatIP(d), d, self._nlist(n), self.pq_m, 8, metrica)
+        elif tipo == "hnsw":
+            if qtype is None:
+                base = faiss.IndexHNSWFlat(d, self.hnsw_m, metrica)
+            else:
+                base = faiss.IndexHNSWSQ(d, qtype, self.hnsw_m, metrica)
+            base.hnsw.efConstruction = max(40, 2 * self.hnsw_m)
+        else:
+            raise ValueError(f"Tipo de índice desconocido: {tipo}")
+        if tipo in ("ivf", "ivfpq"):
+            # Necesario para reconstruir vectores por ID. Bajo IDMap2 los ids internos son
+            # secuenciales: basta el mapa en arreglo (con Hashtable, IDMap2 solo registra una clave)
+            base.set_direct_map_type(faiss.DirectMap.Array)
+
+        if dim_pca:
+            # PCA aprendida + re-normalización, para que IP siga aproximando el coseno
+            index = faiss.IndexPreTransform(faiss.NormalizationTransform(dim_pca, 2.0), base)
+            index.prepend_transform(faiss.PCAMatrix(self.dimension, dim_pca))
+            base = index
+        # IDMap2 permite reconstruir vectores por ID (lo usa la búsqueda por zona)
+        return faiss.IndexIDMap2(base)
+
+    def _reordenamiento_activo(self):
+        """Hay que re-rankear si el índice guarda vectores con pérdida y hay de dónde sacar los exactos."""
+        comprimido = bool(self.dim_pca_activa) or self.codificacion_activa != "fp32" or self.tipo_activo == "ivfpq"
+        return comprimido and self.obtener_vectores is not None
+
+    def _reordenar_exacto(self, q, I, k):
+        """
+        Re-ranking a precisión completa: recalcula el coseno de los candidatos
+        con sus vectores originales y devuelve los k mejores.
+        """
+        D, I = self._reordenar_exacto_lote(q[None, :], np.unique(I[I != -1])[None, :], k)
+        return D[0], I[0]
+
+    def _reordenar_exacto_lote(self, Q, I, k):
+        """
+        _reordenar_exacto para muchas consultas (Q: (n, d), I: (n, k_busqueda), sin
+        ids repetidos por fila): los vectores de todos los candidatos se piden una
+        sola vez y los cosenos salen de un único producto de matrices.
+        """
+        D_final = np.full((len(Q), k), -np.inf, dtype=np.float32)
+        I_final = np.full((len(Q), k), -1, dtype=np.int64)
+        candidatos = np.unique(I[I != -1])
+        if len(candidatos) == 0:
+            return D_final, I_final
+
+        vectores = np.array(self.obtener_vectores(candidatos), dtype=np.float32).reshape(-1, self.dimension)
+        faiss.normalize_L2(vectores)
+        validos = I != -1
+        posiciones = np.searchsorted(candidatos, np.where(validos, I, candidatos[0]))
+        scores = np.take_along_axis(Q @ vectores.T, posiciones, axis=1)
+        scores[~validos] = -np.inf
+
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        n = top.shape[1]
+        D_final[:, :n] = np.take_along_axis(scores, top, axis=1)
+        I_final[:, :n] = np.where(np.isfinite(D_final[:, :n]), np.take_along_axis(I, top, axis=1), -1)
+        return D_final, I_final
+
+    def _parametros_busqueda(self, selector=None):
+        """
+        Parámetros de búsqueda (nprobe / efSearch y filtro de IDs) según el tipo activo.
+        Sin selector propio, si hay lápidas se filtran con un rango de ids no negativos.
+        """
+        if selector is None and self.eliminados:
+            selector = self._selector_vivos
+        if self.tipo_activo in ("ivf", "ivfpq"):
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, sel=selector)
+        if self.tipo_activo == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=self.ef_search, sel=selector)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+
+    def ajustar(self, nprobe=None, ef_search=None):
+        """Cambia el balance velocidad/precisión sin reconstruir el índice."""
+        if nprobe is not None: self.nprobe = nprobe
+        if ef_search is not None: self.ef_search = ef_search
+
+    def construir(self, ids_db, vectores, h3_indices=None):
+        """
+        Reconstruye el índice completo con los embeddings dados (p. ej. toda la BD):
+        elige el tipo (si es "auto"), entrena si hace falta y agrega en un lote.
+        h3_indices (opcional, alineado con ids_db) habilita la búsqueda por zona.
+        """
+        self.construir_por_lotes([(ids_db, vectores, h3_indices)], len(ids_db))
+
+    def construir_por_lotes(self, lotes, total):
+        """
+        Igual que construir, pero consumiendo un iterable de (ids, matriz, h3_indices)
+        (p. ej. db.iterar_embeddings) sin tener toda la matriz en memoria.
+        total: número de filas esperado, para elegir tipo y nlist antes de leerlas.
+        Si el índice necesita entrenamiento, se acumulan solo las primeras
+        min(total, 200k) filas como muestra; el resto se agrega lote a lote.
+        """
+        n = total
+        tipo = self.tipo_sugerido(n) if self.tipo == "auto" else self.tipo
+        tipo = self._tipo_viable(tipo, n)
+        # Sin datos no hay nada que entrenar: índice exacto sin comprimir
+        dim_pca = self.dim_pca if self.dim_pca and n >= 2 * self.dim_pca else None
+        codificacion = self.codificacion if n else "fp32"
+        index = self._crear_indice(tipo, n, dim_pca, codificacion)
+
+        self.index = index
+        self.tipo_activo = tipo
+        self.dim_pca_activa = dim_pca
+        self.codificacion_activa = codificacion
+        self.ultimo_id = 0
+        self.ids_por_celda = {}
+        self.celda_por_id = {}
+        self.eliminados = 0
+
+        # Con muestras grandes basta un subconjunto para los centroides
+        tamano_muestra = min(n, 200_000)
+        pendientes, acumulados = [], 0
+        for ids_db, vectores, h3_indices in lotes:
+            if index.is_trained:
+                self.agregar_lote(ids_db, vectores, h3_indices)
+                continue
+            pendientes.append((ids_db, vectores, h3_indices))
+            acumulados += len(ids_db)
+            if acumulados >= tamano_muestra:
+                self._entrenar_y_agregar(pendientes)
+                pendientes = []
+
+        if pendientes or not index.is_trained:
+            self._entrenar_y_agregar(pendientes)
+
+    def _entrenar_y_agregar(self, pendientes):
+        """Entrena con los lotes acumulados (si hace falta) y luego los agrega."""
+        if not self.index.is_trained:
+            muestra = [np.asarray(v, dtype=np.float32).reshape(-1, self.dimension) for _, v, _ in pendientes]
+            muestra = np.concatenate(muestra) if muestra else np.zeros((0, self.dimension), dtype=np.float32)
+            muestra = muestra.copy()
+            faiss.normalize_L2(muestra)
+            self.index.train(muestra)
+        for ids_db, vectores, h3_indices in pendientes:
+            self.agregar_lote(ids_db, vectores, h3_indices)
+
+    def _celda_zona(self, h3_index):
+        """Lleva una celda H3 (p. ej. resolución 9 de la BD) a la resolución de zona."""
+        if h3.get_resolution(h3_index) <= self.resolucion_zona:
+            return h3_index
+        return h3.cell_to_parent(h3_index, self.resolucion_zona)
+
+    def _registrar_celdas(self, ids_db, h3_indices):
+        if h3_indices is None: return
+        for id_db, h3_index in zip(ids_db, h3_indices):
+            if not h3_index: continue
+            try:
+                celda = self._celda_zona(h3_index)
+            except Exception:
+                continue
+            self.ids_por_celda.setdefault(celda, []).append(int(id_db))
+            self.celda_por_id[int(id_db)] = celda
+
+    def _quitar_celdas(self, ids_db):
+        for id_db in ids_db:
+            celda = self.celda_por_id.pop(int(id_db), None)
+            if celda is None: continue
+            restantes = self.ids_por_celda.get(celda, [])
+            if int(id_db) in restantes:
+                restantes.remove(int(id_db))
+            if not restantes:
+                self.ids_por_celda.pop(celda, None)
+
+    def agregar_vector(self, id_db, vector, h3_index=None):
         """
         Agrega un vector al índice asociado a un ID de la base de datos.
         El vector debe ser float32 y estar normalizado.
+        Con h3_index, el ID queda disponible para buscar_en_zona.
         """
+        with self.lock:
+            if int(id_db) in self._ya_agregados:
+                self._ya_agregados.discard(int(id_db))
+                return
+            self._agregar_vector(id_db, vector, h3_index)
+
+    def _agregar_vector(self, id_db, vector, h3_index=None):
         vector = np.array([vector], dtype=np.float32)
         faiss.normalize_L2(vector) # Normalizar para que IP = Coseno
         
         # FAISS requiere IDs en formato int64
         id_array = np.array([id_db], dtype=np.int64)
-        self.index.add_with_ids(vector, id_array)
+        with self.lock:
+            self.index.add_with_ids(vector, id_array)
+            self.ultimo_id = max(self.ultimo_id, int(id_db))
+            self._registrar_celdas([id_db], [h3_index])
+
+    def agregar_lote(self, ids_db, vectores, h3_indices=None):
+        """
+        Igual que agregar_vector, pero para una matriz (N, dimension):
+        una sola normalización y una sola llamada a add_with_ids.
+        """
+        if len(ids_db) == 0: return
+        vectores = np.array(vectores, dtype=np.float32, copy=True).reshape(-1, self.dimension)
+        faiss.normalize_L2(vectores)
+
+        id_array = np.asarray(ids_db, dtype=np.int64)
+        with self.lock:
+            self.index.add_with_ids(vectores, id_array)
+            self.ultimo_id = max(self.ultimo_id, int(id_array.max()))
+            self._registrar_celdas(id_array, h3_indices)
 
     def buscar(self, vector_query, k=5):
         """
@@ -30,15 +346,315 @@ class MotorFAISS:
         vector_query = np.array([vector_query], dtype=np.float32)
         faiss.normalize_L2(vector_query)
         
+        # Índice comprimido: pedimos más candidatos y los re-rankeamos a precisión completa
+        reordenar = self._reordenamiento_activo()
+        k_busqueda = k * self.factor_reordenamiento if reordenar else k
+        
         # Buscamos en el índice
-        D, I = self.index.search(vector_query, k)
+        with self.lock:
+            D, I = self.index.search(vector_query, k_busqueda, params=self._parametros_busqueda())
+        if reordenar:
+            return self._reordenar_exacto(vector_query[0], I[0], k)
         
         # D son las distancias (scores de similitud)
         # I son los IDs de la base de datos
         return D[0], I[0]
 
+    def buscar_lote(self, vectores_query, k=5):
+        """
+        buscar para muchas consultas en una sola llamada a FAISS (que reparte las
+        consultas entre sus hilos); con un índice comprimido el re-ranking exacto
+        también se hace por lote.
+        Retorna: (distancias, ids) de forma (n, k), -1 = vacío.
+        """
+        Q = np.array(vectores_query, dtype=np.float32).reshape(-1, self.dimension)
+        faiss.normalize_L2(Q)
+
+        reordenar = self._reordenamiento_activo()
+        k_busqueda = k * self.factor_reordenamiento if reordenar else k
+        with self.lock:
+            D, I = self.index.search(Q, k_busqueda, params=self._parametros_busqueda())
+        if reordenar:
+            return self._reordenar_exacto_lote(Q, I, k)
+        return D, I
+
+    def buscar_en_zona(self, vector_query, h3_centro, k=5, anillos=4, respaldo_global=True):
+        """
+        Busca los k vectores más similares SOLO entre los reportes cercanos:
+        los IDs cuyas celdas (a resolucion_zona) están en el k-ring de `anillos`
+        alrededor de h3_centro (anillos=4 en resolución 7 ≈ 10 km de radio).
+        - Zonas pequeñas en índices aproximados (hasta MAX_ZONA_EXACTA IDs): se
+          reconstruyen sus vectores y se puntúan exacto.
+        - Resto: búsqueda del índice con un IDSelector sobre esos IDs.
+        Si la zona tiene menos de k candidatos y respaldo_global=True, se completa
+        con la búsqueda global.
+        Retorna: (distancias, ids) con el mismo formato que buscar (-1 = vacío).
+        """
+        try:
+            celdas = h3.grid_disk(self._celda_zona(h3_centro), anillos)
+        except Exception:
+            return self.buscar(vector_query, k)
+
+        with self.lock:
+            return self._buscar_en_zona(vector_query, celdas, k, respaldo_global)
+
+    def _buscar_en_zona(self, vector_query, celdas, k, respaldo_global):
+        ids_zona = [i for c in celdas for i in self.ids_por_celda.get(c, ())]
+        D = np.full(k, -np.inf, dtype=np.float32)
+        I = np.full(k, -1, dtype=np.int64)
+
+        if ids_zona:
+            ids_zona = np.unique(np.array(ids_zona, dtype=np.int64))
+            q = np.array([vector_query], dtype=np.float32)
+            faiss.normalize_L2(q)
+            reordenar = self._reordenamiento_activo()
+            k_busqueda = k * self.factor_reordenamiento if reordenar else k
+
+            if self.tipo_activo != "flat" and len(ids_zona) <= self.MAX_ZONA_EXACTA:
+                vectores = self.index.reconstruct_batch(ids_zona)
+                faiss.normalize_L2(vectores)
+                scores = vectores @ q[0]
+                top = np.argsort(-scores)[:k_busqueda]
+                Dz, Iz = scores[top], ids_zona[top]
+            else:
+                selector = faiss.IDSelectorBatch(ids_zona)
+                Dz, Iz = self.index.search(q, k_busqueda, params=self._parametros_busqueda(selector))
+                Dz, Iz = Dz[0], Iz[0]
+
+            if reordenar:
+                D, I = self._reordenar_exacto(q[0], Iz, k)
+            else:
+                D[:len(Iz)], I[:len(Iz)] = Dz[:k], Iz[:k]
+
+        encontrados = int((I != -1).sum())
+        if encontrados < k and respaldo_global:
+            Dg, Ig = self.buscar(vector_query, k)
+            for d, i in zip(Dg, Ig):
+                if encontrados >= k: break
+                if i == -1 or i in I[:encontrados]: continue
+                D[encontrados], I[encontrados] = d, i
+                encontrados += 1
+
+        return D, I
+
+    # --- ELIMINACIÓN, ACTUALIZACIÓN Y COMPACTACIÓN ---
+
+    def eliminar(self, ids_db):
+        """
+        Saca del índice los IDs de la BD (casos resueltos, spam, vencidos).
+        - flat: se borran de verdad (remove_ids desplaza los vectores siguientes).
+        - IVF / HNSW no admiten remove_ids: la entrada queda como lápida (su id pasa
+          a un negativo único) que las búsquedas filtran; compactar() las descarta.
+        IDs que no están en el índice se ignoran. Retorna cuántos se eliminaron.
+        """
+        buscados = np.unique(np.asarray(ids_db, dtype=np.int64).reshape(-1))
+        with self.lock:
+            if len(buscados) == 0 or self.index.ntotal == 0: return 0
+            if self.tipo_activo == "flat":
+                eliminados = int(self.index.remove_ids(faiss.IDSelectorBatch(buscados)))
+            else:
+                # Vista sin copia de id_map: las lápidas se escriben en el lugar. rev_map
+                # (id -> posición) no se reconstruye: la clave vieja queda apuntando a la
+                # lápida, pero solo la usa reconstruct, que buscar_en_zona llama únicamente
+                # con IDs vivos (ids_por_celda); read_index lo rehace al cargar.
+                id_map = faiss.rev_swig_ptr(self.index.id_map.data(), self.index.id_map.size())
+                posiciones = np.flatnonzero(np.isin(id_map, buscados))
+                id_map[posiciones] = -2 - posiciones
+                eliminados = len(posiciones)
+                self.eliminados += eliminados
+            if eliminados:
+                self._quitar_celdas(buscados.tolist())
+            return eliminados
+
+    def actualizar(self, id_db, vector, h3_index=None):
+        """Reemplaza el vector de un ID (foto nueva del mismo animal): eliminar + agregar_vector."""
+        with self.lock:
+            self.eliminar([id_db])
+            self._agregar_vector(id_db, vector, h3_index)
+
+    def fraccion_eliminada(self):
+        """Proporción de lápidas dentro del índice (0 en flat, que borra en el lugar)."""
+        return self.eliminados / self.index.ntotal if self.index.ntotal else 0.0
+
+    def necesita_compactar(self, umbral=None):
+        return self.fraccion_eliminada() > (self.UMBRAL_COMPACTACION if umbral is None else umbral)
+
+    def aplicar_cambios(self, leer_cambios):
+        """
+        Aplica los cambios de la BD posteriores a la marca:
+        leer_cambios(marca) -> (nueva marca, ids cambiados, iterable de (ids, matriz, h3_indices)
+        de los que siguen abiertos) (p. ej. db.cambios_desde). Los cambiados salen del
+        índice y los abiertos vuelven a entrar con su vector actual.
+        Retorna False si la marca ya no se puede poner al día (nueva marca None: el
+        registro se podó) y hay que reconstruir el índice.
+        """
+        with self.lock:
+            marca, ids_cambiados, lotes_abiertos = leer_cambios(self.ultimo_cambio)
+            if marca is None:
+                return False
+            if len(ids_cambiados):
+                self.eliminar(ids_cambiados)
+                for lote in lotes_abiertos:
+                    self.agregar_lote(*lote)
+            self.ultimo_cambio = marca
+            return True
+
+    def _reconstruir(self, leer_desde, contar_filas, leer_cambios=None, marca_cambios=None):
+        """
+        construir_por_lotes desde la BD, sin perder los cambios hechos mientras se lee:
+        marca_cambios() -> última marca de leer_cambios (p. ej. db.ultima_marca_cambios).
+        """
+        if marca_cambios is not None:
+            self.ultimo_cambio = marca_cambios()
+        elif leer_cambios is not None:
+            self.ultimo_cambio = leer_cambios(self.ultimo_cambio)[0]
+        self.construir_por_lotes(leer_desde(0), contar_filas())
+        if leer_cambios is not None:
+            self.aplicar_cambios(leer_cambios)
+
+    def compactar(self, leer_desde, contar_filas, leer_cambios=None, marca_cambios=None):
+        """
+        Reescribe el índice solo con los vectores vivos (mismos argumentos que sincronizar):
+        descarta las lápidas y, en modo "auto", vuelve al tipo que pide el tamaño actual.
+        Se construye aparte, sin el lock: las búsquedas, registros y cierres siguen
+        usando el índice anterior. Al final, con el lock tomado, se ponen al día en el
+        nuevo los registros y cambios que entraron a la BD mientras tanto y se
+        reemplaza. Retorna las lápidas descartadas.
+        """
+        nuevo = copy.copy(self)
+        nuevo.lock = threading.RLock()
+        nuevo._ya_agregados = set()
+        nuevo._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+        with self.lock:
+            lapidas = self.eliminados
+            agregados = []
+            for lote in leer_desde(nuevo.ultimo_id):
+                nuevo.agregar_lote(*lote)
+                agregados.extend(int(i) for i in lote[0])
+            if leer_cambios is not None:
+                nuevo.aplicar_cambios(leer_cambios)
+            # Ya están en la BD pero su agregar_vector (registro en curso) todavía no
+            # llegó: cuando llegue se ignora, para no duplicarlos
+            self._ya_agregados = {i for i in agregados if i > self.ultimo_id}
+            for atributo in ("index", "tipo_activo", "dim_pca_activa", "codificacion_activa",
+                             "ultimo_id", "ids_por_celda", "celda_por_id", "eliminados", "ultimo_cambio"):
+                setattr(self, atributo, getattr(nuevo, atributo))
+        return lapidas
+
     def cantidad(self):
-        return self.index.ntotal
+        """Vectores vivos (sin contar las lápidas)."""
+        return self.index.ntotal - self.eliminados
 
     def limpiar(self):
-        self.index.reset()
\ No newline at end of file
+        with self.lock:
+            self.index.reset()
+            self.ultimo_id = 0
+            self.ids_por_celda = {}
+            self.celda_por_id = {}
+            self.eliminados = 0
+
+    # --- PERSISTENCIA EN DISCO ---
+
+    def guardar(self, ruta_indice):
+        """
+        Guarda el índice (faiss.write_index) y, al lado, sus metadatos
+        (dimensión, marca de agua, tipo, compresión y celdas H3) en "<ruta_indice>.meta".
+        La PCA entrenada viaja dentro del propio índice (IndexPreTransform).
+        Se escribe a un temporal y luego se reemplaza, para no dejar
+        archivos a medias si el proceso muere. Retorna la marca de cambios guardada
+        (el registro de cambios se puede podar hasta ahí).
+        """
+        os.makedirs(os.path.dirname(ruta_indice) or ".", exist_ok=True)
+        with self.lock:
+            self._guardar(ruta_indice)
+            return self.ultimo_cambio
+
+    def _guardar(self, ruta_indice):
+        faiss.write_index(self.index, ruta_indice + ".tmp")
+        with open(ruta_indice + ".meta.tmp", "wb") as f:
+            pickle.dump({
+                "version": self.VERSION_FORMATO,
+                "dimension": self.dimension, "ultimo_id": self.ultimo_id,
+                "tipo": self.tipo_activo,
+                "dim_pca": self.dim_pca_activa, "codificacion": self.codificacion_activa,
+                "compresion_solicitada": (self.dim_pca, self.codificacion),
+                "resolucion_zona": self.resolucion_zona, "ids_por_celda": self.ids_por_celda,
+                "eliminados": self.eliminados, "ultimo_cambio": self.ultimo_cambio
+            }, f)
+        os.replace(ruta_indice + ".tmp", ruta_indice)
+        os.replace(ruta_indice + ".meta.tmp", ruta_indice + ".meta")
+
+    def cargar(self, ruta_indice):
+        """
+        Carga un índice guardado con guardar().
+        Retorna False (y deja el índice intacto) si no existe o no es compatible.
+        """
+        if not (os.path.exists(ruta_indice) and os.path.exists(ruta_indice + ".meta")):
+            return False
+        try:
+            with open(ruta_indice + ".meta", "rb") as f:
+                meta = pickle.load(f)
+            tipo_guardado = meta.get("tipo", "flat")
+            if meta.get("version") != self.VERSION_FORMATO:
+                return False
+            if meta["dimension"] != self.dimension or meta["resolucion_zona"] != self.resolucion_zona:
+                return False
+            if self.tipo not in ("auto", tipo_guardado):
+                return False
+            if meta.get("compresion_solicitada", (None, "fp32")) != (self.dim_pca, self.codificacion):
+                return False
+            self.index = faiss.read_index(ruta_indice)
+            self.ultimo_id = meta["ultimo_id"]
+            self.tipo_activo = tipo_guardado
+            self.dim_pca_activa = meta.get("dim_pca")
+            self.codificacion_activa = meta.get("codificacion", "fp32")
+            self.ids_por_celda = meta["ids_por_celda"]
+            self.celda_por_id = {i: celda for celda, ids in self.ids_por_celda.items() for i in ids}
+            self.eliminados = meta["eliminados"]
+            self.ultimo_cambio = meta["ultimo_cambio"]
+            return True
+        except Exception as e:
+            print(f"Error cargando índice: {e}")
+            return False
+
+    def sincronizar(self, ruta_indice, leer_desde, contar_filas, leer_cambios=None, marca_cambios=None):
+        """
+        Arranque incremental:
+        1. Carga el índice de disco (si existe).
+        2. Agrega por lotes las filas con id > marca de agua:
+           leer_desde(id) -> iterable de (ids, matriz, h3_indices) (p. ej. db.iterar_embeddings).
+        3. Aplica los cambios de estado/vector posteriores a su marca (leer_cambios, ver
+           aplicar_cambios): casos cerrados salen, vectores actualizados se reemplazan.
+           Al reconstruir, la marca sale de marca_cambios() sin releer el registro.
+        4. Verifica contra la BD (contar_filas() -> int); si no cuadra, reconstruye todo.
+           En modo "auto" también se reconstruye si el tamaño ya pide otro tipo de índice,
+           y se compacta si las lápidas superan UMBRAL_COMPACTACION.
+        5. Guarda el resultado para el próximo arranque.
+        Ni la carga inicial ni la reconstrucción tienen toda la BD en memoria a la vez.
+        """
+        with self.lock:
+            self._sincronizar(ruta_indice, leer_desde, contar_filas, leer_cambios, marca_cambios)
+
+    def _sincronizar(self, ruta_indice, leer_desde, contar_filas, leer_cambios, marca_cambios):
+        if not self.cargar(ruta_indice):
+            self._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+        else:
+            for lote in leer_desde(self.ultimo_id):
+                self.agregar_lote(*lote)
+
+            if leer_cambios is not None and not self.aplicar_cambios(leer_cambios):
+                print("Índice FAISS anterior a la poda del registro de cambios: reconstruyendo...")
+                self._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+
+            total = contar_filas()
+            if self.cantidad() != total:
+                print("Índice FAISS inconsistente con la BD: reconstruyendo...")
+                self._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+            elif self.tipo == "auto" and self._tipo_viable(self.tipo_sugerido(total), total) != self.tipo_activo:
+                print("Índice FAISS cambió de tamaño: cambiando de tipo de índice...")
+                self._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+            elif self.necesita_compactar():
+                print(f"Índice FAISS con {self.fraccion_eliminada():.0%} de lápidas: compactando...")
+                self._reconstruir(leer_desde, contar_filas, leer_cambios, marca_cambios)
+
+        self.guardar(ruta_indice)
@@ -5,11 +5,14 @@ import h3 # <--- IMPORTANTE: Necesitamos H3 aquí para la privacidad
 
 class MotorMapa:
     def __init__(self):
-        pass
+        # Mapas agregados ya construidos: (resolución, modo) -> (generación de datos, mapa)
+        self.cache_agregados = {}
 
-    def mapa_resultados(self, lat_centro, lon_centro, resultados):
+    def mapa_resultados(self, lat_centro, lon_centro, resultados, obtener_miniatura=None):
         """
         TAB 1: Círculos de Privacidad (Búsqueda).
+        - obtener_miniatura(ruta_imagen) -> data URI o None: foto pequeña en el popup
+          (incrustada; el iframe de folium no puede leer archivos locales).
         """
         lat_c = float(lat_centro)
         lon_c = float(lon_centro)
@@ -38,6 +41,9 @@ class MotorMapa:
                 elif res["score"] > 0.60: color = "#f57c00"
 
                 html = f"<b>{res['nombre']}</b><br>Match: {res['score']*100:.0f}%"
+                miniatura = obtener_miniatura(res.get("ruta_imagen")) if obtener_miniatura else None
+                if miniatura:
+                    html = f'<img src="{miniatura}" width="120"><br>' + html
                 
                 folium.Circle(
                     location=[r_lat, r_lon],
@@ -46,7 +52,7 @@ class MotorMapa:
                     fill=True,
                     fill_color=color,
                     fill_opacity=0.3,
-                    popup=html,
+                    popup=folium.Popup(html, max_width=160),
                     tooltip="Zona H3 (Anonimizada)"
                 ).add_to(m)
             except ValueError:
@@ -93,4 +99,55 @@ class MotorMapa:
                 gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}
             ).add_to(m)
             
-        return m
\ No newline at end of file
+        return m
+
+    def mapa_calor_agregado(self, resolucion, generacion, obtener_conteos, modo="calor"):
+        """
+        TAB 3 sobre el agregado por celda H3 (db.conteo_celdas): un punto pesado
+        (modo "calor") o un hexágono (modo "hexagonos") por celda ocupada, así que el
+        costo depende de las celdas, no de la cantidad de reportes.
+        - generacion: versión de los datos (db.generacion_conteo()); mientras no
+          cambie se devuelve el mismo mapa sin volver a leer ni construir nada.
+        - obtener_conteos(resolucion) -> [(celda, total)], solo se llama si hace falta.
+        """
+        clave = (resolucion, modo)
+        previo = self.cache_agregados.get(clave)
+        if previo is not None and previo[0] == generacion:
+            return previo[1]
+
+        conteos = obtener_conteos(resolucion)
+        m = folium.Map(location=[-12.0464, -77.0428], zoom_start=11)
+        maximo = max((total for _, total in conteos), default=0)
+
+        if modo == "hexagonos":
+            for celda, total in conteos:
+                try:
+                    intensidad = total / maximo
+                    color = "red" if intensidad > 0.66 else ("orange" if intensidad > 0.33 else "blue")
+                    folium.Polygon(
+                        locations=h3.cell_to_boundary(celda),
+                        color=color, weight=1, fill=True, fill_color=color,
+                        fill_opacity=0.2 + 0.5 * intensidad,
+                        tooltip=f"{total} reporte(s)"
+                    ).add_to(m)
+                except (ValueError, TypeError):
+                    continue
+        elif conteos:
+            # Mismo grid snapping que mapa_calor_bd: se grafica el CENTRO de la celda, con su conteo como peso
+            heat_data = []
+            for celda, total in conteos:
+                try:
+                    lat_c, lon_c = h3.cell_to_latlng(celda)
+                    heat_data.append([lat_c, lon_c, total / maximo])
+                except (ValueError, TypeError):
+                    continue
+            HeatMap(
+                heat_data,
+                radius=25,
+                blur=20,
+                min_opacity=0.4,
+                gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}
+            ).add_to(m)
+
+        self.cache_agregados[clave] = (generacion, m)
+        return m
@@ -1,85 +1,381 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageFilter, ImageOps
 import re
 
-pytesseract.pytesseract.tesseract_cmd = r'D:\Tesseract-OCR\tesseract.exe'
+# Dónde buscar tesseract si no viene configurado ni está en el PATH
+RUTAS_TESSERACT = [
+    r"D:\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files\Tesseract-OCR\tesseract.exe",
+    r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe",
+    "/usr/bin/tesseract", "/usr/local/bin/tesseract", "/opt/homebrew/bin/tesseract",
+]
+
+def ubicar_tesseract(ruta=None):
+    """
+    Ejecutable de Tesseract: el argumento, la variable TESSERACT_CMD, el PATH o
+    una de RUTAS_TESSERACT, en ese orden. None si no aparece.
+    """
+    for configurada in (ruta, os.environ.get("TESSERACT_CMD")):
+        if configurada:
+            return shutil.which(configurada) or configurada
+    encontrada = shutil.which("tesseract")
+    if encontrada: return encontrada
+    for candidata in RUTAS_TESSERACT:
+        if os.path.isfile(candidata): return candidata
+    return None
+
+
+# --- PREPROCESADO ---
+ALTO_AFICHE_PULGADAS = 11.7  # A4; se asume cuando la imagen no trae DPI
+
+def _umbral_otsu(histograma):
+    """Umbral de Otsu sobre un histograma de 256 niveles de gris."""
+    total = sum(histograma)
+    suma_total = sum(i * h for i, h in enumerate(histograma))
+    suma_fondo = peso_fondo = 0
+    mejor, umbral = -1.0, 127
+    for i, h in enumerate(histograma):
+        peso_fondo += h
+        if peso_fondo == 0: continue
+        peso_frente = total - peso_fondo
+        if peso_frente == 0: break
+        suma_fondo += i * h
+        media_fondo = suma_fondo / peso_fondo
+        media_frente = (suma_total - suma_fondo) / peso_frente
+        varianza = peso_fondo * peso_frente * (media_fondo - media_frente) ** 2
+        if varianza > mejor:
+            mejor, umbral = varianza, i
+    return umbral
+
+def preprocesar_afiche(img, dpi_objetivo=200, binarizar=True, recortar=True, margen=16):
+    """
+    Prepara un afiche para Tesseract:
+    1. Reduce a dpi_objetivo (el JPEG se decodifica ya reducido y en gris con draft()).
+    2. Escala de grises y binarización con umbral de Otsu (texto negro sobre blanco).
+    3. Recorta al rectángulo con tinta, ignorando motas sueltas.
+    Nunca amplía: una foto pequeña se deja en su tamaño.
+    """
+    dpi = img.info.get("dpi", (0, 0))[0] or 0
+    alto_pulgadas = max(img.size) / dpi if dpi >= 72 else ALTO_AFICHE_PULGADAS
+    lado = max(1, int(alto_pulgadas * dpi_objetivo))
+    if img.format == "JPEG":
+        img.draft("L", (lado, lado))
+    img = ImageOps.exif_transpose(img).convert("L")
+    img.thumbnail((lado, lado), Image.LANCZOS, reducing_gap=2.0)
+
+    if binarizar:
+        histograma = img.histogram()
+        umbral = _umbral_otsu(histograma)
+        img = img.point([0 if v <= umbral else 255 for v in range(256)])
+        # Afiches con letras claras sobre fondo oscuro: Tesseract rinde mejor con texto oscuro
+        if sum(histograma[:umbral + 1]) > img.width * img.height / 2:
+            img = ImageOps.invert(img)
+
+    if recortar:
+        # La tinta se busca en una copia chica y filtrada, para que el ruido no estire el recuadro
+        escala = 4
+        tinta = ImageOps.invert(img.reduce(escala)).filter(ImageFilter.MedianFilter(3))
+        caja = tinta.point([0 if v < 128 else 255 for v in range(256)]).getbbox()
+        if caja:
+            izq, arr, der, aba = caja
+            img = img.crop((
+                max(0, izq * escala - margen), max(0, arr * escala - margen),
+                min(img.width, der * escala + margen), min(img.height, aba * escala + margen)
+            ))
+    return img
+
+
+# --- OCR (un afiche; corre tanto en el proceso principal como en los del pool) ---
+def _ocr_bytes(datos, tesseract_cmd, opciones):
+    try:
+        if tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+        img = Image.open(io.BytesIO(datos))
+        if opciones["preprocesar"]:
+            img = preprocesar_afiche(img, opciones["dpi_objetivo"])
+        return pytesseract.image_to_string(img, lang=opciones["idioma"], config=opciones["config"])
+    except Exception as e:
+        return f"Error OCR: {str(e)}"
+
+def _iniciar_proceso():
+    # Con varios procesos en paralelo, cada Tesseract usa un solo hilo (evita sobresuscribir la CPU)
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def _leer_bytes(archivo):
+    """Ruta, bytes o archivo abierto (p. ej. el UploadedFile de Streamlit)."""
+    if isinstance(archivo, (bytes, bytearray)):
+        return bytes(archivo)
+    if hasattr(archivo, "getvalue"):
+        return archivo.getvalue()
+    if hasattr(archivo, "read"):
+        datos = archivo.read()
+        if hasattr(archivo, "seek"): archivo.seek(0)
+        return datos
+    with open(archivo, "rb") as f:
+        return f.read()
+
 
 class MotorOCR:
-    def __init__(self):
-        pass
+    """
+    - tesseract_cmd: ruta al ejecutable; por defecto ubicar_tesseract().
+    - cache: CacheOCR opcional; los afiches ya leídos (mismo SHA-256 y misma
+      configuración) no vuelven a pasar por Tesseract.
+    - preprocesar / dpi_objetivo: ver preprocesar_afiche.
+    """
+    def __init__(self, tesseract_cmd=None, cache=None, preprocesar=True, dpi_objetivo=200, idioma=None, config=""):
+        self.tesseract_cmd = ubicar_tesseract(tesseract_cmd)
+        if self.tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+        else:
+            print("Aviso OCR: no se encontró tesseract (configure TESSERACT_CMD o agréguelo al PATH)")
+        self.cache = cache
+        self.opciones = {"preprocesar": preprocesar, "dpi_objetivo": dpi_objetivo, "idioma": idioma, "config": config}
+        self.firma = f"v1|pre={int(preprocesar)}|dpi={dpi_objetivo}|lang={idioma}|cfg={config}"
 
     def extraer_texto(self, image_path_or_file):
         try:
-            img = Image.open(image_path_or_file)
-            texto = pytesseract.image_to_string(img)
-            return texto
+            datos = _leer_bytes(image_path_or_file)
         except Exception as e:
             return f"Error OCR: {str(e)}"
+        return self._extraer([datos], procesos=1)[0]
+
+    def extraer_textos(self, archivos, procesos=None):
+        """
+        OCR por lotes: lee todos los afiches, salta los que están en caché o
+        repetidos, y reparte el resto en `procesos` procesos (por defecto, uno por CPU).
+        Devuelve los textos en el mismo orden que `archivos`.
+        """
+        lista = []
+        for archivo in archivos:
+            try:
+                lista.append(_leer_bytes(archivo))
+            except Exception as e:
+                lista.append(e)
+        return self._extraer(lista, procesos)
+
+    def _extraer(self, lista_datos, procesos=None):
+        textos = [None] * len(lista_datos)
+        pendientes = {}  # hash -> (datos, [posiciones])
+        for i, datos in enumerate(lista_datos):
+            if isinstance(datos, Exception):
+                textos[i] = f"Error OCR: {str(datos)}"
+                continue
+            hash_img = hashlib.sha256(datos).hexdigest()
+            texto = self.cache.obtener(hash_img, self.firma) if self.cache else None
+            if texto is not None:
+                textos[i] = texto
+            else:
+                pendientes.setdefault(hash_img, (datos, []))[1].append(i)
+
+        hashes = list(pendientes)
+        procesos = min(procesos or os.cpu_count() or 1, len(hashes))
+        if procesos > 1:
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as pool:
+                resultados = list(pool.map(
+                    _ocr_bytes, (pendientes[h][0] for h in hashes),
+                    repeat(self.tesseract_cmd), repeat(self.opciones)
+                ))
+        else:
+            resultados = [_ocr_bytes(pendientes[h][0], self.tesseract_cmd, self.opciones) for h in hashes]
+
+        nuevos = []
+        for hash_img, texto in zip(hashes, resultados):
+            for i in pendientes[hash_img][1]:
+                textos[i] = texto
+            if not texto.startswith("Error OCR"):
+                nuevos.append((hash_img, texto))
+        if self.cache and nuevos:
+            self.cache.guardar_lote(nuevos, self.firma)
+        return textos
 
     def analizar_texto(self, texto_crudo):
+        return ANALIZADOR.analizar(texto_crudo)
+
+    def analizar_textos(self, textos, pool=None):
+        """Versión por lotes de analizar_texto (p. ej. para digitalizar un archivo de afiches)."""
+        return ANALIZADOR.analizar_lote(textos, pool)
+
+
+# --- ANALIZADOR DE TEXTO PRECOMPILADO ---
+# Palabras clave y atributos básicos (se reportan con esta ortografía)
+KEYWORDS = ["blanco", "negro", "marrón", "café", "crema", "caramelo", "dorado", "gris", "manchas",
+            "chico", "pequeño", "mediano", "grande", "macho", "hembra", "perro", "gato"]
+COLORES_FALLBACK = ["blanco", "negro", "marrón", "caramelo", "crema", "dorado"]
+ATRIBUTOS = ["color", "raza", "sexo"]
+MARCAS_RECOMPENSA = ["recompensa", "s/", "soles", "$"]
+
+# Los 43 distritos de Lima (mismos nombres que app.py) + Carmen de la Legua
+DISTRITOS = [
+    "Ancon", "Ate", "Barranco", "Breña", "Carabayllo", "Carmen de la Legua", "Chaclacayo", "Chorrillos",
+    "Cieneguilla", "Comas", "El Agustino", "Independencia", "Jesús María", "La Molina",
+    "La Victoria", "Lima", "Lince", "Los Olivos", "Lurigancho", "Lurín",
+    "Magdalena del Mar", "Miraflores", "Pachacamac", "Pucusana", "Pueblo Libre",
+    "Puente Piedra", "Punta Hermosa", "Punta Negra", "Rimac", "San Bartolo", "San Borja",
+    "San Isidro", "San Juan de Lurigancho", "San Juan de Miraflores", "San Luis",
+    "San Martín de Porres", "San Miguel", "Santa Anita", "Santa María del Mar",
+    "Santa Rosa", "Santiago de Surco", "Surquillo", "Villa El Salvador",
+    "Villa María del Triunfo"
+]
+
+# Minúsculas sin tildes: unos pocos str.replace (en C) son mucho más rápidos que str.translate
+_TILDES = (("á", "a"), ("é", "e"), ("í", "i"), ("ó", "o"), ("ú", "u"), ("ü", "u"), ("ñ", "n"))
+
+def _normalizar(texto_lower):
+    texto = texto_lower
+    for con, sin in _TILDES:
+        texto = texto.replace(con, sin)
+    return texto
+
+# bytes.translate: todo lo que no sea [a-z0-9] pasa a espacio, para partir en palabras con split()
+_SEPARADORES = bytes(c if (48 <= c <= 57 or 97 <= c <= 122) else 32 for c in range(256))
+
+def _palabras(texto_normalizado):
+    return texto_normalizado.encode("ascii", "replace").translate(_SEPARADORES).split()
+
+class AnalizadorTexto:
+    """
+    Analizador precompilado de afiches. El texto se normaliza (minúsculas, sin
+    tildes: "marron" y "marrón" cuentan igual) y se parte en palabras UNA vez,
+    todo con operaciones en C; palabras clave y distritos salen de búsquedas en
+    diccionarios armados en el constructor, en vez de ~60 recorridos `in` por llamada.
+    - Palabras clave: la palabra o su plural ("negros", "marrones").
+    - Distritos: palabras completas ("ate" ya no coincide dentro de "chocolate");
+      si aparecen varios, gana el nombre más largo.
+    """
+    def __init__(self, keywords=KEYWORDS, distritos=DISTRITOS):
+        self.keywords = list(keywords)
+        self.telefono = re.compile(r"9\d{2}[-\s]?\d{3}[-\s]?\d{3}")
+        # "Color: X" (se busca sobre el texto con tildes, para reportarlas)
+        self.atributos = {
+            a: re.compile(a + r"\s*[:\.]?\s*([a-záéíóúüñ\s]+)") for a in ATRIBUTOS
+        }
+
+        # forma (palabra o plural, sin tildes, en bytes) -> palabra clave
+        self.formas_keyword = {}
+        for k in self.keywords:
+            base = _normalizar(k.lower()).encode()
+            for forma in (base, base + b"s", base + b"es"):
+                self.formas_keyword.setdefault(forma, k)
+
+        # primera palabra -> [(b" palabras del distrito ", nombre)]
+        self.distritos_por_inicio = {}
+        for d in distritos:
+            partes = _palabras(_normalizar(d.lower()))
+            frase = b" " + b" ".join(partes) + b" "
+            self.distritos_por_inicio.setdefault(partes[0], []).append((frase, d))
+
+    def analizar(self, texto_crudo):
         datos = {
-            "telefonos": [], "recompensa": False, 
+            "telefonos": [], "recompensa": False,
             "palabras_clave": [], "atributos_extraidos": {}
         }
-        
         if not texto_crudo: return datos
+
         texto_lower = texto_crudo.lower()
+        texto = _normalizar(texto_lower)
+        palabras = _palabras(texto)
 
         # Teléfonos y Recompensa
-        encontrados = re.findall(r'(?:9\d{2}[-\s]?\d{3}[-\s]?\d{3})', texto_crudo)
-        for num in encontrados:
+        for num in self.telefono.findall(texto):
             limpio = num.replace(" ", "").replace("-", "")
             if len(limpio) == 9: datos["telefonos"].append(f"+51{limpio}")
+        datos["recompensa"] = any(marca in texto for marca in MARCAS_RECOMPENSA)
 
-        if re.search(r'(recompensa|s/|soles|\$)', texto_lower): datos["recompensa"] = True
-
-        # Palabras clave y Atributos básicos
-        keywords = ["blanco", "negro", "marrón", "café", "crema", "caramelo", "dorado", "gris", "manchas", 
-                    "chico", "pequeño", "mediano", "grande", "macho", "hembra", "perro", "gato"]
-        datos["palabras_clave"] = [w for w in keywords if w in texto_lower]
+        # Palabras clave: la intersección con las formas conocidas se resuelve en C
+        formas = self.formas_keyword
+        keywords = {formas[p] for p in formas.keys() & palabras}
+        datos["palabras_clave"] = [k for k in self.keywords if k in keywords]
 
         # Búsqueda Estricta (Color: X)
-        patrones = {
-            "color": r'color\s*[:\.]?\s*([a-zA-Z\s]+)',
-            "raza": r'raza\s*[:\.]?\s*([a-zA-Z\s]+)',
-            "sexo": r'sexo\s*[:\.]?\s*([a-zA-Z\s]+)'
-        }
-        for k, v in patrones.items():
-            m = re.search(v, texto_lower)
-            if m: datos["atributos_extraidos"][k] = m.group(1).split('\n')[0].title()
+        atributos = datos["atributos_extraidos"]
+        for a, patron in self.atributos.items():
+            if a in texto:
+                m = patron.search(texto_lower)
+                if m: atributos[a] = m.group(1).split("\n")[0].title()
 
         # Fallbacks
-        if "color" not in datos["atributos_extraidos"]:
-            for c in ["blanco", "negro", "marrón", "caramelo", "crema", "dorado"]:
-                if c in texto_lower: 
-                    datos["atributos_extraidos"]["color"] = c.title(); break
-        
-        if "sexo" not in datos["atributos_extraidos"]:
-            if "macho" in texto_lower: datos["atributos_extraidos"]["sexo"] = "Macho"
-            elif "hembra" in texto_lower: datos["atributos_extraidos"]["sexo"] = "Hembra"
-
-        # --- FALLBACK DISTRITOS (Tus 43 exactos) ---
-        # Ordenados por longitud para que encuentre "San Juan de Lurigancho" antes que "San Juan"
-        distritos_target = [
-            "villa maría del triunfo", "san juan de lurigancho", "san juan de miraflores", 
-            "santiago de surco", "san martín de porres", "santa maría del mar", "magdalena del mar", 
-            "villa el salvador", "carmen de la legua", "lurigancho", "la victoria", "puente piedra", 
-            "punta hermosa", "independencia", "el agustino", "jesús maría", "pueblo libre", 
-            "pachacamac", "san bartolo", "san isidro", "san miguel", "santa anita", "santa rosa", 
-            "carabayllo", "chaclacayo", "chorrillos", "cieneguilla", "la molina", "los olivos", 
-            "miraflores", "punta negra", "san borja", "san luis", "surquillo", "barranco", 
-            "pucusana", "san luis", "ancon", "breña", "comas", "lince", "lurin", "rimac", "lima", "ate"
-        ]
-
-        for d in distritos_target:
-            if d in texto_lower:
-                # Aquí hacemos el match con la lista bonita de app.py
-                # Mapeo manual rápido para corregir tildes al mostrar
-                nombre_final = d.title()
-                if d == "ancon": nombre_final = "Ancon"
-                if d == "ate": nombre_final = "Ate"
-                # (El sistema usará el string detectado, que es suficiente para el MVP)
-                datos["atributos_extraidos"]["distrito"] = nombre_final
-                break
-
-        return datos
\ No newline at end of file
+        if "color" not in atributos:
+            for c in COLORES_FALLBACK:
+                if c in keywords:
+                    atributos["color"] = c.title(); break
+        if "sexo" not in atributos:
+            if "macho" in keywords: atributos["sexo"] = "Macho"
+            elif "hembra" in keywords: atributos["sexo"] = "Hembra"
+
+        # Distrito: solo se buscan (como frase entre espacios) los nombres cuya primera palabra aparece
+        mejor = None
+        inicios = self.distritos_por_inicio.keys() & palabras
+        if inicios:
+            frase_texto = b" " + b" ".join(palabras) + b" "
+            for inicio in inicios:
+                for frase, nombre in self.distritos_por_inicio[inicio]:
+                    if (mejor is None or len(nombre) > len(mejor)) and frase in frase_texto:
+                        mejor = nombre
+        if mejor is not None:
+            atributos["distrito"] = mejor
+
+        return datos
+
+    def analizar_lote(self, textos, pool=None):
+        """analizar() sobre muchos textos; con un pool (p. ej. ProcessPoolExecutor) se reparte."""
+        if pool is not None:
+            return list(pool.map(self.analizar, textos, chunksize=64))
+        return [self.analizar(t) for t in textos]
+
+ANALIZADOR = AnalizadorTexto()
+
+
+def main():
+    """Digitaliza una carpeta de afiches: una línea JSON por afiche con el texto y los datos extraídos."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("directorio", help="Carpeta con afiches .jpg/.jpeg/.png")
+    parser.add_argument("--salida", default="-", help="Archivo .jsonl de salida (- = pantalla)")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos de OCR (por defecto, uno por CPU)")
+    parser.add_argument("--tesseract", default=None, help="Ruta a tesseract (si no, TESSERACT_CMD o PATH)")
+    parser.add_argument("--idioma", default=None, help="Idioma de Tesseract, p. ej. spa")
+    parser.add_argument("--dpi", type=int, default=200, help="DPI objetivo del preprocesado")
+    parser.add_argument("--sin-preprocesado", action="store_true")
+    parser.add_argument("--sin-cache", action="store_true")
+    args = parser.parse_args()
+
+    rutas = sorted(
+        os.path.join(args.directorio, nombre) for nombre in os.listdir(args.directorio)
+        if nombre.lower().endswith((".jpg", ".jpeg", ".png"))
+    )
+    if not rutas:
+        sys.exit(f"No hay afiches en {args.directorio}")
+
+    cache = None
+    if not args.sin_cache:
+        from cache_ocr import CacheOCR
+        cache = CacheOCR()
+    motor = MotorOCR(args.tesseract, cache, not args.sin_preprocesado, args.dpi, args.idioma)
+
+    t0 = time.perf_counter()
+    textos = motor.extraer_textos(rutas, args.procesos)
+    analisis = motor.analizar_textos(textos)
+    segundos = time.perf_counter() - t0
+
+    salida = sys.stdout if args.salida == "-" else open(args.salida, "w", encoding="utf-8")
+    try:
+        for ruta, texto, info in zip(rutas, textos, analisis):
+            salida.write(json.dumps({"archivo": ruta, "texto": texto, **info}, ensure_ascii=False) + "\n")
+    finally:
+        if salida is not sys.stdout: salida.close()
+    errores = sum(t.startswith("Error OCR") for t in textos)
+    print(f"{len(rutas)} afiches en {segundos:.1f} s ({len(rutas) / segundos:.1f} afiches/s), {errores} con error", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
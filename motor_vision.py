@@ -3,9 +3,34 @@ import torchvision.transforms as transforms
 from torchvision.models import resnet50, ResNet50_Weights # <--- USAMOS RESNET50
 from PIL import Image
 import numpy as np
+import copy
+import glob
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 
 class MotorVision:
-    def __init__(self):
+    # Backends de inferencia (misma API es_mascota / obtener_embedding / analizar):
+    # - eager:       PyTorch normal.
+    # - torchscript: modelo trazado + congelado (optimize_for_inference).
+    # - compile:     torch.compile.
+    # - onnx:        ONNX Runtime (requiere el paquete onnxruntime).
+    # - int8:        cuantización estática int8 del tronco (calibrada con datos/imagenes)
+    #                y dinámica de la capa fc.
+    BACKENDS = ("eager", "torchscript", "compile", "onnx", "int8")
+
+    def __init__(self, backend="eager", num_hilos=None, ruta_onnx="datos/modelos/resnet50_tronco.onnx",
+                 imagenes_calibracion="datos/imagenes/*.jpg", cache=None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend desconocido: {backend} (opciones: {self.BACKENDS})")
+        # Hilos de inferencia (intra-op). None = lo que decida PyTorch (un hilo por núcleo).
+        if num_hilos:
+            torch.set_num_threads(num_hilos)
+        self.backend = backend
+        self.num_hilos = num_hilos
+        # CacheInferencia opcional: fotos idénticas (mismo SHA-256) no vuelven a pasar por la red
+        self.cache = cache
+
         # 1. Cargar pesos (ResNet50 es mucho más potente para detalles finos)
         self.weights = ResNet50_Weights.DEFAULT
         self.full_model = resnet50(weights=self.weights)
@@ -17,37 +42,167 @@ class MotorVision:
         
         self.preprocess = self.weights.transforms()
 
+        # 3. Tronco (imagen -> vector 2048) y cabeza (vector -> 1000 clases) según el backend
+        self._tronco, self._cabeza = self._preparar_backend(backend, ruta_onnx, imagenes_calibracion)
+
+    def _preparar_backend(self, backend, ruta_onnx, imagenes_calibracion):
+        ejemplo = torch.randn(2, 3, 224, 224)
+        cabeza = self.full_model.fc
+
+        if backend == "eager":
+            return (lambda batch: self.feature_extractor(batch).flatten(1)), cabeza
+
+        if backend == "torchscript":
+            with torch.no_grad():
+                trazado = torch.jit.trace(self.feature_extractor, ejemplo)
+                trazado = torch.jit.optimize_for_inference(torch.jit.freeze(trazado))
+            return (lambda batch: trazado(batch).flatten(1)), cabeza
+
+        if backend == "compile":
+            compilado = torch.compile(self.feature_extractor, dynamic=True)
+            return (lambda batch: compilado(batch).flatten(1)), cabeza
+
+        if backend == "onnx":
+            try:
+                import onnxruntime as ort
+            except ImportError:
+                raise ImportError("El backend 'onnx' requiere: pip install onnxruntime")
+            if not os.path.exists(ruta_onnx):
+                os.makedirs(os.path.dirname(ruta_onnx) or ".", exist_ok=True)
+                torch.onnx.export(
+                    self.feature_extractor, ejemplo, ruta_onnx,
+                    input_names=["imagen"], output_names=["vector"],
+                    dynamic_axes={"imagen": {0: "batch"}, "vector": {0: "batch"}}
+                )
+            opciones = ort.SessionOptions()
+            if self.num_hilos:
+                opciones.intra_op_num_threads = self.num_hilos
+            sesion = ort.InferenceSession(ruta_onnx, opciones, providers=["CPUExecutionProvider"])
+            return (lambda batch: torch.from_numpy(sesion.run(None, {"imagen": batch.numpy()})[0]).flatten(1)), cabeza
+
+        # backend == "int8"
+        from torch.ao.quantization import get_default_qconfig_mapping, quantize_dynamic
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+        preparado = prepare_fx(copy.deepcopy(self.feature_extractor), get_default_qconfig_mapping("x86"), (ejemplo,))
+        # Calibración: rangos de activación observados sobre fotos reales (normal + espejo)
+        calibracion = [v for v in map(self._preparar_vistas, sorted(glob.glob(imagenes_calibracion))) if v is not None]
+        with torch.no_grad():
+            for vistas in calibracion or [(ejemplo[0], ejemplo[1])]:
+                preparado(torch.stack(vistas))
+        cuantizado = convert_fx(preparado)
+        cabeza_int8 = quantize_dynamic(copy.deepcopy(cabeza), {torch.nn.Linear}, dtype=torch.qint8)
+        return (lambda batch: cuantizado(batch).flatten(1)), cabeza_int8
+
+    @staticmethod
+    def leer_bytes(image_path_or_file):
+        """Bytes crudos de una ruta, un archivo subido (Streamlit) o un file-like."""
+        if isinstance(image_path_or_file, (bytes, bytearray)):
+            return bytes(image_path_or_file)
+        if isinstance(image_path_or_file, (str, os.PathLike)):
+            with open(image_path_or_file, "rb") as f:
+                return f.read()
+        if hasattr(image_path_or_file, "getvalue"):
+            return image_path_or_file.getvalue()
+        datos = image_path_or_file.read()
+        if hasattr(image_path_or_file, "seek"):
+            image_path_or_file.seek(0)
+        return datos
+
+    def _consultar_cache(self, image_path_or_file):
+        """
+        Con caché: lee los bytes UNA vez, calcula su SHA-256 y busca un resultado previo.
+        Retorna (imagen a decodificar, hash, entrada en caché o None).
+        Sin caché: (la misma imagen, None, None).
+        """
+        if self.cache is None:
+            if isinstance(image_path_or_file, (bytes, bytearray)):
+                return io.BytesIO(image_path_or_file), None, None
+            return image_path_or_file, None, None
+        try:
+            datos = self.leer_bytes(image_path_or_file)
+        except Exception as e:
+            print(f"Error lectura: {e}")
+            return image_path_or_file, None, None
+        hash_img = self.cache.hash_imagen(datos)
+        return io.BytesIO(datos), hash_img, self.cache.obtener(hash_img, self.backend)
+
     def es_mascota(self, image_path_or_file):
+        imagen, hash_img, previo = self._consultar_cache(image_path_or_file)
+        if previo and previo["es_animal"] is not None:
+            return previo["es_animal"], previo["etiqueta"]
+
         try:
-            img = Image.open(image_path_or_file).convert('RGB')
+            img = Image.open(imagen).convert('RGB')
             batch = self.preprocess(img).unsqueeze(0)
             
             with torch.no_grad():
-                prediction = self.full_model(batch).squeeze(0).softmax(0)
-                class_id = prediction.argmax().item()
-                score = prediction[class_id].item()
-
-            # Rangos ImageNet: 151-268 (Perros), 281-285 (Gatos)
-            es_perro = 151 <= class_id <= 268
-            es_gato = 281 <= class_id <= 285
-            
-            if es_perro: return True, f"Perro detectado ({score:.1%})"
-            if es_gato: return True, f"Gato detectado ({score:.1%})"
-            
-            return False, f"Objeto desconocido (ID: {class_id})"
+                logits = self._cabeza(self._tronco(batch)).squeeze(0)
+            es_animal, etiqueta = self._interpretar_clase(logits)
+            if hash_img:
+                self.cache.guardar(hash_img, self.backend, es_animal=es_animal, etiqueta=etiqueta)
+            return es_animal, etiqueta
             
         except Exception as e:
             print(f"Error clf: {e}")
             return True, "Error Clasificación"
 
+    def _interpretar_clase(self, logits):
+        prediction = logits.softmax(0)
+        class_id = prediction.argmax().item()
+        score = prediction[class_id].item()
+
+        # Rangos ImageNet: 151-268 (Perros), 281-285 (Gatos)
+        es_perro = 151 <= class_id <= 268
+        es_gato = 281 <= class_id <= 285
+        
+        if es_perro: return True, f"Perro detectado ({score:.1%})"
+        if es_gato: return True, f"Gato detectado ({score:.1%})"
+        
+        return False, f"Objeto desconocido (ID: {class_id})"
+
+    def analizar(self, image_path_or_file):
+        """
+        Clasificación + embedding en un solo paso (flujo de Registro).
+        Decodifica la imagen UNA vez y pasa el tronco convolucional una vez por
+        vista (normal y espejo, en el mismo batch). La cabeza fc se aplica
+        sobre el pooling de la vista normal, que es exactamente lo que hace
+        es_mascota.
+        Retorna: (es_animal, etiqueta, embedding)
+        """
+        imagen, hash_img, previo = self._consultar_cache(image_path_or_file)
+        if previo and previo["es_animal"] is not None and previo["embedding"] is not None:
+            return previo["es_animal"], previo["etiqueta"], previo["embedding"]
+
+        vistas = self._preparar_vistas(imagen)
+        if vistas is None:
+            return True, "Error Clasificación", None
+
+        try:
+            with torch.no_grad():
+                feats = self._tronco(torch.stack(vistas))
+                logits = self._cabeza(feats[:1]).squeeze(0)
+            es_animal, etiqueta = self._interpretar_clase(logits)
+            embedding_final = ((feats[0] + feats[1]) / 2.0).numpy().astype(np.float32)
+            if hash_img:
+                self.cache.guardar(hash_img, self.backend, es_animal, etiqueta, embedding_final)
+            return es_animal, etiqueta, embedding_final
+        except Exception as e:
+            print(f"Error análisis: {e}")
+            return True, "Error Clasificación", None
+
     def obtener_embedding(self, image_path_or_file):
         """
         TÉCNICA BIOMÉTRICA: Test Time Augmentation (TTA)
         Genera el vector de la imagen normal Y de la imagen volteada (espejo).
         El promedio de ambos crea una 'huella digital' resistente a la postura.
         """
+        imagen, hash_img, previo = self._consultar_cache(image_path_or_file)
+        if previo and previo["embedding"] is not None:
+            return previo["embedding"]
+
         try:
-            img = Image.open(image_path_or_file).convert('RGB')
+            img = Image.open(imagen).convert('RGB')
             
             # 1. Imagen Normal
             img_tensor = self.preprocess(img).unsqueeze(0)
@@ -57,20 +212,96 @@ class MotorVision:
             img_tensor_flipped = self.preprocess(img_flipped).unsqueeze(0)
             
             with torch.no_grad():
-                emb_original = self.feature_extractor(img_tensor).flatten()
-                emb_flipped = self.feature_extractor(img_tensor_flipped).flatten()
+                emb_original = self._tronco(img_tensor).flatten()
+                emb_flipped = self._tronco(img_tensor_flipped).flatten()
             
             # 3. Fusión de Características (Promedio)
             # Esto crea un vector que representa al perro "desde ambos ángulos"
             embedding_final = (emb_original + emb_flipped) / 2.0
             
             # Convertir a float32 para DB
-            return embedding_final.numpy().astype(np.float32)
+            embedding_final = embedding_final.numpy().astype(np.float32)
+            if hash_img:
+                self.cache.guardar(hash_img, self.backend, embedding=embedding_final)
+            return embedding_final
             
         except Exception as e:
             print(f"Error embedding: {e}")
             return None
 
+    def _preparar_vistas(self, image_path_or_file):
+        """
+        Decodifica la imagen y genera los tensores de ambas vistas del TTA:
+        (normal, espejo). Retorna None si la imagen no se puede leer.
+        """
+        try:
+            img = Image.open(image_path_or_file).convert('RGB')
+            img_flipped = img.transpose(Image.FLIP_LEFT_RIGHT)
+            return self.preprocess(img), self.preprocess(img_flipped)
+        except Exception as e:
+            print(f"Error embedding: {e}")
+            return None
+
+    def analizar_lote(self, imagenes, pool=None):
+        """
+        Versión por lotes de analizar: clasificación + embedding de varias imágenes.
+        - Las que ya están en caché no se decodifican ni pasan por la red.
+        - La decodificación se paraleliza si se pasa un pool de hilos.
+        - Las vistas normal y espejo de todo el lote van en UNA sola pasada
+          del tronco: [n0, n1, ..., e0, e1, ...].
+        Retorna una lista [(es_animal, etiqueta, embedding)] en el orden de entrada;
+        las imágenes ilegibles dan (True, "Error Clasificación", None), igual que analizar.
+        """
+        consultas = [self._consultar_cache(img) for img in imagenes]
+        resultados = [None] * len(consultas)
+
+        pendientes = []
+        for i, (_, _, previo) in enumerate(consultas):
+            if previo and previo["es_animal"] is not None and previo["embedding"] is not None:
+                resultados[i] = (previo["es_animal"], previo["etiqueta"], previo["embedding"])
+            else:
+                pendientes.append(i)
+
+        mapear = pool.map if pool else map
+        vistas = list(mapear(self._preparar_vistas, [consultas[i][0] for i in pendientes]))
+        validos = []
+        for i, v in zip(pendientes, vistas):
+            if v is None:
+                resultados[i] = (True, "Error Clasificación", None)
+            else:
+                validos.append((i, v))
+
+        if validos:
+            n = len(validos)
+            batch = torch.stack([v[0] for _, v in validos] + [v[1] for _, v in validos])
+            with torch.no_grad():
+                feats = self._tronco(batch)
+                logits = self._cabeza(feats[:n])
+            # Mismo promedio TTA que obtener_embedding
+            embeddings = ((feats[:n] + feats[n:]) / 2.0).numpy().astype(np.float32)
+
+            for j, (i, _) in enumerate(validos):
+                es_animal, etiqueta = self._interpretar_clase(logits[j])
+                resultados[i] = (es_animal, etiqueta, embeddings[j])
+                hash_img = consultas[i][1]
+                if hash_img:
+                    self.cache.guardar(hash_img, self.backend, es_animal, etiqueta, embeddings[j])
+
+        return resultados
+
+    def obtener_embeddings_lote(self, rutas, batch_size=16, num_workers=4):
+        """
+        Versión por lotes de obtener_embedding para ingestas masivas
+        (decodificación en paralelo + una pasada por lote, ver analizar_lote).
+        Genera (yield) los embeddings float32 en el mismo orden de entrada;
+        las imágenes ilegibles producen None, igual que obtener_embedding.
+        """
+        rutas = list(rutas)
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            for inicio in range(0, len(rutas), batch_size):
+                for _, _, embedding in self.analizar_lote(rutas[inicio:inicio + batch_size], pool):
+                    yield embedding
+
     def calcular_similitud(self, vector_a, vector_b):
         try:
             norm_a = np.linalg.norm(vector_a)
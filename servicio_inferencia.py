@@ -0,0 +1,93 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+class ServicioInferencia:
+    """
+    Servicio de inferencia compartido por todas las sesiones de Streamlit.
+    Las sesiones encolan imágenes y reciben un Future; un único hilo trabajador
+    junta las solicitudes de todas ellas en micro-lotes y hace UNA pasada de
+    MotorVision.analizar_lote por lote.
+    - max_lote: tamaño máximo del micro-lote.
+    - max_espera_ms: cuánto espera el trabajador a que lleguen más solicitudes
+      después de la primera, antes de procesar lo que tenga.
+    - max_cola: solicitudes pendientes permitidas; con la cola llena, enviar()
+      bloquea (contrapresión) en vez de acumular memoria sin límite.
+    Así el uso de CPU es predecible (un solo hilo usa torch) y el throughput es
+    mayor que N pasadas independientes de batch 1.
+    """
+    def __init__(self, motor_vision, max_lote=16, max_espera_ms=10, max_cola=256):
+        self.motor = motor_vision
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000.0
+        self.cola = queue.Queue(maxsize=max_cola)
+        self.estadisticas = {"solicitudes": 0, "lotes": 0}
+        self.hilo = threading.Thread(target=self._trabajar, name="servicio-inferencia", daemon=True)
+        self.hilo.start()
+
+    def analizar(self, imagen):
+        """Future -> (es_animal, etiqueta, embedding), como MotorVision.analizar."""
+        return self._enviar(imagen, lambda r: r)
+
+    def obtener_embedding(self, imagen):
+        """Future -> embedding (o None), como MotorVision.obtener_embedding."""
+        return self._enviar(imagen, lambda r: r[2])
+
+    def _enviar(self, imagen, extraer):
+        """
+        imagen: ruta o bytes. Los archivos subidos conviene pasarlos como
+        foto.getvalue(), para que el trabajador no lea objetos de otra sesión.
+        """
+        futuro = Future()
+        self.cola.put((imagen, extraer, futuro))
+        return futuro
+
+    def detener(self):
+        self.cola.put(None)
+        self.hilo.join()
+
+    def tamano_medio_lote(self):
+        if self.estadisticas["lotes"] == 0: return 0.0
+        return self.estadisticas["solicitudes"] / self.estadisticas["lotes"]
+
+    def _trabajar(self):
+        activo = True
+        while activo:
+            primero = self.cola.get()
+            if primero is None:
+                break
+
+            # Micro-lote: lo que llegue hasta max_lote o hasta agotar max_espera
+            lote = [primero]
+            limite = time.monotonic() + self.max_espera
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is None:
+                    activo = False
+                    break
+                lote.append(item)
+
+            self._procesar(lote)
+
+    def _procesar(self, lote):
+        pendientes = [(img, extraer, futuro) for img, extraer, futuro in lote if futuro.set_running_or_notify_cancel()]
+        if not pendientes:
+            return
+        try:
+            resultados = self.motor.analizar_lote([img for img, _, _ in pendientes])
+        except Exception as e:
+            for _, _, futuro in pendientes:
+                futuro.set_exception(e)
+            return
+
+        self.estadisticas["solicitudes"] += len(pendientes)
+        self.estadisticas["lotes"] += 1
+        for (_, extraer, futuro), resultado in zip(pendientes, resultados):
+            futuro.set_result(extraer(resultado))
@@ -0,0 +1,250 @@
+"""
+Trazas livianas de rendimiento: tramos (spans) con nombre que acumulan, dentro
+del proceso, un histograma de latencias y contadores de llamadas/errores por etapa.
+
+    with trazas.tramo("app.registro"): ...
+    @trazas.medido("db.guardar_mascota")
+    trazas.instrumentar_clase(MotorGeo)   # todos sus métodos públicos
+    trazas.instrumentar_modulo(db)        # todas sus funciones públicas
+
+Vienen desactivadas (TRAZAS=1 o activar() las encienden): desactivado, un tramo
+o una función instrumentada solo cuesta una comparación; no se mide el tiempo
+ni se toma el lock.
+Exportación: texto de Prometheus (para el textfile collector de node_exporter)
+o JSON lines (una línea por etapa y por exportación).
+"""
+import bisect
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+# Límites superiores de las cubetas del histograma, en ms (la última cubeta es +Inf)
+LIMITES_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_activo = os.environ.get("TRAZAS") == "1"
+_lock = threading.Lock()
+_etapas = {}
+
+
+def activar(valor=True):
+    global _activo
+    _activo = bool(valor)
+
+def activo():
+    return _activo
+
+
+class Etapa:
+    """Histograma y contadores de una etapa (p. ej. "MotorGeo.obtener_coordenadas")."""
+    __slots__ = ("nombre", "llamadas", "errores", "total_ms", "maximo_ms", "cubetas")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.llamadas = 0
+        self.errores = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.cubetas = [0] * (len(LIMITES_MS) + 1)
+
+    def registrar(self, ms, error=False):
+        self.llamadas += 1
+        self.errores += bool(error)
+        self.total_ms += ms
+        self.maximo_ms = max(self.maximo_ms, ms)
+        self.cubetas[bisect.bisect_left(LIMITES_MS, ms)] += 1
+
+    def percentil(self, p):
+        """Estimación desde el histograma (interpolación lineal dentro de la cubeta, como histogram_quantile)."""
+        if self.llamadas == 0: return 0.0
+        objetivo = p / 100 * self.llamadas
+        acumulado = 0
+        for i, cantidad in enumerate(self.cubetas):
+            if cantidad and acumulado + cantidad >= objetivo:
+                inferior = LIMITES_MS[i - 1] if i > 0 else 0.0
+                superior = LIMITES_MS[i] if i < len(LIMITES_MS) else self.maximo_ms
+                return min(self.maximo_ms, inferior + (superior - inferior) * (objetivo - acumulado) / cantidad)
+            acumulado += cantidad
+        return self.maximo_ms
+
+    def resumen(self):
+        return {
+            "etapa": self.nombre,
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "media_ms": self.total_ms / self.llamadas if self.llamadas else 0.0,
+            "p50_ms": self.percentil(50),
+            "p95_ms": self.percentil(95),
+            "max_ms": self.maximo_ms,
+            "total_s": self.total_ms / 1000,
+        }
+
+
+def registrar(nombre, ms, error=False):
+    with _lock:
+        etapa = _etapas.get(nombre)
+        if etapa is None:
+            etapa = _etapas[nombre] = Etapa(nombre)
+        etapa.registrar(ms, error)
+
+
+# --- TRAMOS ---
+
+class _Tramo:
+    __slots__ = ("nombre", "t0")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        registrar(self.nombre, 1000 * (time.perf_counter() - self.t0), tipo is not None)
+        return False
+
+class _TramoNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, tb):
+        return False
+
+_NULO = _TramoNulo()
+
+def tramo(nombre):
+    """Context manager que mide el bloque como la etapa `nombre` (no hace nada si están desactivadas)."""
+    return _Tramo(nombre) if _activo else _NULO
+
+
+def medido(nombre=None):
+    """Decorador: cada llamada a la función es un tramo (por defecto con su __qualname__)."""
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not _activo:
+                return funcion(*args, **kwargs)
+            t0 = time.perf_counter()
+            error = True
+            try:
+                resultado = funcion(*args, **kwargs)
+                error = False
+                return resultado
+            finally:
+                registrar(etiqueta, 1000 * (time.perf_counter() - t0), error)
+
+        envoltura._traza = etiqueta
+        return envoltura
+    return decorador
+
+
+def _instrumentable(funcion):
+    # Generadores y context managers (transaccion) devuelven enseguida: medirlos no dice nada
+    return (inspect.isfunction(funcion) and not getattr(funcion, "_traza", None)
+            and not inspect.isgeneratorfunction(funcion) and not hasattr(funcion, "__wrapped__"))
+
+def instrumentar_clase(clase, prefijo=None):
+    """Envuelve con medido() los métodos públicos de la clase (idempotente)."""
+    prefijo = prefijo or clase.__name__
+    for nombre, valor in list(vars(clase).items()):
+        if nombre.startswith("_"): continue
+        if isinstance(valor, (staticmethod, classmethod)):
+            if _instrumentable(valor.__func__):
+                setattr(clase, nombre, type(valor)(medido(f"{prefijo}.{nombre}")(valor.__func__)))
+        elif _instrumentable(valor):
+            setattr(clase, nombre, medido(f"{prefijo}.{nombre}")(valor))
+    return clase
+
+def instrumentar_modulo(modulo, prefijo=None, excluir=()):
+    """
+    Envuelve con medido() las funciones públicas definidas en el módulo (idempotente).
+    Solo afecta a quien las llama como modulo.funcion (no a un `from modulo import funcion` previo).
+    """
+    prefijo = prefijo or modulo.__name__
+    for nombre, valor in list(vars(modulo).items()):
+        if nombre.startswith("_") or nombre in excluir: continue
+        if _instrumentable(valor) and valor.__module__ == modulo.__name__:
+            setattr(modulo, nombre, medido(f"{prefijo}.{nombre}")(valor))
+    return modulo
+
+
+# --- CONSULTA Y EXPORTACIÓN ---
+
+def instantanea():
+    """Resumen de todas las etapas, ordenado por tiempo total (la más costosa primero)."""
+    with _lock:
+        resumenes = [etapa.resumen() for etapa in _etapas.values()]
+    return sorted(resumenes, key=lambda r: r["total_s"], reverse=True)
+
+def reiniciar():
+    with _lock:
+        _etapas.clear()
+
+def texto_prometheus(prefijo="mascotas"):
+    """Histogramas y contadores en el formato de texto de Prometheus (tiempos en segundos)."""
+    with _lock:
+        etapas = [(e.nombre, list(e.cubetas), e.total_ms, e.llamadas, e.errores) for e in _etapas.values()]
+    lineas = [
+        f"# HELP {prefijo}_etapa_duracion_segundos Duración de cada etapa instrumentada.",
+        f"# TYPE {prefijo}_etapa_duracion_segundos histogram",
+    ]
+    for nombre, cubetas, total_ms, llamadas, _ in etapas:
+        etiqueta = nombre.replace("\\", "\\\\").replace('"', '\\"')
+        acumulado = 0
+        for limite, cantidad in zip(LIMITES_MS + (None,), cubetas):
+            acumulado += cantidad
+            le = "+Inf" if limite is None else repr(limite / 1000)
+            lineas.append(f'{prefijo}_etapa_duracion_segundos_bucket{{etapa="{etiqueta}",le="{le}"}} {acumulado}')
+        lineas.append(f'{prefijo}_etapa_duracion_segundos_sum{{etapa="{etiqueta}"}} {total_ms / 1000!r}')
+        lineas.append(f'{prefijo}_etapa_duracion_segundos_count{{etapa="{etiqueta}"}} {llamadas}')
+    lineas += [
+        f"# HELP {prefijo}_etapa_errores_total Llamadas que terminaron en excepción.",
+        f"# TYPE {prefijo}_etapa_errores_total counter",
+    ]
+    for nombre, _, _, _, errores in etapas:
+        etiqueta = nombre.replace("\\", "\\\\").replace('"', '\\"')
+        lineas.append(f'{prefijo}_etapa_errores_total{{etapa="{etiqueta}"}} {errores}')
+    return "\n".join(lineas) + "\n"
+
+def exportar_prometheus(ruta):
+    """Escribe texto_prometheus() de forma atómica (el collector nunca ve un archivo a medias)."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        f.write(texto_prometheus())
+    os.replace(temporal, ruta)
+
+def texto_jsonl():
+    """Una línea JSON por etapa con el resumen actual y la hora."""
+    ahora = time.time()
+    return "".join(json.dumps({"ts": ahora, **resumen}, ensure_ascii=False) + "\n" for resumen in instantanea())
+
+def exportar_jsonl(ruta):
+    """Anexa texto_jsonl() al archivo (una serie de tiempo por etapa)."""
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "a", encoding="utf-8") as f:
+        f.write(texto_jsonl())
+
+def iniciar_exportacion(ruta_prometheus=None, ruta_jsonl=None, cada_s=15.0):
+    """Hilo de fondo que exporta cada `cada_s` segundos. Retorna el hilo (o None si no hay rutas)."""
+    if not ruta_prometheus and not ruta_jsonl: return None
+
+    def exportar():
+        while True:
+            time.sleep(cada_s)
+            try:
+                if ruta_prometheus: exportar_prometheus(ruta_prometheus)
+                if ruta_jsonl: exportar_jsonl(ruta_jsonl)
+            except OSError as e:
+                print(f"Error exportando trazas: {e}")
+
+    hilo = threading.Thread(target=exportar, name="exportar-trazas", daemon=True)
+    hilo.start()
+    return hilo
@@ -1,13 +1,74 @@
 import h3
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from functools import lru_cache
+import numpy as np
 from geopy.geocoders import Nominatim
 from geopy.extra.rate_limiter import RateLimiter
+from geopy.exc import GeocoderServiceError
+from cache_geocodificacion import normalizar
+
+# Lugares de referencia frecuentes (coordenadas aproximadas): respaldo offline cuando
+# Nominatim no responde a tiempo o no encuentra la referencia.
+# (lugar, distrito o None si el nombre basta, lat, lon)
+GAZETTEER_LIMA = [
+    ("Parque Kennedy", "Miraflores", -12.1219, -77.0297),
+    ("Larcomar", "Miraflores", -12.1318, -77.0304),
+    ("Parque del Amor", "Miraflores", -12.1270, -77.0373),
+    ("Ovalo Gutierrez", "Miraflores", -12.1117, -77.0385),
+    ("Ovalo Higuereta", "Santiago de Surco", -12.1336, -77.0003),
+    ("Jockey Plaza", "Santiago de Surco", -12.0855, -76.9771),
+    ("Puente de los Suspiros", "Barranco", -12.1491, -77.0221),
+    ("Parque El Olivar", "San Isidro", -12.1003, -77.0358),
+    ("Plaza San Miguel", "San Miguel", -12.0775, -77.0828),
+    ("Campo de Marte", "Jesús María", -12.0705, -77.0431),
+    ("Real Plaza Salaverry", "Jesús María", -12.0895, -77.0524),
+    ("Parque de la Reserva", "Lima", -12.0697, -77.0339),
+    ("Estadio Nacional", "Lima", -12.0670, -77.0336),
+    ("Plaza de Armas", "Lima", -12.0464, -77.0300),
+    ("Pentagonito", "San Borja", -12.1005, -76.9977),
+    ("Mega Plaza", "Independencia", -11.9944, -77.0614),
+]
+
+
+@lru_cache(maxsize=65536)
+def _centro_celda(h3_index):
+    """Centro (lat, lon) de una celda H3; (nan, nan) si la celda no es válida."""
+    try:
+        return h3.cell_to_latlng(h3_index)
+    except Exception:
+        return (math.nan, math.nan)
 
 class MotorGeo:
-    def __init__(self, resolucion=9):
+    """
+    - geocodificador: objeto con .geocode(query, timeout=...) (por defecto Nominatim;
+      en pruebas se puede pasar un stub local).
+    - cache: CacheGeocodificacion opcional; sin ella se geocodifica siempre.
+    - espera_max_s: cuánto espera obtener_coordenadas a la geocodificación en segundo
+      plano; si no llega a tiempo responde con el gazetteer o el centro del distrito
+      y el resultado queda en caché para la próxima vez.
+    """
+    # Por debajo de esta cantidad de candidatos el re-ranking escalar es más rápido que NumPy
+    MIN_CANDIDATOS_NUMPY = 32
+
+    def __init__(self, resolucion=9, geocodificador=None, cache=None, espera_max_s=5.0, gazetteer=None):
         self.resolucion = resolucion
         # Inicializamos el geocodificador con un nombre de usuario único para tu tesis
-        self.geolocator = Nominatim(user_agent="tesis_mascotas_upc_v1")
+        self.geolocator = geocodificador or Nominatim(user_agent="tesis_mascotas_upc_v1")
+        # Política de Nominatim: como máximo 1 consulta por segundo
+        self.geocode = RateLimiter(self.geolocator.geocode, min_delay_seconds=1, max_retries=0, swallow_exceptions=False)
+        self.cache = cache
+        self.espera_max_s = espera_max_s
+        # Un solo hilo: las consultas al servicio salen en serie, respetando el límite
+        self.pool_geocodificacion = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocodificacion")
+        self.en_curso = {}
+        # RLock: si el Future ya terminó, add_done_callback corre _terminar en este mismo hilo
+        self.lock = threading.RLock()
+        self.gazetteer = [
+            (normalizar(lugar), normalizar(distrito) if distrito else None, lat, lon)
+            for lugar, distrito, lat, lon in (gazetteer if gazetteer is not None else GAZETTEER_LIMA)
+        ]
         
         # Coordenadas aproximadas (Backup por si falla el geocoding)
         self.coordenadas_distritos = {
@@ -59,6 +120,104 @@ class MotorGeo:
         except:
             return 0.0
 
+    # --- VERSIONES VECTORIZADAS (re-ranking de muchos candidatos en una pasada) ---
+
+    @staticmethod
+    def haversine_km_lote(lat, lon, lats, lons):
+        """haversine_km de un punto contra arrays de puntos; retorna un array (nan si falta la coordenada)."""
+        R = 6371
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+        lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    def calcular_scores_geo(self, h3_origen, h3_destinos, max_radio_km=20.0):
+        """
+        calcular_score_geo para muchos destinos: 1.0 en la misma celda, caída lineal
+        hasta 0 a max_radio_km entre centros de celda, 0.0 si alguna celda no es válida.
+        """
+        lat_o, lon_o = _centro_celda(h3_origen)
+        centros = self.centros_celdas(h3_destinos)
+        distancias = self.haversine_km_lote(lat_o, lon_o, centros[:, 0], centros[:, 1])
+        misma_celda = np.array([h == h3_origen for h in h3_destinos], dtype=bool)
+        return self.scores_geo_por_distancia(distancias, misma_celda, max_radio_km)
+
+    @staticmethod
+    def centros_celdas(h3_indices):
+        """Centros (lat, lon) de muchas celdas: array (N, 2), nan en las celdas no válidas."""
+        return np.array([_centro_celda(h) for h in h3_indices], dtype=np.float64).reshape(-1, 2)
+
+    @staticmethod
+    def scores_geo_por_distancia(distancias, misma_celda, max_radio_km=20.0):
+        """
+        Score geo desde distancias ya calculadas entre centros de celda (arrays de
+        cualquier forma, p. ej. (consultas, k)): caída lineal, 1.0 en la misma celda.
+        """
+        scores = np.nan_to_num(np.clip(1 - distancias / max_radio_km, 0.0, 1.0), nan=0.0)
+        scores[misma_celda] = 1.0
+        return scores
+
+    def rerankear(self, ids, scores_visuales, h3_candidatos, lats, lons, h3_origen, lat, lon, peso_visual=0.6):
+        """
+        Fusión visual + geográfica de todos los candidatos en una pasada NumPy:
+            score = peso_visual * visual + (1 - peso_visual) * geo
+        Entradas alineadas (arrays o listas). Retorna un dict de arrays ordenados
+        de mayor a menor score: ids, score, vis, geo, dist_km.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        vis = np.asarray(scores_visuales, dtype=np.float64)
+        geo = self.calcular_scores_geo(h3_origen, h3_candidatos)
+        score = peso_visual * vis + (1 - peso_visual) * geo
+        dist_km = self.haversine_km_lote(lat, lon, lats, lons)
+
+        orden = np.argsort(-score, kind="stable")
+        return {"ids": ids[orden], "score": score[orden], "vis": vis[orden], "geo": geo[orden], "dist_km": dist_km[orden]}
+
+    def rerankear_candidatos(self, ids_faiss, scores_faiss, candidatos, h3_origen, lat, lon, peso_visual=0.6):
+        """
+        Une los resultados de FAISS (ids, scores; -1 = vacío) con los registros de
+        db.obtener_por_ids (en cualquier orden) y los re-rankea con rerankear.
+        Retorna la lista de registros con score, vis, geo y dist_km, ordenada.
+        """
+        score_por_id = {int(i): float(s) for i, s in zip(ids_faiss, scores_faiss) if i != -1}
+        candidatos = [c for c in candidatos if c["id"] in score_por_id]
+        if not candidatos: return []
+
+        coordenada = lambda v: math.nan if v is None else v
+        if len(candidatos) < self.MIN_CANDIDATOS_NUMPY:
+            return self._rerankear_pocos(candidatos, score_por_id, h3_origen, lat, lon, peso_visual, coordenada)
+        r = self.rerankear(
+            [c["id"] for c in candidatos],
+            [score_por_id[c["id"]] for c in candidatos],
+            [c["h3_index"] for c in candidatos],
+            [coordenada(c["lat"]) for c in candidatos],
+            [coordenada(c["lon"]) for c in candidatos],
+            h3_origen, lat, lon, peso_visual
+        )
+        por_id = {c["id"]: c for c in candidatos}
+        return [
+            {**por_id[int(i)], "score": float(s), "vis": float(v), "geo": float(g), "dist_km": float(d)}
+            for i, s, v, g, d in zip(r["ids"], r["score"], r["vis"], r["geo"], r["dist_km"])
+        ]
+
+    def _rerankear_pocos(self, candidatos, score_por_id, h3_origen, lat, lon, peso_visual, coordenada):
+        """Mismo cálculo que rerankear, escalar: con un puñado de candidatos (k=5 en la app) NumPy no compensa."""
+        lat_o, lon_o = _centro_celda(h3_origen)
+        resultados = []
+        for c in candidatos:
+            vis = score_por_id[c["id"]]
+            if c["h3_index"] == h3_origen:
+                geo = 1.0
+            else:
+                distancia = self.haversine_km(lat_o, lon_o, *_centro_celda(c["h3_index"]))
+                geo = 0.0 if math.isnan(distancia) else min(1.0, max(0.0, 1 - distancia / 20.0))
+            score = peso_visual * vis + (1 - peso_visual) * geo
+            dist_km = self.haversine_km(lat, lon, coordenada(c["lat"]), coordenada(c["lon"]))
+            resultados.append({**c, "score": score, "vis": vis, "geo": geo, "dist_km": dist_km})
+        resultados.sort(key=lambda r: -r["score"])
+        return resultados
+
     def obtener_coordenadas(self, distrito, referencia=""):
         """
         Intenta obtener coordenadas exactas de una referencia.
@@ -68,17 +227,68 @@ class MotorGeo:
         
         if not referencia:
             return lat_default, lon_default
-            
+        
+        if self.cache is not None:
+            previo = self.cache.obtener(distrito, referencia)
+            if previo is not None:
+                # Negativo vigente: ni se reintenta el servicio
+                if previo[0] is None:
+                    return self.buscar_en_gazetteer(distrito, referencia) or (lat_default, lon_default)
+                return previo
+        
+        futuro = self._geocodificar_en_segundo_plano(distrito, referencia)
+        try:
+            resultado = futuro.result(timeout=self.espera_max_s)
+        except FuturesTimeout:
+            print(f"Geocoding lento para '{referencia}': se responde con el respaldo local")
+            resultado = None
+        
+        if resultado:
+            return resultado
+        # Si no encuentra la calle exacta, probamos el gazetteer y luego el distrito
+        return self.buscar_en_gazetteer(distrito, referencia) or (lat_default, lon_default)
+    
+    def _geocodificar_en_segundo_plano(self, distrito, referencia):
+        """Future -> (lat, lon) o None. Consultas idénticas simultáneas comparten el mismo Future."""
+        clave = (normalizar(distrito), normalizar(referencia))
+        with self.lock:
+            futuro = self.en_curso.get(clave)
+            if futuro is None:
+                futuro = self.pool_geocodificacion.submit(self._geocodificar, distrito, referencia)
+                self.en_curso[clave] = futuro
+                futuro.add_done_callback(lambda _: self._terminar(clave))
+        return futuro
+    
+    def _terminar(self, clave):
+        with self.lock:
+            self.en_curso.pop(clave, None)
+    
+    def _geocodificar(self, distrito, referencia):
         try:
             # Construimos la búsqueda: "Parque Kennedy, Miraflores, Lima, Peru"
             query = f"{referencia}, {distrito}, Lima, Peru"
-            location = self.geolocator.geocode(query, timeout=5)
-            
-            if location:
-                return location.latitude, location.longitude
-            else:
-                # Si no encuentra la calle exacta, devolvemos el distrito
-                return lat_default, lon_default
+            location = self.geocode(query, timeout=5)
+        except GeocoderServiceError as e:
+            # Timeout, 429, servicio caído: falla pasajera, negativo corto (ttl_error_minutos)
+            print(f"Error Geocoding: {e}")
+            if self.cache is not None:
+                self.cache.guardar(distrito, referencia, error=True)
+            return None
         except Exception as e:
             print(f"Error Geocoding: {e}")
-            return lat_default, lon_default
\ No newline at end of file
+            return None
+        
+        resultado = (location.latitude, location.longitude) if location else None
+        if self.cache is not None:
+            # Sin resultado real del servicio: negativo normal (ttl_negativo_horas)
+            self.cache.guardar(distrito, referencia, *(resultado or (None, None)))
+        return resultado
+    
+    def buscar_en_gazetteer(self, distrito, referencia):
+        """(lat, lon) del primer lugar conocido mencionado en la referencia, o None."""
+        ref, dist = normalizar(referencia), normalizar(distrito)
+        for lugar, distrito_lugar, lat, lon in self.gazetteer:
+            # "Surco" también vale para "Santiago de Surco"
+            if lugar in ref and (distrito_lugar is None or dist in distrito_lugar or distrito_lugar in ref):
+                return lat, lon
+        return None
\ No newline at end of file